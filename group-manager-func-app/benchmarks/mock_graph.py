@@ -0,0 +1,539 @@
+"""
+Mock Graph
+Local stand-in for the MS Graph endpoints the app uses, for offline benchmarks
+
+Serves a synthetic tenant with configurable latency, page sizes and 429 injection:
+- Small groups: group g has members g, g + G, g + 2G, ... (G = number of groups)
+- Large groups: the first --large-groups groups also contain users 0 .. --large-size - 1
+
+Run standalone:
+    python -m benchmarks.mock_graph --port 8089 --groups 100000 --large-size 100000
+then point the app at it with GRAPH_MOCK_URL=http://127.0.0.1:8089
+"""
+import argparse
+import bisect
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+GRAPH_ROOT = "https://graph.microsoft.com/v1.0"
+
+BATCH_MAX_REQUESTS = 20
+
+# Graph accepts at most 20 members@odata.bind + owners@odata.bind on group create
+CREATE_BIND_LIMIT = 20
+
+DEPARTMENTS = ["DM", "HR", "FIN", "OPS", "ENG", "SALES", "LEGAL", "IT"]
+ROLES = ["DEVOPS", "ENGINEER", "MANAGER", "ANALYST", "ADMIN", "READER", "OWNER", "GUEST"]
+
+GROUP_ID_PREFIX = "00000000-0000-4000-8000-"
+USER_ID_PREFIX = "00000000-0000-4000-9000-"
+
+
+def group_id(index: int) -> str:
+    return f"{GROUP_ID_PREFIX}{index:012x}"
+
+
+def user_id(index: int) -> str:
+    return f"{USER_ID_PREFIX}{index:012x}"
+
+
+def parse_id(value: str, prefix: str) -> Optional[int]:
+    value = value.lower()
+    if not value.startswith(prefix):
+        return None
+    try:
+        return int(value[len(prefix):], 16)
+    except ValueError:
+        return None
+
+
+def group_name(index: int) -> str:
+    return (
+        f"AAD.TA.{DEPARTMENTS[index % len(DEPARTMENTS)]}."
+        f"{ROLES[(index // len(DEPARTMENTS)) % len(ROLES)]}.{index:06d}"
+    )
+
+
+class MockTenant:
+    """Synthetic directory. Base memberships are computed; changes are kept as overlays."""
+
+    def __init__(self, groups: int, users: int, members_per_group: int, large_groups: int, large_size: int):
+        self.group_count = groups
+        self.user_count = users
+        self.members_per_group = members_per_group
+        self.large_groups = large_groups
+        self.large_size = min(large_size, users)
+        self.lock = threading.Lock()
+
+        # Created groups: index -> (displayName, description); their members live in _added
+        self.created: Dict[int, Tuple[str, str]] = {}
+        self._added: Dict[int, List[int]] = {}
+        self._removed: Dict[int, Set[int]] = {}
+        self._member_cache: Dict[int, Tuple[List[int], Set[int]]] = {}
+        self.owners: Dict[int, Set[int]] = {}
+
+        # Sorted case-folded names for startswith() filters
+        self._sorted_names = sorted((group_name(g).casefold(), g) for g in range(groups))
+        self._sorted_keys = [name for name, _ in self._sorted_names]
+
+    # Groups
+
+    def group_exists(self, g: int) -> bool:
+        return 0 <= g < self.group_count or g in self.created
+
+    def name_of(self, g: int) -> str:
+        return self.created[g][0] if g in self.created else group_name(g)
+
+    def group_json(self, g: int, select: Optional[List[str]] = None) -> Dict[str, Any]:
+        description = self.created[g][1] if g in self.created else f"Synthetic group {g}"
+        group = {
+            "@odata.type": "#microsoft.graph.group",
+            "id": group_id(g),
+            "displayName": self.name_of(g),
+            "description": description,
+            "mailEnabled": False,
+            "securityEnabled": True,
+            "groupTypes": [],
+            "createdDateTime": "2024-01-01T00:00:00Z"
+        }
+        if select:
+            group = {key: value for key, value in group.items() if key in select or key == "@odata.type"}
+            group["id"] = group_id(g)
+        return group
+
+    def groups_with_prefix(self, prefix: str) -> List[int]:
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self._sorted_keys, prefix)
+        matches = []
+        for name, g in self._sorted_names[start:]:
+            if not name.startswith(prefix):
+                break
+            matches.append(g)
+        matches += [g for g, (name, _) in sorted(self.created.items()) if name.casefold().startswith(prefix)]
+        return matches
+
+    def groups_containing(self, term: str) -> List[int]:
+        term = term.casefold()
+        matches = [g for name, g in self._sorted_names if term in name]
+        matches += [g for g, (name, _) in sorted(self.created.items()) if term in name.casefold()]
+        return matches
+
+    def groups_named(self, names: List[str]) -> List[int]:
+        wanted = {name.casefold() for name in names}
+        matches = []
+        for name in wanted:
+            position = bisect.bisect_left(self._sorted_keys, name)
+            if position < len(self._sorted_keys) and self._sorted_keys[position] == name:
+                matches.append(self._sorted_names[position][1])
+        matches += [g for g, (name, _) in self.created.items() if name.casefold() in wanted]
+        return matches
+
+    def create_group(self, name: str, description: str, members: List[int], owners: List[int]) -> int:
+        with self.lock:
+            g = self.group_count + len(self.created)
+            self.created[g] = (name, description)
+            self._added[g] = list(dict.fromkeys(members))
+            self.owners[g] = set(owners)
+            self._member_cache.pop(g, None)
+            return g
+
+    # Members
+
+    def _base_members(self, g: int) -> List[int]:
+        if g >= self.group_count:
+            return []
+        members = [
+            g + k * self.group_count
+            for k in range(self.members_per_group)
+            if g + k * self.group_count < self.user_count
+        ]
+        if g < self.large_groups:
+            members = list(range(self.large_size)) + [u for u in members if u >= self.large_size]
+        return members
+
+    def _members(self, g: int) -> Tuple[List[int], Set[int]]:
+        with self.lock:
+            cached = self._member_cache.get(g)
+            if cached is None:
+                removed = self._removed.get(g, set())
+                members = [u for u in self._base_members(g) if u not in removed]
+                seen = set(members)
+                members += [u for u in self._added.get(g, []) if u not in seen and u not in removed]
+                cached = self._member_cache[g] = (members, set(members))
+            return cached
+
+    def members_of(self, g: int) -> List[int]:
+        return self._members(g)[0]
+
+    def is_member(self, g: int, u: int) -> bool:
+        return u in self._members(g)[1]
+
+    def add_members(self, g: int, users: List[int]) -> bool:
+        """Add members; False (and no change) if any is already a member, like Graph"""
+        current = self._members(g)[1]
+        if any(u in current for u in users):
+            return False
+        with self.lock:
+            for u in users:
+                if u in self._removed.get(g, set()):
+                    self._removed[g].discard(u)
+                else:
+                    self._added.setdefault(g, []).append(u)
+            self._member_cache.pop(g, None)
+        return True
+
+    def add_owner(self, g: int, u: int) -> bool:
+        """Add an owner; False if it already is one"""
+        with self.lock:
+            owners = self.owners.setdefault(g, set())
+            if u in owners:
+                return False
+            owners.add(u)
+        return True
+
+    def remove_member(self, g: int, u: int) -> bool:
+        if not self.is_member(g, u):
+            return False
+        with self.lock:
+            added = self._added.get(g)
+            if added and u in added:
+                added.remove(u)
+            else:
+                self._removed.setdefault(g, set()).add(u)
+            self._member_cache.pop(g, None)
+        return True
+
+    def groups_of_user(self, u: int) -> List[int]:
+        candidates = []
+        if u < self.large_size:
+            candidates += range(min(self.large_groups, self.group_count))
+        if u // self.group_count < self.members_per_group:
+            candidates.append(u % self.group_count)
+        candidates += [g for g, added in self._added.items() if u in added]
+        return [g for g in dict.fromkeys(candidates) if self.is_member(g, u)]
+
+    @staticmethod
+    def user_json(u: int, select: Optional[List[str]] = None) -> Dict[str, Any]:
+        user = {
+            "@odata.type": "#microsoft.graph.user",
+            "id": user_id(u),
+            "displayName": f"User {u:06d}",
+            "userPrincipalName": f"user{u:06d}@mock.onmicrosoft.com"
+        }
+        if select:
+            user = {key: value for key, value in user.items() if key in select or key in ("@odata.type", "id")}
+        return user
+
+
+class MockGraphServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tenant: MockTenant, latency_ms: float, jitter_ms: float,
+                 throttle_rate: float, retry_after: float, max_page_size: int):
+        super().__init__(address, MockGraphHandler)
+        self.tenant = tenant
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        # Retry-After is delay-seconds, a whole number (clients reject "1.0")
+        self.retry_after_header = str(math.ceil(retry_after))
+        self.max_page_size = max_page_size
+        self.stats_lock = threading.Lock()
+        self.stats: Dict[str, Any] = {"requests": 0, "throttled": 0, "routes": {}}
+
+    def count(self, route: str, throttled: bool = False):
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["routes"][route] = self.stats["routes"].get(route, 0) + 1
+            if throttled:
+                self.stats["throttled"] += 1
+
+
+ODATA_STRING = r"'((?:[^']|'')*)'"
+
+
+def odata_unquote(value: str) -> str:
+    return value.replace("''", "'")
+
+
+class MockGraphHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockGraphServer
+    # Set while serving the requests of a $batch: responses are collected instead of sent
+    _batch_responses: Optional[List[Dict[str, Any]]] = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # Plumbing
+
+    def _send(self, status: int, body: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
+        if self._batch_responses is not None:
+            self._batch_responses.append({"status": status, "headers": headers or {}, "body": body})
+            return
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, code: str, message: str, headers: Optional[Dict[str, str]] = None):
+        self._send(status, {"error": {"code": code, "message": message}}, headers)
+
+    def _read_json(self) -> Dict[str, Any]:
+        return json.loads(self._body or b"{}")
+
+    def _page(self, items: List[Any], query: Dict[str, str], path: str, render) -> Dict[str, Any]:
+        top = min(int(query.get("$top", 100)), self.server.max_page_size)
+        skip = int(query.get("$skiptoken", 0))
+        page = {"value": [render(item) for item in items[skip:skip + top]]}
+        if query.get("$count") == "true":
+            page["@odata.count"] = len(items)
+        if skip + top < len(items):
+            next_query = {key: value for key, value in query.items() if key != "$skiptoken"}
+            next_query["$skiptoken"] = str(skip + top)
+            encoded = "&".join(f"{key}={quote(value, safe=',()')}" for key, value in next_query.items())
+            page["@odata.nextLink"] = f"{GRAPH_ROOT}{path}?{encoded}"
+        return page
+
+    def _handle(self, method: str):
+        # Read the body even if the request is throttled, or it would be parsed as the next
+        # request on this keep-alive connection
+        self._body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if path == "/_mock/stats":
+            return self._send(200, self.server.stats)
+        if not path.startswith("/v1.0/"):
+            return self._error(404, "Request_ResourceNotFound", f"Unknown path {path}")
+        path = path[len("/v1.0"):]
+        route = f"{method} " + re.sub(r"[0-9a-f]{8}-[0-9a-f-]{27}", "{id}", path)
+
+        latency = self.server.latency_ms + random.uniform(0, self.server.jitter_ms)
+        if latency:
+            time.sleep(latency / 1000)
+
+        if self.server.throttle_rate and random.random() < self.server.throttle_rate:
+            self.server.count(route, throttled=True)
+            return self._error(
+                429, "TooManyRequests", "Too many requests",
+                {"Retry-After": self.server.retry_after_header}
+            )
+        self.server.count(route)
+
+        if path == "/$batch" and method == "POST":
+            return self._batch(self._read_json().get("requests", []))
+        try:
+            return self._dispatch(method, path, query)
+        except (ValueError, KeyError) as e:
+            return self._error(400, "BadRequest", str(e))
+
+    def _batch(self, requests: List[Dict[str, Any]]):
+        """JSON $batch: each request is throttled, counted and served on its own"""
+        if len(requests) > BATCH_MAX_REQUESTS:
+            return self._error(400, "BadRequest", f"A $batch holds at most {BATCH_MAX_REQUESTS} requests")
+        responses = []
+        self._batch_responses = []
+        try:
+            for request in requests:
+                url = urlsplit(request["url"])
+                path = unquote(url.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                route = f"{request['method']} " + re.sub(r"[0-9a-f]{8}-[0-9a-f-]{27}", "{id}", path)
+                if self.server.throttle_rate and random.random() < self.server.throttle_rate:
+                    self.server.count(route, throttled=True)
+                    self._error(
+                        429, "TooManyRequests", "Too many requests",
+                        {"Retry-After": self.server.retry_after_header}
+                    )
+                else:
+                    self.server.count(route)
+                    try:
+                        self._dispatch(request["method"], path, query)
+                    except (ValueError, KeyError) as e:
+                        self._error(400, "BadRequest", str(e))
+                responses.append({"id": request["id"], **self._batch_responses.pop()})
+        finally:
+            self._batch_responses = None
+        return self._send(200, {"responses": responses})
+
+    def _dispatch(self, method: str, path: str, query: Dict[str, str]):
+        tenant = self.server.tenant
+        parts = [part for part in path.split("/") if part]
+        select = query["$select"].split(",") if query.get("$select") else None
+
+        if parts == ["organization"] and method == "GET":
+            return self._send(200, {"value": [{"id": "mock-tenant", "displayName": "Mock Tenant"}]})
+
+        if parts == ["groups"] and method == "GET":
+            return self._send(200, self._page(
+                self._query_groups(query), query, path, lambda g: tenant.group_json(g, select)
+            ))
+
+        if parts == ["groups"] and method == "POST":
+            body = self._read_json()
+            members = [parse_id(ref.rsplit("/", 1)[-1], USER_ID_PREFIX) for ref in body.get("members@odata.bind", [])]
+            owners = [parse_id(ref.rsplit("/", 1)[-1], USER_ID_PREFIX) for ref in body.get("owners@odata.bind", [])]
+            if len(members) + len(owners) > CREATE_BIND_LIMIT:
+                return self._error(
+                    400, "Request_BadRequest",
+                    f"At most {CREATE_BIND_LIMIT} members and owners can be bound when creating a group"
+                )
+            g = tenant.create_group(body["displayName"], body.get("description", ""),
+                                    [u for u in members if u is not None], [u for u in owners if u is not None])
+            return self._send(201, tenant.group_json(g))
+
+        if len(parts) >= 2 and parts[0] == "groups":
+            g = parse_id(parts[1], GROUP_ID_PREFIX)
+            if g is None or not tenant.group_exists(g):
+                return self._error(404, "Request_ResourceNotFound", f"Group {parts[1]} not found")
+
+            if len(parts) == 2 and method == "PATCH":
+                refs = self._read_json().get("members@odata.bind", [])
+                users = [parse_id(ref.rsplit("/", 1)[-1], USER_ID_PREFIX) for ref in refs]
+                if any(u is None for u in users):
+                    return self._error(404, "Request_ResourceNotFound", "Referenced user not found")
+                if not tenant.add_members(g, users):
+                    return self._error(
+                        400, "Request_BadRequest",
+                        "One or more added object references already exist for the following "
+                        "modified properties: 'members'."
+                    )
+                return self._send(204)
+
+            if parts[2:] == ["members"] and method == "GET":
+                return self._send(200, self._page(
+                    tenant.members_of(g), query, path, lambda u: tenant.user_json(u, select)
+                ))
+
+            if parts[2:] == ["members", "$ref"] and method == "POST":
+                u = parse_id(self._read_json()["@odata.id"].rsplit("/", 1)[-1], USER_ID_PREFIX)
+                if u is None:
+                    return self._error(404, "Request_ResourceNotFound", "Referenced user not found")
+                if not tenant.add_members(g, [u]):
+                    return self._error(
+                        400, "Request_BadRequest",
+                        "One or more added object references already exist for the following "
+                        "modified properties: 'members'."
+                    )
+                return self._send(204)
+
+            if parts[2:] == ["owners", "$ref"] and method == "POST":
+                u = parse_id(self._read_json()["@odata.id"].rsplit("/", 1)[-1], USER_ID_PREFIX)
+                if u is None:
+                    return self._error(404, "Request_ResourceNotFound", "Referenced user not found")
+                if not tenant.add_owner(g, u):
+                    return self._error(
+                        400, "Request_BadRequest",
+                        "One or more added object references already exist for the following "
+                        "modified properties: 'owners'."
+                    )
+                return self._send(204)
+
+            if len(parts) == 5 and parts[2] == "members" and parts[4] == "$ref" and method == "DELETE":
+                u = parse_id(parts[3], USER_ID_PREFIX)
+                if u is None or not tenant.remove_member(g, u):
+                    return self._error(404, "Request_ResourceNotFound", "Member not found")
+                return self._send(204)
+
+        if (len(parts) == 4 and parts[0] == "users" and parts[2] == "transitiveMemberOf"
+                and parts[3] in ("graph.group", "microsoft.graph.group")):
+            u = parse_id(parts[1], USER_ID_PREFIX)
+            if u is None or u >= tenant.user_count:
+                return self._error(404, "Request_ResourceNotFound", f"User {parts[1]} not found")
+            return self._send(200, self._page(
+                tenant.groups_of_user(u), query, path, lambda g: tenant.group_json(g, select)
+            ))
+
+        return self._error(400, "BadRequest", f"Unsupported request {method} {path}")
+
+    def _query_groups(self, query: Dict[str, str]) -> List[int]:
+        tenant = self.server.tenant
+        flt = query.get("$filter", "")
+        search = query.get("$search", "")
+
+        if search:
+            match = re.fullmatch(r'"displayName:(.*)"', search)
+            if not match:
+                raise ValueError("Only $search=\"displayName:...\" is supported")
+            return tenant.groups_containing(match.group(1).replace('\\"', '"'))
+        if not flt:
+            return list(range(tenant.group_count)) + sorted(tenant.created)
+
+        match = re.fullmatch(rf"startswith\(displayName,\s*{ODATA_STRING}\)", flt)
+        if match:
+            return tenant.groups_with_prefix(odata_unquote(match.group(1)))
+        match = re.fullmatch(rf"displayName eq {ODATA_STRING}", flt)
+        if match:
+            return tenant.groups_named([odata_unquote(match.group(1))])
+        match = re.fullmatch(r"displayName in \((.*)\)", flt)
+        if match:
+            return tenant.groups_named([odata_unquote(name) for name in re.findall(ODATA_STRING, match.group(1))])
+        raise ValueError(f"Unsupported $filter: {flt}")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Tenant and behaviour options shared with the benchmark runner"""
+    parser.add_argument("--groups", type=int, default=100000, help="Number of groups")
+    parser.add_argument("--users", type=int, default=200000, help="Number of users")
+    parser.add_argument("--members-per-group", type=int, default=20, help="Members of each small group")
+    parser.add_argument("--large-groups", type=int, default=1, help="Groups that also hold --large-size users")
+    parser.add_argument("--large-size", type=int, default=100000, help="Members of each large group")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Base latency of every Graph call")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Extra random latency (0..jitter)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s (rounded up)")
+    parser.add_argument("--max-page-size", type=int, default=999, help="Largest page the mock returns")
+
+
+def create_server(args, host: str = "127.0.0.1", port: int = 0) -> MockGraphServer:
+    tenant = MockTenant(args.groups, args.users, args.members_per_group, args.large_groups, args.large_size)
+    return MockGraphServer(
+        (host, port), tenant, args.latency_ms, args.jitter_ms,
+        args.throttle_rate, args.retry_after, args.max_page_size
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MS Graph stand-in for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_server(args, args.host, args.port)
+    print(f"Mock Graph listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Notification Replay
+Replays recorded Graph change-notification payloads (NOTIFICATION_RECORD_PATH files, or any
+.json/.jsonl files of notification bodies) against a running app, or just shows what the
+coalescer would apply
+
+    python -m benchmarks.replay_notifications recorded.jsonl --url http://localhost:7071/api/notifications/graph
+    python -m benchmarks.replay_notifications samples/ --client-state local-secret --dry-run
+
+--client-state rewrites every notification's clientState, so payloads recorded against one
+deployment can be replayed against another.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Iterator, List, Optional
+
+from services.notifications import ChangeCoalescer, GroupChange, parse_notifications
+
+DEFAULT_URL = "http://localhost:7071/api/notifications/graph"
+
+
+def iter_payloads(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    """Notification bodies from files (.json: one body or a list of bodies; .jsonl: one per line)"""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from iter_payloads(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith((".json", ".jsonl"))
+            ))
+            continue
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                data = json.load(f)
+                yield from (data if isinstance(data, list) else [data])
+
+
+def with_client_state(body: Dict[str, Any], client_state: Optional[str]) -> Dict[str, Any]:
+    if client_state is None:
+        return body
+    return {
+        **body,
+        "value": [{**notification, "clientState": client_state} for notification in body.get("value", [])]
+    }
+
+
+def post(url: str, body: Dict[str, Any]) -> int:
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+async def dry_run(payloads: List[Dict[str, Any]], client_state: str) -> Dict[str, Any]:
+    """Parse and coalesce locally, returning the changes that would be applied per tenant"""
+    applied: Dict[str, List[Dict[str, Any]]] = {}
+
+    async def collect(tenant_id: Optional[str], changes: List[GroupChange]):
+        applied.setdefault(tenant_id or "home", []).extend(change.to_dict() for change in changes)
+
+    coalescer = ChangeCoalescer(collect, window=0)
+    rejected = 0
+    for body in payloads:
+        changes, body_rejected = parse_notifications(body, client_state)
+        rejected += body_rejected
+        coalescer.add(changes)
+    await coalescer.flush()
+    return {"stats": {**coalescer.get_stats(), "rejected": rejected}, "changes": applied}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Graph change notifications")
+    parser.add_argument("paths", nargs="+", help="Recorded .json/.jsonl files or directories")
+    parser.add_argument("--url", default=DEFAULT_URL, help="GraphNotifications URL (add ?code= for a deployed app)")
+    parser.add_argument("--client-state", help="Rewrite clientState to this value")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds between posts")
+    parser.add_argument("--dry-run", action="store_true", help="Don't post; print the coalesced changes")
+    args = parser.parse_args()
+
+    payloads = [with_client_state(body, args.client_state) for body in iter_payloads(args.paths)]
+
+    if args.dry_run:
+        client_state = args.client_state or os.environ.get("NOTIFICATION_CLIENT_STATE", "")
+        json.dump(asyncio.run(dry_run(payloads, client_state)), sys.stdout, indent=2)
+        print()
+        return
+
+    statuses: Dict[int, int] = {}
+    started = time.perf_counter()
+    for i, body in enumerate(payloads):
+        if i and args.delay:
+            time.sleep(args.delay)
+        status = post(args.url, body)
+        statuses[status] = statuses.get(status, 0) + 1
+    print(json.dumps({
+        "payloads": len(payloads),
+        "notifications": sum(len(body.get("value", [])) for body in payloads),
+        "statuses": statuses,
+        "seconds": round(time.perf_counter() - started, 2)
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Benchmark Runner
+Drives the function_app.py routes against the mock Graph at a fixed concurrency and writes
+machine-readable results (req/s, latency percentiles, Graph calls per request, memory peak)
+
+    python -m benchmarks.run_benchmark --concurrency 16 --output results.json
+    python -m benchmarks.run_benchmark --baseline results-prev.json --tolerance 0.15
+
+With --baseline the run exits with status 1 if any scenario regressed beyond the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks import mock_graph
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA_VERSION = 1
+
+# name -> (function name, requests multiplier). Full 100k-member listings are expensive,
+# so that scenario runs a tenth of the requests.
+SCENARIOS: Dict[str, Tuple[str, float]] = {
+    "health": ("HealthCheck", 1),
+    "testConnection": ("TestAzureConnection", 0.2),
+    "searchPrefix": ("SearchGroups", 1),
+    "searchRanked": ("SearchGroups", 1),
+    "members": ("GetGroupMembers", 1),
+    "membersPage": ("GetGroupMembers", 1),
+    "membersLarge": ("GetGroupMembers", 0.1),
+    "membersQuery": ("QueryGroupMembers", 0.2),
+    "userGroups": ("GetUserGroups", 1),
+    "createGroup": ("CreateGroup", 0.5),
+    "addMember": ("AddGroupMember", 1),
+    "addMembersBulk": ("AddGroupMembersBulk", 0.5),
+    "syncMembersDryRun": ("SyncGroupMembers", 0.5),
+}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def max_rss_mb() -> float:
+    """Process memory high-water mark (ru_maxrss is KB on Linux, bytes on macOS)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_mock(args) -> Tuple[subprocess.Popen, str]:
+    """Start the mock Graph in its own process so it doesn't compete with the app for the GIL"""
+    command = [
+        sys.executable, "-m", "benchmarks.mock_graph", "--port", "0",
+        "--groups", str(args.groups), "--users", str(args.users),
+        "--members-per-group", str(args.members_per_group),
+        "--large-groups", str(args.large_groups), "--large-size", str(args.large_size),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--throttle-rate", str(args.throttle_rate), "--retry-after", str(args.retry_after),
+        "--max-page-size", str(args.max_page_size)
+    ]
+    process = subprocess.Popen(command, cwd=APP_DIR, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if "listening on" not in line:
+        process.kill()
+        raise RuntimeError(f"Mock Graph failed to start: {line!r}")
+    return process, line.rsplit(" ", 1)[-1].strip()
+
+
+class ScenarioRequests:
+    """Builds the HttpRequest for the i-th call of each scenario"""
+
+    def __init__(self, func, args, run_id: str):
+        self.func = func
+        self.args = args
+        self.run_id = run_id
+        self.small_groups = range(args.large_groups, args.groups)
+        # Users outside every large group, so adds don't collide with existing memberships
+        self.free_users = range(args.large_size, args.users)
+
+    def _request(self, method: str, url: str, params: Optional[Dict[str, str]] = None,
+                 route_params: Optional[Dict[str, str]] = None, body: Optional[Dict[str, Any]] = None):
+        return self.func.HttpRequest(
+            method=method,
+            url=f"http://localhost/api/{url}",
+            headers={"Content-Type": "application/json"},
+            params=params or {},
+            route_params=route_params or {},
+            body=json.dumps(body).encode() if body is not None else b""
+        )
+
+    def _free_pair(self, i: int) -> Tuple[int, int]:
+        """A (group, user) pair that isn't a membership yet and isn't used by another call"""
+        group = self.small_groups[i % len(self.small_groups)]
+        user = self.free_users[(i * 7919) % len(self.free_users)]
+        if user % self.args.groups == group:
+            user = self.free_users[(i * 7919 + 1) % len(self.free_users)]
+        return group, user
+
+    def build(self, scenario: str, i: int):
+        rng = random.Random(i)
+        if scenario == "health":
+            return self._request("GET", "health")
+        if scenario == "testConnection":
+            return self._request("GET", "azure/test")
+        if scenario == "searchPrefix":
+            prefix = mock_graph.group_name(rng.randrange(self.args.groups)).rsplit(".", 1)[0]
+            return self._request("GET", "groups/search", {"search": prefix, "top": "100"})
+        if scenario == "searchRanked":
+            term = f"{rng.choice(mock_graph.ROLES)}.{rng.randrange(1000):03d}"
+            return self._request("GET", "groups/search", {"search": term, "top": "25", "mode": "search"})
+        if scenario == "members":
+            group_id = mock_graph.group_id(rng.choice(self.small_groups))
+            return self._request("GET", f"groups/{group_id}/members", route_params={"groupId": group_id})
+        if scenario == "membersPage":
+            group_id = mock_graph.group_id(0)
+            return self._request("GET", f"groups/{group_id}/members", {"maxItems": "1000"},
+                                 {"groupId": group_id})
+        if scenario == "membersLarge":
+            group_id = mock_graph.group_id(0)
+            return self._request("GET", f"groups/{group_id}/members", route_params={"groupId": group_id})
+        if scenario == "membersQuery":
+            group_ids = [mock_graph.group_id(rng.choice(self.small_groups)) for _ in range(40)]
+            return self._request("POST", "groups/members:query", body={"groupIds": group_ids})
+        if scenario == "userGroups":
+            user_id = mock_graph.user_id(rng.randrange(self.args.users))
+            return self._request("GET", f"users/{user_id}/groups", {"prefix": "AAD.TA."}, {"userId": user_id})
+        if scenario == "createGroup":
+            return self._request("POST", "groups", body={
+                "name": f"AAD.TA.BENCH.{self.run_id}.{i:06d}",
+                "description": "Benchmark group",
+                "type": "Security"
+            })
+        if scenario == "addMember":
+            group, user = self._free_pair(i)
+            group_id = mock_graph.group_id(group)
+            return self._request("POST", f"groups/{group_id}/members", route_params={"groupId": group_id},
+                                 body={"userId": mock_graph.user_id(user)})
+        if scenario == "addMembersBulk":
+            group, _ = self._free_pair(i + 1000003)
+            group_id = mock_graph.group_id(group)
+            users = [self._free_pair(i * 50 + k + 2000003)[1] for k in range(50)]
+            return self._request("POST", f"groups/{group_id}/members:bulk", route_params={"groupId": group_id},
+                                 body={"userIds": [mock_graph.user_id(user) for user in dict.fromkeys(users)]})
+        if scenario == "syncMembersDryRun":
+            group = rng.choice(self.small_groups)
+            group_id = mock_graph.group_id(group)
+            desired = [mock_graph.user_id(user) for user in self.free_users[group:group + 20]]
+            return self._request("PUT", f"groups/{group_id}/members:sync", route_params={"groupId": group_id},
+                                 body={"memberIds": desired, "dryRun": True})
+        raise ValueError(f"Unknown scenario {scenario}")
+
+
+async def run_scenario(handler: Callable, build: Callable[[int], Any], total: int,
+                       concurrency: int, telemetry) -> Dict[str, Any]:
+    latencies: List[float] = []
+    status_counts: Dict[str, int] = {}
+    exceptions = 0
+    next_index = 0
+    before = telemetry.get_metrics()["totals"]
+
+    async def worker():
+        nonlocal next_index, exceptions
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            request = build(i)
+            started = time.perf_counter()
+            try:
+                response = handler(request)
+                if asyncio.iscoroutine(response):
+                    response = await response
+                status = str(response.status_code)
+            except Exception:
+                exceptions += 1
+                status = "exception"
+            latencies.append(time.perf_counter() - started)
+            status_counts[status] = status_counts.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    after = telemetry.get_metrics()["totals"]
+    delta = {key: after[key] - before[key] for key in ("graphCalls", "bytesReceived", "cacheHits",
+                                                       "cacheMisses", "throttleEvents")}
+    lookups = delta["cacheHits"] + delta["cacheMisses"]
+    latencies.sort()
+    errors = exceptions + sum(count for status, count in status_counts.items()
+                              if status.isdigit() and int(status) >= 500)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "durationSeconds": round(elapsed, 3),
+        "requestsPerSecond": round(total / elapsed, 2) if elapsed else None,
+        "errors": errors,
+        "statusCounts": status_counts,
+        "latencyMs": {
+            "mean": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p50": round(1000 * percentile(latencies, 0.50), 2),
+            "p95": round(1000 * percentile(latencies, 0.95), 2),
+            "p99": round(1000 * percentile(latencies, 0.99), 2),
+            "max": round(1000 * latencies[-1], 2) if latencies else 0.0
+        },
+        "graphCallsPerRequest": round(delta["graphCalls"] / total, 2) if total else 0.0,
+        "bytesReceivedPerRequest": round(delta["bytesReceived"] / total) if total else 0,
+        "cacheHitRatio": round(delta["cacheHits"] / lookups, 3) if lookups else None,
+        "throttleEvents": delta["throttleEvents"],
+        "maxRssMb": max_rss_mb()
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of this run against a baseline results file"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if current["requestsPerSecond"] < previous["requestsPerSecond"] * (1 - tolerance):
+            regressions.append(f"{name}: req/s {previous['requestsPerSecond']} -> {current['requestsPerSecond']}")
+        for key in ("p95", "p99"):
+            if current["latencyMs"][key] > previous["latencyMs"][key] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {key} {previous['latencyMs'][key]}ms -> {current['latencyMs'][key]}ms"
+                )
+        if current["graphCallsPerRequest"] > previous["graphCallsPerRequest"] * (1 + tolerance) + 0.01:
+            regressions.append(
+                f"{name}: Graph calls/request {previous['graphCallsPerRequest']} -> {current['graphCallsPerRequest']}"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+async def run(args, mock_url: str) -> Dict[str, Any]:
+    # The app reads its settings from the environment on first use
+    os.environ.update({
+        "GRAPH_MOCK_URL": mock_url,
+        "AZURE_TENANT_ID": "benchmark-tenant",
+        "AZURE_CLIENT_ID": "benchmark-client",
+        "AZURE_CLIENT_SECRET": "benchmark-secret",
+        "STARTUP_MODE": "lazy",
+        "CACHE_TTL_SECONDS": str(args.cache_ttl),
+        "TOKEN_CACHE_ENABLED": "false",
+        "JOB_QUEUE": "memory",
+        "JOB_STORE": "memory"
+    })
+    # A corporate proxy would capture graph.microsoft.com before the mock redirect
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        os.environ.pop(name, None)
+    sys.path.insert(0, APP_DIR)
+
+    import azure.functions as func
+    import function_app
+    from services import telemetry
+
+    handlers = {function.get_function_name(): function.get_user_function()
+                for function in function_app.app.get_functions()}
+    requests = ScenarioRequests(func, args, datetime.now(timezone.utc).strftime("%H%M%S"))
+    selected = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+
+    results: Dict[str, Any] = {
+        "schemaVersion": SCHEMA_VERSION,
+        "startedAt": datetime.now(timezone.utc).isoformat(),
+        "gitCommit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "cacheTtlSeconds": args.cache_ttl,
+            "mock": {
+                "groups": args.groups,
+                "users": args.users,
+                "membersPerGroup": args.members_per_group,
+                "largeGroups": args.large_groups,
+                "largeSize": args.large_size,
+                "latencyMs": args.latency_ms,
+                "jitterMs": args.jitter_ms,
+                "throttleRate": args.throttle_rate,
+                "maxPageSize": args.max_page_size
+            }
+        },
+        "scenarios": {}
+    }
+
+    for name in selected:
+        function_name, multiplier = SCENARIOS[name]
+        total = max(1, int(args.requests * multiplier))
+        print(f"Running {name} ({total} requests, concurrency {args.concurrency})...", flush=True)
+        results["scenarios"][name] = await run_scenario(
+            handlers[function_name], lambda i, name=name: requests.build(name, i),
+            total, args.concurrency, telemetry
+        )
+
+    with urllib.request.urlopen(f"{mock_url}/_mock/stats") as response:
+        results["mockGraph"] = json.loads(response.read())
+    results["maxRssMb"] = max_rss_mb()
+    return results
+
+
+def print_summary(results: Dict[str, Any]):
+    print(f"\n{'scenario':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'graph/req':>11}{'errors':>8}{'rss MB':>9}")
+    for name, scenario in results["scenarios"].items():
+        latency = scenario["latencyMs"]
+        print(f"{name:<20}{scenario['requestsPerSecond']:>10}{latency['p50']:>10}{latency['p95']:>10}"
+              f"{latency['p99']:>10}{scenario['graphCallsPerRequest']:>11}{scenario['errors']:>8}"
+              f"{scenario['maxRssMb']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Group Manager routes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent in-flight requests")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario (before multipliers)")
+    parser.add_argument("--scenarios", default="", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--cache-ttl", type=float, default=30.0, help="CACHE_TTL_SECONDS for the app (0 = off)")
+    parser.add_argument("--mock-url", default="", help="Use an already running mock instead of starting one")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", default="", help="Results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    mock_graph.add_arguments(parser)
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS) if args.scenarios else set()
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    process = None
+    mock_url = args.mock_url
+    if not mock_url:
+        process, mock_url = start_mock(args)
+    try:
+        results = asyncio.run(run(args, mock_url))
+    finally:
+        if process:
+            process.terminate()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_summary(results)
+    print(f"\nResults written to {args.output}")
+    for regression in results.get("regressions", []):
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if results.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,195 @@
 """
 Azure Functions App - Group Manager
-GET and POST endpoints only (security restricted)
+GET and POST endpoints, plus PUT for desired-state member sync (no DELETE endpoints)
+Long operations can run as queue-backed async jobs (POST /jobs)
+Other tenants (GRAPH_TENANTS) are selected with the X-Tenant-Id header or tenants/{tenantId}/... routes
 """
-import azure.functions as func
+from services.startup import STARTUP_MODE, WARMUP_IMPORTS, startup_timer
+
+with startup_timer.measure("import azure.functions"):
+    import azure.functions as func
 import logging
 import json
-from typing import Optional
+import os
+import threading
+from typing import Callable, List, Optional, TYPE_CHECKING
+
+# Import our services - the msgraph-backed ones are loaded on first use (see get_graph_service)
+from services.graph_scheduler import GraphThrottledError
+from services.jobs import JOB_QUEUE_NAME, public_job, validate_job_request
+from services.notifications import ChangeCoalescer, GroupChange, parse_notifications, record_payload
+from services.prewarm import DEFAULT_PREWARM_SCHEDULE
+from services.serialization import (
+    MEMBER_FIELDS, NDJSON_MIMETYPE, OUTPUT_FORMATS, RecordEncoder, dumps, member_select, validate_member_fields
+)
+from services.telemetry import configure_exporter, get_metrics, instrument, phase
+from services.tenants import TENANT_HEADER
 
-# Import our services
-from services.azure_graph_service import AzureGraphService
-from services.config import get_settings
+if TYPE_CHECKING:
+    from services.azure_graph_service import AzureGraphService
+    from services.jobs import JobRunner
+    from services.tenants import GraphServicePool
 
 # Initialize Function App
 app = func.FunctionApp()
 
-# Initialize services
-settings = get_settings()
-graph_service = AzureGraphService(settings)
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Initialize services lazily so /health never pays for msgraph or settings
+_graph_service: Optional["AzureGraphService"] = None
+_graph_service_lock = threading.Lock()
+
+
+def get_graph_service(tenant_id: Optional[str] = None) -> "AzureGraphService":
+    """
+    Get the Graph service for a tenant (default: the home tenant, AZURE_TENANT_ID),
+    importing msgraph and building it on first use. Other tenants come from the tenant pool.
+    """
+    global _graph_service
+    if tenant_id:
+        pool = get_tenant_pool()
+        if pool.resolve(tenant_id) != pool.home_tenant_id:
+            return pool.get(tenant_id)
+    if _graph_service is None:
+        with _graph_service_lock:
+            if _graph_service is None:
+                configure_exporter()
+                with startup_timer.measure("create AzureGraphService"):
+                    from services.azure_graph_service import AzureGraphService
+                    from services.config import get_settings
+                    service = AzureGraphService(get_settings())
+                    # Fetch the Graph token now so the first request doesn't pay for it
+                    service.start_token_prefetch()
+                _graph_service = service
+    return _graph_service
+
+
+_tenant_pool: Optional["GraphServicePool"] = None
+_tenant_pool_lock = threading.Lock()
+
+
+def _create_tenant_service(settings) -> "AzureGraphService":
+    configure_exporter()
+    from services.azure_graph_service import AzureGraphService
+    service = AzureGraphService(settings)
+    service.start_token_prefetch()
+    return service
+
+
+def get_tenant_pool() -> "GraphServicePool":
+    """Get the pool of Graph services for the tenants in GRAPH_TENANTS"""
+    global _tenant_pool
+    if _tenant_pool is None:
+        with _tenant_pool_lock:
+            if _tenant_pool is None:
+                from services.config import get_settings
+                from services.tenants import GraphServicePool
+                settings = get_settings()
+                _tenant_pool = GraphServicePool(settings, _create_tenant_service, settings.TENANT_POOL_SIZE)
+    return _tenant_pool
+
+
+def request_tenant(req: func.HttpRequest) -> Optional[str]:
+    """Tenant selected by the tenants/{tenantId}/... route or the X-Tenant-Id header (None: home)"""
+    return req.route_params.get("tenantId") or req.headers.get(TENANT_HEADER)
+
+
+def job_belongs_to(job: dict, tenant_id: str) -> bool:
+    """Jobs are only visible through their own tenant (jobs without one belong to the home tenant)"""
+    return (job.get("tenantId") or get_tenant_pool().home_tenant_id) == tenant_id
+
+
+def tenant_route(name: str, route: str, methods: List[str]) -> Callable:
+    """Also serve a handler as <name>ForTenant at tenants/{tenantId}/<route>"""
+    
+    def decorator(handler: Callable) -> Callable:
+        app.function_name(name=f"{name}ForTenant")(
+            app.route(route=f"tenants/{{tenantId}}/{route}", methods=methods,
+                      auth_level=func.AuthLevel.FUNCTION)(handler)
+        )
+        return handler
+    
+    return decorator
+
+
+_job_runner: Optional["JobRunner"] = None
+_job_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> "JobRunner":
+    """Get the async job runner (job store + queue + per-tenant Graph services) on first use"""
+    global _job_runner
+    if _job_runner is None:
+        with _job_runner_lock:
+            if _job_runner is None:
+                from services.config import get_settings
+                from services.export import create_export_sink
+                from services.jobs import JobRunner, create_job_queue, create_job_store
+                settings = get_settings()
+                _job_runner = JobRunner(
+                    get_graph_service,
+                    create_job_store(settings),
+                    create_job_queue(settings),
+                    settings.JOB_SLICE_SECONDS,
+                    lambda: create_export_sink(settings)
+                )
+    return _job_runner
+
+
+_change_coalescer: Optional[ChangeCoalescer] = None
+
+
+async def _apply_group_changes(tenant_id: Optional[str], changes: List[GroupChange]):
+    from services.config import get_settings
+    await get_graph_service(tenant_id).apply_group_changes(changes, get_settings().NOTIFICATION_REFRESH)
+
+
+def get_change_coalescer() -> ChangeCoalescer:
+    """Get the worker's change-notification coalescer on first use"""
+    global _change_coalescer
+    if _change_coalescer is None:
+        from services.config import get_settings
+        _change_coalescer = ChangeCoalescer(_apply_group_changes, get_settings().NOTIFICATION_COALESCE_SECONDS)
+    return _change_coalescer
+
+
+def _warm_up():
+    """Load the Graph SDK and build the service off the request path"""
+    try:
+        for module_name in WARMUP_IMPORTS:
+            startup_timer.import_timed(module_name)
+        get_graph_service()
+        logger.info(f"Warm-up finished: {json.dumps(startup_timer.get_report())}")
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}")
+
+
+if STARTUP_MODE == "eager":
+    get_graph_service()
+elif STARTUP_MODE == "background":
+    threading.Thread(target=_warm_up, name="graph-warm-up", daemon=True).start()
+
+
+def throttled_response(error: GraphThrottledError) -> func.HttpResponse:
+    """503 response telling the caller when Graph will accept requests again"""
+    logger.warning(f"Graph throttled: {str(error)}")
+    return func.HttpResponse(
+        json.dumps({
+            "error": str(error),
+            "message": "Graph API is throttling requests",
+            "retryAfter": round(error.retry_after, 1)
+        }),
+        mimetype="application/json",
+        status_code=503,
+        headers={"Retry-After": str(max(1, int(error.retry_after + 0.5)))}
+    )
+
 
 @app.function_name(name="HealthCheck")
 @app.route(route="health", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument("HealthCheck")
 def health_check(req: func.HttpRequest) -> func.HttpResponse:
     """Health check endpoint"""
     logger.info('Health check requested')
@@ -40,20 +205,46 @@ def health_check(req: func.HttpRequest) -> func.HttpResponse:
     )
 
 
+@app.function_name(name="StartupReport")
+@app.route(route="azure/startup", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@instrument("StartupReport")
+def startup_report(req: func.HttpRequest) -> func.HttpResponse:
+    """Cold-start timing for this worker, broken down by import"""
+    logger.info('Startup report requested')
+    
+    report = startup_timer.get_report()
+    report["graphServiceReady"] = _graph_service is not None
+    
+    return func.HttpResponse(
+        json.dumps(report),
+        mimetype="application/json",
+        status_code=200
+    )
+
+
 @app.function_name(name="TestAzureConnection")
 @app.route(route="azure/test", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("TestAzureConnection", "azure/test", ["GET"])
+@instrument("TestAzureConnection")
 async def test_azure_connection(req: func.HttpRequest) -> func.HttpResponse:
     """Test Azure AD connection"""
     logger.info('Azure connection test requested')
     
     try:
-        result = await graph_service.test_connection()
+        result = await get_graph_service(request_tenant(req)).test_connection()
         
         return func.HttpResponse(
             json.dumps(result),
             mimetype="application/json",
             status_code=200 if result.get("status") == "connected" else 500
         )
+    except ValueError as e:
+        # Unknown tenant
+        return func.HttpResponse(
+            json.dumps({"status": "failed", "error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
     except Exception as e:
         logger.error(f"Azure connection test failed: {str(e)}")
         return func.HttpResponse(
@@ -66,14 +257,128 @@ async def test_azure_connection(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
+@app.function_name(name="GraphSchedulerStats")
+@app.route(route="azure/scheduler", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("GraphSchedulerStats", "azure/scheduler", ["GET"])
+@instrument("GraphSchedulerStats")
+def graph_scheduler_stats(req: func.HttpRequest) -> func.HttpResponse:
+    """Graph request scheduler counters (queue depth, throttles, retries) for this worker"""
+    logger.info('Graph scheduler stats requested')
+    
+    try:
+        stats = get_graph_service(request_tenant(req)).get_scheduler_stats()
+    except ValueError as e:
+        # Unknown tenant
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    
+    return func.HttpResponse(
+        json.dumps(stats),
+        mimetype="application/json",
+        status_code=200
+    )
+
+
+@app.function_name(name="TenantPoolStats")
+@app.route(route="azure/tenants", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@instrument("TenantPoolStats")
+def tenant_pool_stats(req: func.HttpRequest) -> func.HttpResponse:
+    """Tenant pool counters (configured and live tenants, creations, evictions) for this worker"""
+    logger.info('Tenant pool stats requested')
+    
+    return func.HttpResponse(
+        json.dumps(get_tenant_pool().get_stats()),
+        mimetype="application/json",
+        status_code=200
+    )
+
+
+@app.function_name(name="TransportStats")
+@app.route(route="azure/transport", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@instrument("TransportStats")
+def transport_stats(req: func.HttpRequest) -> func.HttpResponse:
+    """Shared HTTP transport counters (requests, new connections, reuse ratio) for this worker"""
+    logger.info('Transport stats requested')
+    from services.transport import get_transport_stats
+    
+    return func.HttpResponse(
+        json.dumps(get_transport_stats()),
+        mimetype="application/json",
+        status_code=200
+    )
+
+
+@app.function_name(name="Metrics")
+@app.route(route="metrics", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Latency percentiles (p50/p95/p99) per endpoint, phase and Graph call, plus Graph call,
+    byte, cache and throttle totals for this worker. Unsampled, unlike Application Insights.
+    """
+    logger.info('Metrics requested')
+    
+    return func.HttpResponse(
+        json.dumps(get_metrics()),
+        mimetype="application/json",
+        status_code=200
+    )
+
+
+@app.function_name(name="SyncDirectoryMirror")
+@app.route(route="mirror/sync", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("SyncDirectoryMirror", "mirror/sync", ["POST"])
+@instrument("SyncDirectoryMirror")
+async def sync_directory_mirror(req: func.HttpRequest) -> func.HttpResponse:
+    """Sync the local directory mirror with Graph delta queries now"""
+    logger.info('Directory mirror sync requested')
+    
+    try:
+        result = await get_graph_service(request_tenant(req)).sync_mirror()
+        
+        return func.HttpResponse(
+            json.dumps(result),
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except ValueError as e:
+        # Mirror not enabled
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
+    except Exception as e:
+        logger.error(f"Mirror sync failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to sync directory mirror"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
 @app.function_name(name="SearchGroups")
 @app.route(route="groups/search", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("SearchGroups", "groups/search", ["GET"])
+@instrument("SearchGroups")
 async def search_groups(req: func.HttpRequest) -> func.HttpResponse:
     """
     Search/List Azure AD groups
     Query params:
-    - search: Optional search term (filters by display name)
+    - search: Optional search term (filters by display name; required for mode=fuzzy)
     - top: Optional limit (default 100)
+    - consistency: 'live' (default, Graph + read cache) or 'mirror' (local directory mirror)
+    - mode: 'prefix' (default, startswith), 'search' (substring via Graph $search, ranked)
+      or 'fuzzy' (local trigram index, ranked)
+    - fields: Optional comma-separated fields to return, e.g. id,displayName
     """
     logger.info('Search groups requested')
     
@@ -81,19 +386,45 @@ async def search_groups(req: func.HttpRequest) -> func.HttpResponse:
         # Get query parameters
         search_term = req.params.get('search', '')
         top = int(req.params.get('top', 100))
+        consistency = req.params.get('consistency', 'live')
+        mode = req.params.get('mode', 'prefix')
+        fields = [field.strip() for field in req.params.get('fields', '').split(',') if field.strip()]
         
-        # Search groups using Graph API
-        groups = await graph_service.search_groups(search_term, top)
+        if consistency not in ["live", "mirror"]:
+            raise ValueError("consistency must be 'live' or 'mirror'")
+        if mode == "fuzzy" and not search_term.strip():
+            raise ValueError("search is required for mode=fuzzy")
         
-        return func.HttpResponse(
-            json.dumps({
+        # Search groups using Graph API or the local mirror
+        graph_service = get_graph_service(request_tenant(req))
+        if consistency == "mirror":
+            if mode != "prefix" or fields:
+                raise ValueError("consistency=mirror only supports mode=prefix without fields")
+            groups = await graph_service.search_groups_mirror(search_term, top)
+        else:
+            groups = await graph_service.search_groups(search_term, top, mode, fields or None)
+        
+        with phase("serialize"):
+            body = json.dumps({
                 "groups": groups,
                 "count": len(groups)
-            }),
+            })
+        
+        return func.HttpResponse(
+            body,
             mimetype="application/json",
             status_code=200
         )
         
+    except ValueError as e:
+        # Validation errors (bad top / consistency / mode / fields / unknown tenant)
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
     except Exception as e:
         logger.error(f"Search groups failed: {str(e)}")
         return func.HttpResponse(
@@ -108,10 +439,23 @@ async def search_groups(req: func.HttpRequest) -> func.HttpResponse:
 
 @app.function_name(name="GetGroupMembers")
 @app.route(route="groups/{groupId}/members", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("GetGroupMembers", "groups/{groupId}/members", ["GET"])
+@instrument("GetGroupMembers")
 async def get_group_members(req: func.HttpRequest) -> func.HttpResponse:
     """
     Get members of a specific Azure AD group
     Path param: groupId (GUID)
+    Query params:
+    - maxItems: Optional cap on the number of members returned
+    - cursor: Optional nextCursor from a previous response to resume from
+    - consistency: 'live' (default) or 'mirror' (local directory mirror, no cursor)
+    - fields: Optional comma-separated fields to return (id, displayName, type, userPrincipalName)
+    - format: 'json' (default), 'ndjson' (one member per line; count and nextCursor in the
+      X-Count / X-Next-Cursor headers) or 'columnar' (columns header plus value rows)
+    - expand: 'direct' (default) or 'transitive' (members of nested groups too, nested groups
+      left out, no cursor)
+    - strategy: with expand=transitive, 'graph' (default, Graph transitiveMembers) or 'walk'
+      (concurrent walk of the nested groups)
     """
     logger.info('Get group members requested')
     
@@ -126,19 +470,76 @@ async def get_group_members(req: func.HttpRequest) -> func.HttpResponse:
                 status_code=400
             )
         
-        # Get group members from Graph API
-        members = await graph_service.get_group_members(group_id)
+        max_items = req.params.get('maxItems')
+        max_items = int(max_items) if max_items else None
+        if max_items is not None and max_items < 1:
+            raise ValueError("maxItems must be a positive integer")
+        cursor = req.params.get('cursor') or None
+        consistency = req.params.get('consistency', 'live')
+        
+        if consistency not in ["live", "mirror"]:
+            raise ValueError("consistency must be 'live' or 'mirror'")
+        
+        output_format = req.params.get('format', 'json')
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(OUTPUT_FORMATS)}")
+        fields = [field.strip() for field in req.params.get('fields', '').split(',') if field.strip()]
+        error = validate_member_fields(fields)
+        if error:
+            raise ValueError(error)
+        expand = req.params.get('expand', 'direct')
+        if expand not in ["direct", "transitive"]:
+            raise ValueError("expand must be 'direct' or 'transitive'")
+        
+        graph_service = get_graph_service(request_tenant(req))
+        encoder = RecordEncoder(fields or MEMBER_FIELDS, output_format)
+        next_cursor = None
+        if expand == "transitive":
+            if cursor or consistency == "mirror":
+                raise ValueError("expand=transitive does not support cursor or consistency=mirror")
+            members = await graph_service.get_transitive_members(group_id, req.params.get('strategy', 'graph'))
+            with phase("serialize"):
+                encoder.add(members[:max_items])
+        elif consistency == "mirror":
+            if cursor:
+                raise ValueError("cursor is not supported with consistency=mirror")
+            members = await graph_service.get_group_members_mirror(group_id, max_items)
+            with phase("serialize"):
+                encoder.add(members)
+        else:
+            # Encode each page as it arrives so the SDK models can be released page by page
+            async for members, page_cursor in graph_service.iter_group_members(
+                group_id, max_items, cursor, member_select(fields)
+            ):
+                with phase("serialize"):
+                    encoder.add(members)
+                next_cursor = page_cursor
+        
+        with phase("serialize"):
+            body = encoder.body({"groupId": group_id, "expand": expand, "nextCursor": next_cursor})
+        
+        if output_format == "ndjson":
+            headers = {"X-Count": str(encoder.count)}
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+            return func.HttpResponse(body, mimetype=NDJSON_MIMETYPE, status_code=200, headers=headers)
         
         return func.HttpResponse(
-            json.dumps({
-                "groupId": group_id,
-                "members": members,
-                "count": len(members)
-            }),
+            body,
             mimetype="application/json",
             status_code=200
         )
         
+    except ValueError as e:
+        # Validation errors (bad maxItems / cursor / consistency / fields / format / expand /
+        # strategy / unknown tenant)
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
     except Exception as e:
         logger.error(f"Get group members failed: {str(e)}")
         return func.HttpResponse(
@@ -151,8 +552,173 @@ async def get_group_members(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
+@app.function_name(name="QueryGroupMembers")
+@app.route(route="groups/members:query", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("QueryGroupMembers", "groups/members:query", ["POST"])
+@instrument("QueryGroupMembers")
+async def query_group_members(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get the members of many Azure AD groups in one request
+    Request body:
+    {
+        "groupIds": ["<group GUID>", ...]
+    }
+    Query params:
+    - fields: Optional comma-separated fields to return (id, displayName, type, userPrincipalName)
+    
+    Repeated ids are fetched once. Groups that fail are listed under errors (status 207)
+    instead of failing the request.
+    """
+    logger.info('Query group members requested')
+    
+    try:
+        req_body = req.get_json()
+        group_ids = req_body.get('groupIds')
+        
+        if not group_ids or not isinstance(group_ids, list) or not all(
+            isinstance(group_id, str) and group_id.strip() for group_id in group_ids
+        ):
+            return func.HttpResponse(
+                json.dumps({
+                    "error": "groupIds must be a non-empty list of group IDs",
+                    "propertyName": "groupIds"
+                }),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        fields = [field.strip() for field in req.params.get('fields', '').split(',') if field.strip()]
+        error = validate_member_fields(fields)
+        if error:
+            raise ValueError(error)
+        
+        graph_service = get_graph_service(request_tenant(req))
+        max_groups = graph_service.settings.MEMBERS_QUERY_MAX_GROUPS
+        if len(group_ids) > max_groups:
+            raise ValueError(f"At most {max_groups} groupIds per request")
+        
+        results = await graph_service.get_members_of_groups([group_id.strip() for group_id in group_ids])
+        
+        errors = [result for result in results if "error" in result]
+        if errors and len(errors) == len(results) and all(result["status"] == 503 for result in errors):
+            # Nothing succeeded because Graph is throttling - answer like the single-group routes
+            raise GraphThrottledError(errors[0]["error"], max(result["retryAfter"] for result in errors))
+        
+        with phase("serialize"):
+            groups = []
+            for result in results:
+                if "error" in result:
+                    continue
+                encoder = RecordEncoder(fields or MEMBER_FIELDS)
+                encoder.add(result["members"])
+                groups.append(encoder.body({"groupId": result["groupId"]}))
+            body = (
+                '{"requested":' + str(len(group_ids))
+                + ',"groups":[' + ",".join(groups)
+                + '],"errors":' + dumps(errors)
+                + ',"summary":' + dumps({"succeeded": len(groups), "failed": len(errors)}) + "}"
+            )
+        
+        return func.HttpResponse(
+            body,
+            mimetype="application/json",
+            status_code=200 if not errors else 207
+        )
+        
+    except ValueError as e:
+        # Invalid JSON body / fields / too many groups / unknown tenant
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
+    except Exception as e:
+        logger.error(f"Query group members failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to get group members"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="GetUserGroups")
+@app.route(route="users/{userId}/groups", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("GetUserGroups", "users/{userId}/groups", ["GET"])
+@instrument("GetUserGroups")
+async def get_user_groups(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get the groups a user belongs to
+    Path param: userId (GUID or userPrincipalName)
+    Query params:
+    - prefix: Optional displayName prefix filter (e.g. AAD.TA.)
+    - source: 'graph' (default, transitive memberships) or 'index' (direct memberships
+      of groups already listed by this worker, no Graph calls)
+    """
+    logger.info('Get user groups requested')
+    
+    try:
+        user_id = req.route_params.get('userId')
+        
+        if not user_id:
+            return func.HttpResponse(
+                json.dumps({"error": "User ID is required"}),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        prefix = req.params.get('prefix', '')
+        source = req.params.get('source', 'graph')
+        
+        if source not in ["graph", "index"]:
+            raise ValueError("source must be 'graph' or 'index'")
+        
+        graph_service = get_graph_service(request_tenant(req))
+        response = {"userId": user_id, "source": source}
+        if source == "index":
+            response.update(graph_service.get_user_groups_indexed(user_id, prefix))
+        else:
+            response["groups"] = await graph_service.get_user_groups(user_id, prefix)
+        response["count"] = len(response["groups"])
+        
+        with phase("serialize"):
+            body = json.dumps(response)
+        
+        return func.HttpResponse(
+            body,
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except ValueError as e:
+        # Validation errors (bad source / index not enabled / unknown tenant)
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
+    except Exception as e:
+        logger.error(f"Get user groups failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to get user groups"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
 @app.function_name(name="CreateGroup")
 @app.route(route="groups", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("CreateGroup", "groups", ["POST"])
+@instrument("CreateGroup")
 async def create_group(req: func.HttpRequest) -> func.HttpResponse:
     """
     Create a new Azure AD group
@@ -217,7 +783,7 @@ async def create_group(req: func.HttpRequest) -> func.HttpResponse:
             )
         
         # Create group using Graph API
-        created_group = await graph_service.create_group(name, description, group_type)
+        created_group = await get_graph_service(request_tenant(req)).create_group(name, description, group_type)
         
         return func.HttpResponse(
             json.dumps({
@@ -235,6 +801,8 @@ async def create_group(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json",
             status_code=400
         )
+    except GraphThrottledError as e:
+        return throttled_response(e)
     except Exception as e:
         logger.error(f"Create group failed: {str(e)}")
         return func.HttpResponse(
@@ -245,36 +813,664 @@ async def create_group(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json",
             status_code=500
         )
-@app.function_name(name="AddGroupMember")
-@app.route(route="groups/{groupId}/members", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
-async def add_group_member(req: func.HttpRequest) -> func.HttpResponse:
-    """Add a member to a group"""
-    logger.info('Add group member requested')
+
+
+@app.function_name(name="CreateGroupsBulk")
+@app.route(route="groups:bulk", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("CreateGroupsBulk", "groups:bulk", ["POST"])
+@instrument("CreateGroupsBulk")
+async def create_groups_bulk(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Create many Azure AD groups from a manifest (safe to re-run)
+    Request body:
+    {
+        "groups": [
+            {
+                "name": "AAD.TA.DM.DEVOPS.ENGINEER",
+                "description": "DevOps Engineers Group",
+                "type": "Security" or "Microsoft365",
+                "members": ["<user GUID>", ...],
+                "owners": ["<user GUID>", ...]
+            }
+        ]
+    }
+    """
+    logger.info('Bulk create groups requested')
     
     try:
-        group_id = req.route_params.get('groupId')
         req_body = req.get_json()
-        user_id = req_body.get('userId')
+        specs = req_body.get('groups')
         
-        if not group_id or not user_id:
+        if not specs or not isinstance(specs, list):
             return func.HttpResponse(
-                json.dumps({"error": "groupId and userId are required"}),
+                json.dumps({
+                    "error": "groups must be a non-empty list",
+                    "propertyName": "groups"
+                }),
                 mimetype="application/json",
                 status_code=400
             )
         
-        result = await graph_service.add_group_member(group_id, user_id)
+        results = await get_graph_service(request_tenant(req)).provision_groups(specs)
+        
+        summary = {"created": 0, "existed": 0, "failed": 0}
+        for result in results:
+            summary[result["status"]] += 1
         
         return func.HttpResponse(
-            json.dumps(result),
+            json.dumps({
+                "summary": summary,
+                "results": results
+            }),
             mimetype="application/json",
-            status_code=201
+            status_code=200 if summary["failed"] == 0 else 207
         )
         
-    except Exception as e:
-        logger.error(f"Add member failed: {str(e)}")
+    except ValueError as e:
+        # Invalid JSON body
         return func.HttpResponse(
             json.dumps({"error": str(e)}),
             mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
+    except Exception as e:
+        logger.error(f"Bulk create groups failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to create groups"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="AddGroupMember")
+@app.route(route="groups/{groupId}/members", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("AddGroupMember", "groups/{groupId}/members", ["POST"])
+@instrument("AddGroupMember")
+async def add_group_member(req: func.HttpRequest) -> func.HttpResponse:
+    """Add a member to a group"""
+    logger.info('Add group member requested')
+    
+    try:
+        group_id = req.route_params.get('groupId')
+        req_body = req.get_json()
+        user_id = req_body.get('userId')
+        
+        if not group_id or not user_id:
+            return func.HttpResponse(
+                json.dumps({"error": "groupId and userId are required"}),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        result = await get_graph_service(request_tenant(req)).add_group_member(group_id, user_id)
+        
+        return func.HttpResponse(
+            json.dumps(result),
+            mimetype="application/json",
+            status_code=201
+        )
+        
+    except ValueError as e:
+        # Invalid JSON body or unknown tenant
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
+    except Exception as e:
+        logger.error(f"Add member failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="AddGroupMembersBulk")
+@app.route(route="groups/{groupId}/members:bulk", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("AddGroupMembersBulk", "groups/{groupId}/members:bulk", ["POST"])
+@instrument("AddGroupMembersBulk")
+async def add_group_members_bulk(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Add many members to a group
+    Request body:
+    {
+        "userIds": ["<user GUID>", "<user GUID>", ...]
+    }
+    """
+    logger.info('Bulk add group members requested')
+    
+    try:
+        group_id = req.route_params.get('groupId')
+        req_body = req.get_json()
+        user_ids = req_body.get('userIds')
+        
+        if not group_id or not user_ids:
+            return func.HttpResponse(
+                json.dumps({"error": "groupId and userIds are required"}),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        if not isinstance(user_ids, list) or not all(isinstance(u, str) and u for u in user_ids):
+            return func.HttpResponse(
+                json.dumps({
+                    "error": "userIds must be a list of user IDs",
+                    "propertyName": "userIds"
+                }),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        results = await get_graph_service(request_tenant(req)).add_group_members_bulk(group_id, user_ids)
+        
+        summary = {"added": 0, "alreadyMember": 0, "failed": 0}
+        for result in results:
+            summary[result["status"]] += 1
+        
+        return func.HttpResponse(
+            json.dumps({
+                "groupId": group_id,
+                "summary": summary,
+                "results": results
+            }),
+            mimetype="application/json",
+            status_code=200 if summary["failed"] == 0 else 207
+        )
+        
+    except ValueError as e:
+        # Invalid JSON body
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
+    except Exception as e:
+        logger.error(f"Bulk add members failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="SyncGroupMembers")
+@app.route(route="groups/{groupId}/members:sync", methods=["PUT"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("SyncGroupMembers", "groups/{groupId}/members:sync", ["PUT"])
+@instrument("SyncGroupMembers")
+async def sync_group_members(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Make a group's direct membership match the desired set (adds and removes only the diff)
+    Request body:
+    {
+        "memberIds": ["<object GUID>", ...],
+        "dryRun": false,
+        "allowEmpty": false,
+        "includeIds": false
+    }
+    The ids to add and remove are returned for a dry run, otherwise only with includeIds
+    """
+    logger.info('Sync group members requested')
+    
+    try:
+        group_id = req.route_params.get('groupId')
+        req_body = req.get_json()
+        member_ids = req_body.get('memberIds')
+        dry_run = bool(req_body.get('dryRun', False))
+        allow_empty = bool(req_body.get('allowEmpty', False))
+        include_ids = bool(req_body.get('includeIds', False))
+        
+        if not group_id or member_ids is None:
+            return func.HttpResponse(
+                json.dumps({"error": "groupId and memberIds are required"}),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        if not isinstance(member_ids, list) or not all(isinstance(m, str) and m for m in member_ids):
+            return func.HttpResponse(
+                json.dumps({
+                    "error": "memberIds must be a list of object IDs",
+                    "propertyName": "memberIds"
+                }),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        # An empty feed would remove everyone - make callers say they mean it
+        if not member_ids and not allow_empty:
+            return func.HttpResponse(
+                json.dumps({
+                    "error": "memberIds is empty; set allowEmpty to remove every member",
+                    "propertyName": "memberIds"
+                }),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        result = await get_graph_service(request_tenant(req)).sync_group_members(
+            group_id, member_ids, dry_run, include_ids
+        )
+        
+        return func.HttpResponse(
+            json.dumps(result),
+            mimetype="application/json",
+            status_code=200 if not result.get("failures") else 207
+        )
+        
+    except ValueError as e:
+        # Invalid JSON body
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except GraphThrottledError as e:
+        return throttled_response(e)
+    except Exception as e:
+        logger.error(f"Sync group members failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to sync group members"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="SubmitJob")
+@app.route(route="jobs", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("SubmitJob", "jobs", ["POST"])
+@instrument("SubmitJob")
+async def submit_job(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Run a long group operation in the background and return 202 with a job id
+    Request body:
+    {
+        "type": "listMembers" | "bulkAddMembers" | "syncMembers" | "bulkCreateGroups" | "exportDirectory",
+        "params": {...}   # same fields as the synchronous endpoint, plus groupId
+    }
+    exportDirectory params: prefix (default AAD.TA.), format (ndjson | columnar | parquet),
+    incremental (changes since the last snapshot), name (export name, default aad-ta)
+    """
+    logger.info('Submit job requested')
+    
+    try:
+        req_body = req.get_json()
+        job_type = req_body.get('type')
+        params = req_body.get('params')
+        
+        error = validate_job_request(job_type, params)
+        if error:
+            return func.HttpResponse(
+                json.dumps({"error": error}),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        pool = get_tenant_pool()
+        tenant_id = pool.resolve(request_tenant(req))
+        job = await get_job_runner().submit(job_type, params, tenant_id)
+        status_url = f"/api/jobs/{job['id']}"
+        if tenant_id != pool.home_tenant_id:
+            status_url = f"/api/tenants/{tenant_id}/jobs/{job['id']}"
+        
+        return func.HttpResponse(
+            json.dumps({
+                "jobId": job["id"],
+                "status": job["status"],
+                "statusUrl": status_url
+            }),
+            mimetype="application/json",
+            status_code=202,
+            headers={"Location": status_url}
+        )
+        
+    except ValueError as e:
+        # Invalid JSON body, unknown tenant or job backend configuration
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f"Submit job failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to submit job"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="GetJob")
+@app.route(route="jobs/{jobId}", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("GetJob", "jobs/{jobId}", ["GET"])
+@instrument("GetJob")
+async def get_job(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get a job's status, progress and result summary
+    """
+    logger.info('Get job requested')
+    
+    try:
+        job_id = req.route_params.get('jobId')
+        tenant_id = get_tenant_pool().resolve(request_tenant(req))
+        job = await get_job_runner().store.get(job_id)
+        
+        if not job or not job_belongs_to(job, tenant_id):
+            return func.HttpResponse(
+                json.dumps({"error": f"Job {job_id} not found"}),
+                mimetype="application/json",
+                status_code=404
+            )
+        
+        return func.HttpResponse(
+            json.dumps(public_job(job)),
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except ValueError as e:
+        # Unknown tenant
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f"Get job failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to get job"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="GetJobResults")
+@app.route(route="jobs/{jobId}/results", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("GetJobResults", "jobs/{jobId}/results", ["GET"])
+@instrument("GetJobResults")
+async def get_job_results(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get one chunk of a job's result items
+    Query params:
+    - chunk: Chunk number (default 0); follow nextChunk until it is null
+    """
+    logger.info('Get job results requested')
+    
+    try:
+        job_id = req.route_params.get('jobId')
+        chunk = int(req.params.get('chunk', 0))
+        if chunk < 0:
+            raise ValueError("chunk must be zero or positive")
+        
+        tenant_id = get_tenant_pool().resolve(request_tenant(req))
+        runner = get_job_runner()
+        job = await runner.store.get(job_id)
+        if not job or not job_belongs_to(job, tenant_id):
+            return func.HttpResponse(
+                json.dumps({"error": f"Job {job_id} not found"}),
+                mimetype="application/json",
+                status_code=404
+            )
+        
+        items = await runner.store.get_result_chunk(job_id, chunk) if chunk < job["resultChunks"] else None
+        
+        return func.HttpResponse(
+            json.dumps({
+                "jobId": job_id,
+                "status": job["status"],
+                "chunk": chunk,
+                "items": items or [],
+                "nextChunk": chunk + 1 if chunk + 1 < job["resultChunks"] else None
+            }),
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except ValueError as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f"Get job results failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to get job results"
+            }),
+            mimetype="application/json",
             status_code=500
-        )
\ No newline at end of file
+        )
+
+
+@app.function_name(name="RunJob")
+@app.queue_trigger(arg_name="msg", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+@instrument("RunJob")
+async def run_job(msg: func.QueueMessage) -> None:
+    """
+    Queue worker: run a job for one time slice, resuming from its last checkpoint
+    """
+    job_id = msg.get_body().decode()
+    logger.info(f'Run job {job_id} (dequeue count {msg.dequeue_count})')
+    await get_job_runner().run(job_id)
+
+
+@app.function_name(name="GraphNotifications")
+@app.route(route="notifications/graph", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@instrument("GraphNotifications")
+async def graph_notifications(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Graph change-notification webhook for groups (subscriptions are managed by
+    RenewGraphSubscriptions). Answers the validation handshake, drops notifications with a
+    wrong clientState and queues the rest for coalesced cache invalidation.
+    Query params:
+    - validationToken: Sent by Graph when a subscription is created; echoed back as text/plain
+    """
+    validation_token = req.params.get('validationToken')
+    if validation_token:
+        logger.info('Graph subscription validation requested')
+        return func.HttpResponse(validation_token, mimetype="text/plain", status_code=200)
+    
+    logger.info('Graph notifications received')
+    
+    try:
+        from services.config import get_settings
+        settings = get_settings()
+        body = req.get_json()
+        if settings.NOTIFICATION_RECORD_PATH:
+            record_payload(settings.NOTIFICATION_RECORD_PATH, body)
+        
+        changes, rejected = parse_notifications(body, settings.NOTIFICATION_CLIENT_STATE)
+        if rejected:
+            logger.warning(f"Rejected {rejected} notifications with a missing or wrong clientState")
+        if rejected and not changes:
+            return func.HttpResponse(
+                json.dumps({"error": "Invalid clientState"}),
+                mimetype="application/json",
+                status_code=403
+            )
+        
+        # Graph wants an answer within 3 seconds - invalidation happens after the coalescing window
+        get_change_coalescer().add(changes)
+        
+        return func.HttpResponse(
+            json.dumps({"accepted": len(changes), "rejected": rejected}),
+            mimetype="application/json",
+            status_code=202
+        )
+        
+    except ValueError as e:
+        # Invalid JSON body or not a notification collection
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f"Graph notifications failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to process Graph notifications"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+async def _ensure_subscriptions() -> dict:
+    """Create or renew the group subscription of the home tenant and every GRAPH_TENANTS tenant"""
+    from services.config import get_settings
+    settings = get_settings()
+    if not settings.NOTIFICATION_URL:
+        raise ValueError("NOTIFICATION_URL is not set")
+    
+    results = []
+    for tenant_id in [settings.AZURE_TENANT_ID] + list(settings.GRAPH_TENANTS):
+        try:
+            results.append(await get_graph_service(tenant_id).ensure_group_subscription(
+                settings.NOTIFICATION_URL,
+                settings.NOTIFICATION_CLIENT_STATE,
+                settings.NOTIFICATION_SUBSCRIPTION_HOURS
+            ))
+        except Exception as e:
+            logger.error(f"Subscription for tenant {tenant_id} failed: {str(e)}")
+            results.append({"tenantId": tenant_id, "action": "failed", "error": str(e)})
+    return {
+        "subscriptions": results,
+        "failed": sum(1 for result in results if result["action"] == "failed")
+    }
+
+
+@app.function_name(name="EnsureGraphSubscriptions")
+@app.route(route="notifications/subscriptions", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@instrument("EnsureGraphSubscriptions")
+async def ensure_graph_subscriptions(req: func.HttpRequest) -> func.HttpResponse:
+    """Create or renew the Graph group subscriptions now (e.g. right after deployment)"""
+    logger.info('Ensure Graph subscriptions requested')
+    
+    try:
+        result = await _ensure_subscriptions()
+        
+        return func.HttpResponse(
+            json.dumps(result),
+            mimetype="application/json",
+            status_code=200 if not result["failed"] else 502
+        )
+        
+    except ValueError as e:
+        # Notifications not configured
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f"Ensure Graph subscriptions failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "Failed to ensure Graph subscriptions"
+            }),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="RenewGraphSubscriptions")
+@app.timer_trigger(schedule="0 0 */6 * * *", arg_name="timer", run_on_startup=False)
+@instrument("RenewGraphSubscriptions")
+async def renew_graph_subscriptions(timer: func.TimerRequest) -> None:
+    """
+    Timer: extend the Graph group subscriptions every 6 hours (they expire after
+    NOTIFICATION_SUBSCRIPTION_HOURS), recreating any that Graph removed
+    """
+    from services.config import get_settings
+    if not get_settings().NOTIFICATION_URL:
+        return
+    result = await _ensure_subscriptions()
+    logger.info(f"Graph subscriptions renewed: {json.dumps(result)}")
+
+
+@app.function_name(name="NotificationStats")
+@app.route(route="azure/notifications", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@instrument("NotificationStats")
+def notification_stats(req: func.HttpRequest) -> func.HttpResponse:
+    """Change-notification counters (received, coalesced, applied, pending) for this worker"""
+    logger.info('Notification stats requested')
+    
+    return func.HttpResponse(
+        json.dumps(get_change_coalescer().get_stats()),
+        mimetype="application/json",
+        status_code=200
+    )
+
+
+# Read when the functions are indexed (before settings load), so it has a default instead of
+# a %PREWARM_SCHEDULE% binding expression that would fail indexing wherever it isn't set
+@app.function_name(name="PrewarmHotData")
+@app.timer_trigger(
+    schedule=os.environ.get("PREWARM_SCHEDULE", DEFAULT_PREWARM_SCHEDULE), arg_name="timer", run_on_startup=False
+)
+@instrument("PrewarmHotData")
+async def prewarm_hot_data(timer: func.TimerRequest) -> None:
+    """
+    Timer: keep the worker, its Graph token and connection warm, and reload the most requested
+    searches and member lists (home tenant and live pooled tenants) before they expire
+    """
+    from services.config import get_settings
+    settings = get_settings()
+    if not settings.PREWARM_ENABLED:
+        return
+    
+    services = [(settings.AZURE_TENANT_ID, get_graph_service())] + get_tenant_pool().live_services()
+    for tenant_id, service in services:
+        try:
+            report = await service.prewarm(settings.PREWARM_HOT_SEARCHES, settings.PREWARM_HOT_GROUPS)
+            logger.info(f"Pre-warm finished: {json.dumps(report)}")
+        except Exception as e:
+            logger.error(f"Pre-warm of tenant {tenant_id} failed: {str(e)}")
+
+
+@app.function_name(name="PrewarmStats")
+@app.route(route="azure/prewarm", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@tenant_route("PrewarmStats", "azure/prewarm", ["GET"])
+@instrument("PrewarmStats")
+def prewarm_stats(req: func.HttpRequest) -> func.HttpResponse:
+    """Pre-warm counters (tracked keys, warm hits, latency saved, last run) for this worker"""
+    logger.info('Pre-warm stats requested')
+    
+    try:
+        stats = get_graph_service(request_tenant(req)).get_prewarm_stats()
+    except ValueError as e:
+        # Unknown tenant
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    
+    return func.HttpResponse(
+        json.dumps(stats),
+        mimetype="application/json",
+        status_code=200
+    )
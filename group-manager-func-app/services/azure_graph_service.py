@@ -3,46 +3,460 @@ Azure Graph API Service
 Handles all MS Graph API operations for group management
 """
 from azure.identity import ClientSecretCredential
-from msgraph import GraphServiceClient
+from kiota_authentication_azure.azure_identity_authentication_provider import AzureIdentityAuthenticationProvider
+from kiota_http.kiota_client_factory import KiotaClientFactory
+from kiota_http.middleware import RetryHandler
+from msgraph import GraphRequestAdapter, GraphServiceClient
+from msgraph_core import GraphClientFactory
+from msgraph_core.middleware import GraphTelemetryHandler
 from msgraph.generated.models.group import Group
 from msgraph.generated.models.reference_create import ReferenceCreate
+from msgraph.generated.models.subscription import Subscription
+from msgraph.generated.groups.item.members.members_request_builder import MembersRequestBuilder
+from msgraph.generated.groups.item.transitive_members.transitive_members_request_builder import (
+    TransitiveMembersRequestBuilder
+)
+from msgraph.generated.users.item.transitive_member_of.graph_group.graph_group_request_builder import (
+    GraphGroupRequestBuilder
+)
+import asyncio
+import base64
+import contextlib
+import json
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, unquote, urlsplit
+from services.cache import TTLCache
+from services.graph_batch import BATCH_MAX_REQUESTS, GRAPH_BATCH_URL, GraphBatchError, GraphBatcher
+from services.graph_scheduler import (
+    RETRYABLE_STATUS_CODES, GraphThrottledError, get_retry_after, get_scheduler, get_status_code
+)
+from services.group_index import GroupNameIndex, rank_groups
+from services.membership_index import MembershipIndex
+from services.mirror import DirectoryMirror
+from services.notifications import SUBSCRIPTION_CHANGE_TYPES, SUBSCRIPTION_RESOURCE, GroupChange
+from services.prewarm import HOT_PUBLISH_KEYS, HOT_PUBLISH_SECONDS, AccessTracker, rank_hot
+from services.serialization import MemberRecord, member_record, member_record_from_json
+from services.shared_cache import SharedCache, create_shared_cache
+from services import telemetry
+from services.token_manager import GRAPH_SCOPE, StaticTokenCredential, TokenManager
+from services.transport import get_http_client
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Type
 
 logger = logging.getLogger(__name__)
 
+GRAPH_HOST = "graph.microsoft.com"
+
+# Largest $top Graph accepts for the group members collection
+MEMBER_PAGE_SIZE = 999
+MEMBER_SELECT = ['id', 'displayName', 'userPrincipalName']
+
+# expand=transitive: one Graph transitiveMembers listing, or our own walk of nested groups
+TRANSITIVE_STRATEGIES = ["graph", "walk"]
+
+# Nested groups listed concurrently per level of a transitive walk
+TRANSITIVE_WALK_CONCURRENCY = 8
+
+DIRECTORY_OBJECTS_URL = "https://graph.microsoft.com/v1.0/directoryObjects/"
+
+GROUP_SELECT = ['id', 'displayName', 'description', 'mailEnabled', 'securityEnabled']
+
+# Group fields callers may project with `fields=` -> SDK model attribute
+GROUP_FIELDS = {
+    "id": "id",
+    "displayName": "display_name",
+    "description": "description",
+    "mailEnabled": "mail_enabled",
+    "securityEnabled": "security_enabled",
+    "mail": "mail",
+    "mailNickname": "mail_nickname",
+    "visibility": "visibility",
+    "groupTypes": "group_types"
+}
+
+SEARCH_MODES = ["prefix", "search", "fuzzy"]
+
+# Delta queries used to keep the directory mirror in sync
+USER_DELTA_URL = "https://graph.microsoft.com/v1.0/users/delta?$select=id,displayName,userPrincipalName"
+GROUP_DELTA_URL = (
+    "https://graph.microsoft.com/v1.0/groups/delta"
+    "?$select=id,displayName,description,mailEnabled,securityEnabled,members"
+)
+
+# A deltaLink for "now", without listing the directory first (exports track changes from here)
+GROUP_DELTA_LATEST_URL = GROUP_DELTA_URL + "&$deltaToken=latest"
+
+# Graph accepts at most 20 references per members@odata.bind PATCH
+BULK_CHUNK_SIZE = 20
+
+# Graph accepts at most 20 members@odata.bind + owners@odata.bind on group create
+CREATE_BIND_LIMIT = 20
+
+# $batch envelopes of member removals in flight per sync
+SYNC_REMOVE_CONCURRENCY = 8
+
+# Directory queries allow at most 15 values in a `displayName in (...)` filter
+NAME_FILTER_CHUNK_SIZE = 15
+
+# Hot searches / member lists reloaded concurrently by a pre-warm
+PREWARM_CONCURRENCY = 4
+
+
+def graph_middleware() -> list:
+    """
+    kiota's default middleware plus Graph telemetry, minus its RetryHandler: retries belong
+    to the scheduler, above the token bucket and circuit breaker, and never repeat a create
+    """
+    middleware = [
+        handler for handler in KiotaClientFactory.get_default_middleware(None)
+        if not isinstance(handler, RetryHandler)
+    ]
+    middleware.append(GraphTelemetryHandler())
+    return middleware
+
+
+_graph_http_client = None
+_graph_http_client_lock = threading.Lock()
+
+
+def get_graph_http_client(settings):
+    """
+    The worker's shared HTTP client with the Graph middleware loaded. Loading wraps the
+    client's transport, so it happens once per client, not once per (tenant) service.
+    """
+    global _graph_http_client
+    http_client = get_http_client(settings)
+    with _graph_http_client_lock:
+        if _graph_http_client is not http_client:
+            GraphClientFactory.create_with_custom_middleware(graph_middleware(), client=http_client)
+            _graph_http_client = http_client
+    return http_client
+
+
+def encode_members_cursor(next_link: Optional[str], skip: int = 0) -> str:
+    """Encode a resumable member listing position as an opaque cursor"""
+    payload = json.dumps({"link": next_link, "skip": skip}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_members_cursor(cursor: str, group_id: str) -> Tuple[Optional[str], int]:
+    """Decode a cursor produced by encode_members_cursor for a group's member listing"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        next_link = payload.get("link")
+        skip = int(payload.get("skip", 0))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    # The cursor is client supplied - its link may only page this group's members, or the
+    # caller could read any Graph resource with our token
+    if next_link is not None:
+        parts = urlsplit(next_link)
+        expected_path = f"/v1.0/groups/{group_id}/members".lower()
+        if (parts.scheme != "https" or parts.netloc.lower() != GRAPH_HOST
+                or unquote(parts.path).lower() != expected_path):
+            raise ValueError("Invalid cursor")
+    if skip < 0:
+        raise ValueError("Invalid cursor")
+
+    return next_link, skip
+
+
+def odata_quote(value: str) -> str:
+    """Escape a value for use inside a single-quoted OData string literal"""
+    return value.replace("'", "''")
+
+
+def build_group(name: str, description: str, group_type: str) -> Group:
+    """Build the Group model for a new Security or Microsoft365 group"""
+    new_group = Group()
+    new_group.display_name = name
+    new_group.description = description
+    new_group.mail_nickname = name.replace('.', '-').replace(' ', '-')
+    
+    if group_type == "Security":
+        new_group.security_enabled = True
+        new_group.mail_enabled = False
+    else:  # Microsoft365
+        new_group.security_enabled = False
+        new_group.mail_enabled = True
+        new_group.group_types = ["Unified"]
+        new_group.visibility = "Public"
+    return new_group
+
+
+def validate_group_spec(spec: Any) -> Optional[str]:
+    """Validate one group of a provisioning manifest, returning an error message or None"""
+    if not isinstance(spec, dict):
+        return "Group spec must be an object"
+    name = spec.get("name")
+    if not name or not isinstance(name, str):
+        return "Group name is required"
+    if not spec.get("description"):
+        return "Group description is required"
+    if not name.startswith("AAD.TA."):
+        return "Group name must start with 'AAD.TA.' (case sensitive)"
+    if spec.get("type", "Security") not in ["Security", "Microsoft365"]:
+        return "Group type must be 'Security' or 'Microsoft365'"
+    for key in ("members", "owners"):
+        ids = spec.get(key) or []
+        if not isinstance(ids, list) or not all(isinstance(i, str) and i for i in ids):
+            return f"{key} must be a list of user IDs"
+    return None
+
+
+def validate_group_fields(fields: Optional[List[str]]) -> List[str]:
+    """Check a `fields=` projection, defaulting to GROUP_SELECT (id is always included)"""
+    if not fields:
+        return list(GROUP_SELECT)
+    unknown = [field for field in fields if field not in GROUP_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(GROUP_FIELDS)}")
+    return ["id"] + [field for field in dict.fromkeys(fields) if field != "id"]
+
+
+def group_to_dict(group, fields: List[str]) -> Dict[str, Any]:
+    """Convert a Group model to a response dict with the given fields"""
+    record = {}
+    for field in fields:
+        value = getattr(group, GROUP_FIELDS[field], None)
+        if field == "description" and not value:
+            value = ""
+        record[field] = value
+    return record
+
+
+def project_fields(group: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Keep only the given fields of a group dict"""
+    return {field: group.get(field) for field in fields}
+
+
+def members_cache_key(group_id: str) -> Tuple[str, str]:
+    """Read cache key for a group's member list"""
+    return ("members", group_id.lower())
+
+
+def transitive_members_cache_key(group_id: str) -> Tuple[str, str]:
+    """Read cache key for a group's effective (nested) member list"""
+    return ("transitiveMembers", group_id.lower())
+
+
+def member_of_cache_key(user_id: str) -> Tuple[str, str]:
+    """Read cache key for the groups a user belongs to"""
+    return ("memberOf", user_id.lower())
+
+
+def graph_error_message(error: Exception) -> str:
+    """Extract the Graph error message from an ODataError, falling back to str()"""
+    odata_error = getattr(error, 'error', None)
+    if odata_error is not None and getattr(odata_error, 'message', None):
+        return odata_error.message
+    return str(error)
+
+
+@contextlib.contextmanager
+def graph_errors(action: str, *passthrough: Type[Exception]):
+    """
+    Wrap failures of a service operation as "Failed to {action}"
+    
+    GraphThrottledError (answered with 503 and Retry-After) and the `passthrough` types
+    (e.g. ValueError for validation errors) reach the caller unchanged.
+    """
+    try:
+        yield
+    except (GraphThrottledError, *passthrough):
+        raise
+    except Exception as e:
+        logger.error(f"Failed to {action}: {graph_error_message(e)}")
+        raise Exception(f"Failed to {action}: {graph_error_message(e)}")
+
+
+def is_already_member_error(error: Exception) -> bool:
+    """Check whether a Graph error means the reference already exists"""
+    return "already exist" in graph_error_message(error)
+
 
 class AzureGraphService:
     """Service for interacting with MS Graph API"""
     
     def __init__(self, settings):
         self.settings = settings
-        self._credential: Optional[ClientSecretCredential] = None
+        self._credential: Optional[TokenManager] = None
         self._graph_client: Optional[GraphServiceClient] = None
+        self._scheduler = get_scheduler(settings.AZURE_TENANT_ID, settings)
+        self._cache = TTLCache(
+            ttl=settings.CACHE_TTL_SECONDS,
+            max_entries=settings.CACHE_MAX_ENTRIES,
+            max_bytes=settings.CACHE_MAX_BYTES
+        )
+        # Second level, shared by every worker (None unless L2_CACHE_URL is set)
+        self._shared_cache: Optional[SharedCache] = create_shared_cache(settings)
+        self._mirror: Optional[DirectoryMirror] = (
+            DirectoryMirror(settings.MIRROR_PATH) if settings.MIRROR_ENABLED else None
+        )
+        # Created on first sync, inside the running loop (STARTUP_MODE=background builds the
+        # service on a thread, where a Lock can't be created before Python 3.10)
+        self._mirror_lock: Optional[asyncio.Lock] = None
+        self._group_name_index: Optional[GroupNameIndex] = None
+        self._membership_index: Optional[MembershipIndex] = (
+            MembershipIndex() if settings.MEMBERSHIP_INDEX_ENABLED else None
+        )
+        # Request counts of searches and member lists, for the pre-warm timer
+        self._access = AccessTracker(settings.PREWARM_HALF_LIFE_SECONDS)
+        self._last_prewarm: Optional[Dict[str, Any]] = None
+        # This worker's hot set is published under its id in the shared cache
+        self._worker_id = uuid.uuid4().hex
+        self._hot_published_at = 0.0
+        self._publish_task: Optional[asyncio.Task] = None
     
-    def _get_credential(self) -> ClientSecretCredential:
-        """Get or create Azure AD credential"""
+    def _get_credential(self) -> TokenManager:
+        """Get or create the Azure AD credential (wrapped in a prefetching token manager)"""
         if not self._credential:
             logger.info("Creating Azure AD credential")
-            self._credential = ClientSecretCredential(
-                tenant_id=self.settings.AZURE_TENANT_ID,
-                client_id=self.settings.AZURE_CLIENT_ID,
-                client_secret=self.settings.AZURE_CLIENT_SECRET
+            if self.settings.GRAPH_MOCK_URL:
+                # The local Graph stand-in accepts any bearer token
+                credential = StaticTokenCredential("mock-graph-token")
+            else:
+                credential = ClientSecretCredential(
+                    tenant_id=self.settings.AZURE_TENANT_ID,
+                    client_id=self.settings.AZURE_CLIENT_ID,
+                    client_secret=self.settings.AZURE_CLIENT_SECRET
+                )
+            self._credential = TokenManager(
+                credential,
+                refresh_margin=self.settings.TOKEN_REFRESH_MARGIN,
+                cache_path=self.settings.TOKEN_CACHE_PATH if self.settings.TOKEN_CACHE_ENABLED else None,
+                cache_secret=self.settings.AZURE_CLIENT_SECRET
             )
         return self._credential
     
+    def start_token_prefetch(self):
+        """Fetch the Graph token in the background now and keep it refreshed before expiry"""
+        self._get_credential().start()
+    
+    def stop_token_prefetch(self):
+        """Stop refreshing the Graph token in the background (the service stays usable)"""
+        if self._credential:
+            self._credential.stop()
+    
     def _get_graph_client(self) -> GraphServiceClient:
         """Get or create MS Graph API client"""
         if not self._graph_client:
             logger.info("Creating MS Graph API client")
             credential = self._get_credential()
             scopes = ["https://graph.microsoft.com/.default"]
-            self._graph_client = GraphServiceClient(
-                credentials=credential,
-                scopes=scopes
-            )
+            
+            # Reuse the worker-wide connection pool instead of the SDK's per-client default
+            auth_provider = AzureIdentityAuthenticationProvider(credential, scopes=scopes)
+            http_client = get_graph_http_client(self.settings)
+            request_adapter = GraphRequestAdapter(auth_provider, client=http_client)
+            self._graph_client = GraphServiceClient(request_adapter=request_adapter)
         return self._graph_client
     
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """Get the Graph request scheduler counters for this tenant"""
+        return self._scheduler.get_stats()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get the read cache counters for this tenant"""
+        stats = self._cache.get_stats()
+        if self._shared_cache:
+            stats["shared"] = self._shared_cache.get_stats()
+        return stats
+    
+    async def _cached(self, key: Tuple, loader) -> Any:
+        """Get a value from the worker cache, then the shared cache, then the loader"""
+        if self._shared_cache:
+            shared_cache = self._shared_cache
+            return await self._cache.get_or_load(key, lambda: shared_cache.get_or_load(key, loader))
+        return await self._cache.get_or_load(key, loader)
+    
+    async def _cached_tracked(self, key: Tuple, args: Tuple, loader) -> Any:
+        """Like _cached, and count the request toward the pre-warm hot set (`args` reload it)"""
+        loaded = False
+        
+        def tracked_loader():
+            nonlocal loaded
+            loaded = True
+            return loader()
+        
+        value = await self._cached(key, tracked_loader)
+        self._access.record(key, args, warm=not loaded)
+        if self._shared_cache and time.monotonic() >= self._hot_published_at + HOT_PUBLISH_SECONDS:
+            self._hot_published_at = time.monotonic()
+            self._publish_task = asyncio.get_running_loop().create_task(self._publish_hot())
+        return value
+    
+    async def _publish_hot(self):
+        """Share this worker's request counts, so the pre-warm timer reloads every worker's hot set"""
+        await self._shared_cache.publish_hot(
+            self._worker_id,
+            {kind: self._access.scores(kind, HOT_PUBLISH_KEYS) for kind in ("search", "members")},
+            self.settings.PREWARM_HALF_LIFE_SECONDS
+        )
+    
+    async def _refresh_cached(self, key: Tuple, loader) -> Tuple[Any, Optional[float]]:
+        """
+        Reload a value into the worker cache and the shared cache, even if still fresh
+        
+        Returns:
+            The value, and the seconds until the replaced entry would have made a reader
+            load it again (None when neither tier had it)
+        """
+        remaining = [self._cache.expires_in(key)]
+        if self._shared_cache:
+            shared_cache = self._shared_cache
+            
+            async def shared_refresh():
+                value, shared_remaining = await shared_cache.refresh(key, loader)
+                remaining.append(shared_remaining)
+                return value
+            
+            value = await self._cache.refresh(key, shared_refresh)
+        else:
+            value = await self._cache.refresh(key, loader)
+        remaining = [seconds for seconds in remaining if seconds is not None]
+        return value, max(remaining) if remaining else None
+    
+    async def _invalidate(self, key: Tuple):
+        """Drop one cached value in this worker and in the shared cache"""
+        self._cache.invalidate(key)
+        if self._shared_cache:
+            await self._shared_cache.invalidate(key)
+    
+    async def _invalidate_kinds(self, *kinds: str):
+        """Drop every cached value of the given kinds in this worker and in the shared cache"""
+        self._cache.invalidate_where(lambda key: key[0] in kinds)
+        if self._shared_cache:
+            for kind in kinds:
+                await self._shared_cache.invalidate_kind(kind)
+    
+    async def _invalidate_searches(self):
+        """Drop cached searches after a group was created"""
+        await self._invalidate_kinds("search", "allGroups")
+        if self._mirror:
+            await self._mirror.mark_stale()
+    
+    async def _invalidate_group_members(self, group_id: str, user_ids: List[str]):
+        """Drop a group's cached member list (and the users' group lists) after members were added"""
+        await self._invalidate(members_cache_key(group_id))
+        await self._invalidate_transitive_members()
+        for user_id in user_ids:
+            await self._invalidate(member_of_cache_key(user_id))
+            if self._membership_index:
+                self._membership_index.add_member(group_id, user_id)
+        if self._mirror:
+            await self._mirror.mark_stale()
+    
+    async def _invalidate_transitive_members(self):
+        """Drop every cached effective member list (any ancestor of a changed group may be affected)"""
+        await self._invalidate_kinds("transitiveMembers")
+    
+    @telemetry.traced("service.test_connection")
     async def test_connection(self) -> Dict[str, Any]:
         """Test Azure AD connection"""
         try:
@@ -50,7 +464,7 @@ class AzureGraphService:
             client = self._get_graph_client()
             
             # Try to get organization info - MUST await the async call
-            org_result = await client.organization.get()
+            org_result = await self._scheduler.call(lambda: client.organization.get())
             
             if org_result and org_result.value and len(org_result.value) > 0:
                 org_info = org_result.value[0]
@@ -75,18 +489,128 @@ class AzureGraphService:
                 "message": "Failed to connect to Azure AD"
             }
     
-    async def search_groups(self, search_term: str = "", top: int = 100) -> List[Dict[str, Any]]:
+    @telemetry.traced("service.prewarm")
+    async def prewarm(self, hot_searches: int, hot_groups: int) -> Dict[str, Any]:
+        """
+        Keep this tenant warm: refresh the Graph token, check the connection, then reload the
+        most requested searches and member lists into the caches before they expire. With a
+        shared cache the requests counted by every worker are added in (the timer runs on one).
+        
+        Args:
+            hot_searches: How many of the most requested searches to reload
+            hot_groups: How many of the most requested member lists to reload
+        
+        Returns:
+            Timings of the run, counts of reloaded entries and the latency saved so far
+        """
+        logger.info(f"Pre-warming tenant {self.settings.AZURE_TENANT_ID}")
+        report: Dict[str, Any] = {"tenantId": self.settings.AZURE_TENANT_ID}
+        
+        started = time.perf_counter()
+        await self._get_credential().get_token(GRAPH_SCOPE)
+        report["tokenMs"] = round(1000 * (time.perf_counter() - started), 1)
+        
+        started = time.perf_counter()
+        connection = await self.test_connection()
+        report["connection"] = connection["status"]
+        report["connectionMs"] = round(1000 * (time.perf_counter() - started), 1)
+        
+        refreshed = {"searches": 0, "groups": 0, "failed": 0}
+        load_ms = 0.0
+        if self._cache.enabled or self._shared_cache:
+            semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+            
+            async def refresh(kind: str, key: Tuple, loader):
+                nonlocal load_ms
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        _, remaining = await self._refresh_cached(key, loader)
+                    except Exception as e:
+                        logger.warning(f"Pre-warm of {key[0]} {key[1:]} failed: {str(e)}")
+                        refreshed["failed"] += 1
+                        return
+                    elapsed_ms = 1000 * (time.perf_counter() - started)
+                    load_ms += elapsed_ms
+                    refreshed[kind] += 1
+                    stale_at = time.monotonic() + remaining if remaining is not None else None
+                    self._access.mark_prewarmed(key, elapsed_ms, stale_at)
+            
+            shared_hot = {}
+            if self._shared_cache:
+                shared_hot = await self._shared_cache.read_hot(
+                    self.settings.PREWARM_HALF_LIFE_SECONDS, exclude=self._worker_id
+                )
+            
+            work = []
+            searches = self._access.scores("search", HOT_PUBLISH_KEYS) + shared_hot.get("search", [])
+            for search_term, top, mode, fields in rank_hot(searches, hot_searches):
+                work.append(refresh("searches", *self._search_request(search_term, top, mode, fields)))
+            groups = self._access.scores("members", HOT_PUBLISH_KEYS) + shared_hot.get("members", [])
+            for (group_id,) in rank_hot(groups, hot_groups):
+                work.append(refresh(
+                    "groups", members_cache_key(group_id),
+                    lambda group_id=group_id: self._get_group_members_live(group_id)
+                ))
+            await asyncio.gather(*work)
+        
+        report.update({
+            "refreshed": refreshed,
+            "loadMs": round(load_ms, 1),
+            **self._access.get_stats()
+        })
+        self._last_prewarm = {**report, "finishedAt": datetime.now(timezone.utc).isoformat()}
+        return report
+    
+    def get_prewarm_stats(self) -> Dict[str, Any]:
+        """Hot-set tracking and latency-saved counters, the last pre-warm and the cache counters"""
+        return {
+            **self._access.get_stats(),
+            "lastPrewarm": self._last_prewarm,
+            "cache": self.get_cache_stats()
+        }
+    
+    @telemetry.traced("service.search_groups")
+    async def search_groups(
+        self,
+        search_term: str = "",
+        top: int = 100,
+        mode: str = "prefix",
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Search Azure AD groups
+        Search Azure AD groups (served from the read cache when fresh)
         
         Args:
             search_term: Optional filter by display name
             top: Maximum number of results (default 100)
+            mode: 'prefix' (startswith), 'search' (Graph $search, ranked) or
+                  'fuzzy' (local trigram index, ranked)
+            fields: Optional group fields to return ($select projection)
         
         Returns:
-            List of groups with id, displayName, description
+            List of groups with id, displayName, description (or the requested fields)
         """
-        try:
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of: {', '.join(SEARCH_MODES)}")
+        fields = validate_group_fields(fields)
+        
+        cache_key, loader = self._search_request(search_term, top, mode, fields)
+        return await self._cached_tracked(cache_key, (search_term, top, mode, fields), loader)
+    
+    def _search_request(self, search_term: str, top: int, mode: str, fields: List[str]) -> Tuple[Tuple, Any]:
+        """Cache key and loader of a (validated) search"""
+        if mode == "fuzzy" or (mode == "search" and search_term):
+            loader = lambda: self._search_groups_ranked(search_term, top, mode, fields)
+        else:
+            loader = lambda: self._search_groups_live(search_term, top, fields)
+        
+        # startswith() / $search on displayName are case-insensitive, so is the cache key
+        return ("search", search_term.casefold(), top, mode, tuple(fields)), loader
+    
+    async def _search_groups_live(self, search_term: str, top: int, fields: List[str]) -> List[Dict[str, Any]]:
+        """Search Azure AD groups by displayName prefix directly against Graph"""
+        with graph_errors("search groups"):
             logger.info(f"Searching groups with term: '{search_term}', top: {top}")
             client = self._get_graph_client()
             
@@ -94,86 +618,558 @@ class AzureGraphService:
             from msgraph.generated.groups.groups_request_builder import GroupsRequestBuilder
             
             if search_term:
-                # Filter by display name containing search term
-                filter_query = f"startswith(displayName, '{search_term}')"
+                # Filter by display name starting with search term (quotes doubled per OData)
+                filter_query = f"startswith(displayName, '{odata_quote(search_term)}')"
                 
                 query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
                     filter=filter_query,
                     top=top,
-                    select=['id', 'displayName', 'description', 'mailEnabled', 'securityEnabled']
+                    select=fields
                 )
                 request_config = GroupsRequestBuilder.GroupsRequestBuilderGetRequestConfiguration(
                     query_parameters=query_params
                 )
-                result = await client.groups.get(request_configuration=request_config)
+                result = await self._scheduler.call(
+                    lambda: client.groups.get(request_configuration=request_config)
+                )
             else:
                 # Get all groups (up to top limit)
                 query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
                     top=top,
-                    select=['id', 'displayName', 'description', 'mailEnabled', 'securityEnabled']
+                    select=fields
                 )
                 request_config = GroupsRequestBuilder.GroupsRequestBuilderGetRequestConfiguration(
                     query_parameters=query_params
                 )
-                result = await client.groups.get(request_configuration=request_config)
+                result = await self._scheduler.call(
+                    lambda: client.groups.get(request_configuration=request_config)
+                )
             
             groups = []
             if result and result.value:
                 for group in result.value:
-                    groups.append({
-                        "id": group.id,
-                        "displayName": group.display_name,
-                        "description": group.description if group.description else "",
-                        "mailEnabled": group.mail_enabled,
-                        "securityEnabled": group.security_enabled
-                    })
+                    groups.append(group_to_dict(group, fields))
             
             logger.info(f"Found {len(groups)} groups")
+            if self._membership_index:
+                self._membership_index.record_groups(groups)
             return groups
+    
+    async def _search_groups_ranked(
+        self, search_term: str, top: int, mode: str, fields: List[str]
+    ) -> List[Dict[str, Any]]:
+        """Substring search via Graph $search, falling back to the local trigram index"""
+        if mode == "search":
+            try:
+                # Ranking needs displayName even when the caller didn't ask for it
+                select = fields if "displayName" in fields else fields + ["displayName"]
+                groups = await self._search_groups_graph(search_term, top, select)
+                return [
+                    {**project_fields(group, fields), "score": group["score"]}
+                    for group in rank_groups(search_term, groups, top)
+                ]
+            except GraphThrottledError as e:
+                # A fallback would hide throttling from the caller
+                raise e
+            except Exception as e:
+                logger.warning(f"$search failed, falling back to local index: {str(e)}")
+        
+        index = await self._get_group_name_index()
+        results = index.search(search_term, top)
+        logger.info(f"Found {len(results)} groups in local name index")
+        return [{**project_fields(group, fields), "score": group["score"]} for group in results]
+    
+    async def _search_groups_graph(self, search_term: str, top: int, fields: List[str]) -> List[Dict[str, Any]]:
+        """Tokenized displayName search with Graph $search (needs ConsistencyLevel: eventual)"""
+        logger.info(f"Searching groups with $search: '{search_term}', top: {top}")
+        client = self._get_graph_client()
+        
+        from msgraph.generated.groups.groups_request_builder import GroupsRequestBuilder
+        
+        escaped = search_term.replace('\\', '\\\\').replace('"', '\\"')
+        query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
+            search=f'"displayName:{escaped}"',
+            count=True,
+            top=top,
+            select=fields
+        )
+        request_config = GroupsRequestBuilder.GroupsRequestBuilderGetRequestConfiguration(
+            query_parameters=query_params
+        )
+        request_config.headers.add("ConsistencyLevel", "eventual")
+        result = await self._scheduler.call(
+            lambda: client.groups.get(request_configuration=request_config)
+        )
+        
+        groups = [group_to_dict(group, fields) for group in (result.value or [])] if result else []
+        logger.info(f"$search matched {result.odata_count if result else 0} groups, returned {len(groups)}")
+        return groups
+    
+    async def _get_group_name_index(self) -> GroupNameIndex:
+        """Trigram index over every group's displayName, rebuilt when the cached list refreshes"""
+        groups = await self._cached(("allGroups",), self._list_all_groups)
+        if self._group_name_index is None or self._group_name_index.source is not groups:
+            self._group_name_index = GroupNameIndex(groups)
+        return self._group_name_index
+    
+    async def _list_all_groups(self) -> List[Dict[str, Any]]:
+        """Every group in the tenant with all searchable fields (follows every @odata.nextLink)"""
+        with graph_errors("list groups"):
+            logger.info("Listing all groups for the local name index")
+            client = self._get_graph_client()
             
-        except Exception as e:
-            logger.error(f"Search groups failed: {str(e)}")
-            raise Exception(f"Failed to search groups: {str(e)}")
+            from msgraph.generated.groups.groups_request_builder import GroupsRequestBuilder
+            
+            query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
+                top=MEMBER_PAGE_SIZE,
+                select=list(GROUP_FIELDS)
+            )
+            request_config = GroupsRequestBuilder.GroupsRequestBuilderGetRequestConfiguration(
+                query_parameters=query_params
+            )
+            result = await self._scheduler.call(
+                lambda: client.groups.get(request_configuration=request_config)
+            )
+            
+            groups = []
+            while result:
+                groups.extend(group_to_dict(group, list(GROUP_FIELDS)) for group in result.value or [])
+                next_link = result.odata_next_link
+                if not next_link:
+                    break
+                result = await self._scheduler.call(lambda: client.groups.with_url(next_link).get())
+            
+            logger.info(f"Listed {len(groups)} groups")
+            return groups
     
-    async def get_group_members(self, group_id: str) -> List[Dict[str, Any]]:
+    async def iter_group_member_pages(
+        self, group_id: str, cursor: Optional[str] = None, select: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[List[MemberRecord], Optional[str]]]:
+        """
+        Iterate over the member pages of a group, following @odata.nextLink
+
+        Args:
+            group_id: Azure AD group GUID
+            cursor: Optional cursor returned by a previous call to resume from
+            select: Optional member fields to request (default MEMBER_SELECT)
+
+        Yields:
+            Tuple of (members on this page, nextLink of the following page or None)
+        """
+        client = self._get_graph_client()
+        members_builder = client.groups.by_group_id(group_id).members
+
+        next_link, skip = decode_members_cursor(cursor, group_id) if cursor else (None, 0)
+        query_params = MembersRequestBuilder.MembersRequestBuilderGetQueryParameters(
+            top=MEMBER_PAGE_SIZE,
+            select=select or MEMBER_SELECT
+        )
+        request_config = MembersRequestBuilder.MembersRequestBuilderGetRequestConfiguration(
+            query_parameters=query_params
+        )
+
+        async def fetch_page(link: Optional[str]):
+            # Only the fetch is timed - the caller's work between pages is not pagination
+            with telemetry.phase("graph.page"):
+                if link:
+                    return await self._scheduler.call(lambda: members_builder.with_url(link).get())
+                return await self._scheduler.call(
+                    lambda: members_builder.get(request_configuration=request_config)
+                )
+
+        result = await fetch_page(next_link)
+        while result:
+            page = [member_record(member) for member in (result.value or [])]
+            if skip:
+                page = page[skip:]
+                skip = 0
+
+            next_link = result.odata_next_link
+            yield page, next_link
+
+            if not next_link:
+                break
+            result = await fetch_page(next_link)
+
+    async def iter_group_members(
+        self,
+        group_id: str,
+        max_items: Optional[int] = None,
+        cursor: Optional[str] = None,
+        select: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[List[MemberRecord], Optional[str]]]:
+        """
+        Iterate over a bounded slice of a group's members, page by page
+
+        Args:
+            group_id: Azure AD group GUID
+            max_items: Optional cap on the number of members returned
+            cursor: Optional cursor returned by a previous call to resume from
+            select: Optional member fields to request from Graph (live pages only)
+
+        Yields:
+            Tuple of (members chunk, next cursor). The next cursor is only set on
+            the last chunk, and only when max_items stopped the listing early.
         """
-        Get members of a specific group
+        if (self._cache.enabled or self._shared_cache) and max_items is None and cursor is None:
+            # Full listing - go through the cache instead of paging live
+            yield await self.get_group_members(group_id), None
+            return
+
+        with graph_errors("get group members", ValueError):
+            logger.info(f"Getting members for group: {group_id}, maxItems: {max_items}")
+
+            # Link and offset of the page currently being read, so we can resume mid-page
+            page_link, skip = decode_members_cursor(cursor, group_id) if cursor else (None, 0)
+            remaining = max_items
+
+            async for page, next_link in self.iter_group_member_pages(group_id, cursor, select):
+                if remaining is not None and len(page) >= remaining:
+                    if len(page) > remaining:
+                        next_cursor = encode_members_cursor(page_link, skip + remaining)
+                    else:
+                        next_cursor = encode_members_cursor(next_link, 0) if next_link else None
+                    yield page[:remaining], next_cursor
+                    return
+
+                if remaining is not None:
+                    remaining -= len(page)
+
+                yield page, None
+                page_link, skip = next_link, 0
+
+    @telemetry.traced("service.get_group_members")
+    async def get_group_members(self, group_id: str) -> List[MemberRecord]:
+        """
+        Get all members of a specific group (served from the read cache when fresh)
         
         Args:
             group_id: Azure AD group GUID
         
         Returns:
-            List of members with id, displayName, userPrincipalName
+            Member records (id, displayName, type, userPrincipalName)
         """
-        try:
+        return await self._cached_tracked(
+            members_cache_key(group_id), (group_id,), lambda: self._get_group_members_live(group_id)
+        )
+    
+    async def _get_group_members_live(self, group_id: str) -> List[MemberRecord]:
+        """Get all members of a group directly from Graph (follows every @odata.nextLink)"""
+        with graph_errors("get group members"):
             logger.info(f"Getting members for group: {group_id}")
-            client = self._get_graph_client()
-            
-            # Get group members - MUST await the async call
-            result = await client.groups.by_group_id(group_id).members.get()
             
             members = []
-            if result and result.value:
-                for member in result.value:
-                    member_info = {
-                        "id": member.id,
-                        "displayName": getattr(member, 'display_name', 'N/A'),
-                        "type": member.odata_type.split('.')[-1] if member.odata_type else "Unknown"
-                    }
-                    
-                    # Add user-specific fields if it's a user
-                    if hasattr(member, 'user_principal_name'):
-                        member_info["userPrincipalName"] = member.user_principal_name
-                    
-                    members.append(member_info)
+            async for page, _ in self.iter_group_member_pages(group_id):
+                members.extend(page)
             
             logger.info(f"Found {len(members)} members in group {group_id}")
+            if self._membership_index:
+                self._membership_index.record_group_members(group_id, [member.id for member in members])
             return members
+    
+    @telemetry.traced("service.get_transitive_members")
+    async def get_transitive_members(self, group_id: str, strategy: str = "graph") -> List[MemberRecord]:
+        """
+        Get the effective members of a group: members of nested groups included, nested
+        groups themselves left out, each member once (served from the read cache when fresh)
+        
+        Args:
+            group_id: Azure AD group GUID
+            strategy: 'graph' (Graph transitiveMembers) or 'walk' (concurrent walk of the
+                nested groups, reusing cached member lists). Both return the same set.
+        
+        Returns:
+            Member records (id, displayName, type, userPrincipalName)
+        """
+        if strategy not in TRANSITIVE_STRATEGIES:
+            raise ValueError(f"strategy must be one of: {', '.join(TRANSITIVE_STRATEGIES)}")
+        loader = (
+            self._get_transitive_members_graph if strategy == "graph" else self._walk_transitive_members
+        )
+        return await self._cached(
+            transitive_members_cache_key(group_id), lambda: loader(group_id)
+        )
+    
+    async def _get_transitive_members_graph(self, group_id: str) -> List[MemberRecord]:
+        """Get a group's effective members via transitiveMembers (follows every @odata.nextLink)"""
+        with graph_errors("get transitive members"):
+            logger.info(f"Getting transitive members for group: {group_id}")
+            client = self._get_graph_client()
+            members_builder = client.groups.by_group_id(group_id).transitive_members
+            
+            query_params = TransitiveMembersRequestBuilder.TransitiveMembersRequestBuilderGetQueryParameters(
+                top=MEMBER_PAGE_SIZE,
+                select=MEMBER_SELECT
+            )
+            request_config = TransitiveMembersRequestBuilder.TransitiveMembersRequestBuilderGetRequestConfiguration(
+                query_parameters=query_params
+            )
+            result = await self._scheduler.call(
+                lambda: members_builder.get(request_configuration=request_config)
+            )
+            
+            members: Dict[str, MemberRecord] = {}
+            while result:
+                for member in result.value or []:
+                    record = member_record(member)
+                    if record.type != "group":
+                        members.setdefault(record.id, record)
+                
+                next_link = result.odata_next_link
+                if not next_link:
+                    break
+                result = await self._scheduler.call(lambda: members_builder.with_url(next_link).get())
+            
+            logger.info(f"Found {len(members)} transitive members in group {group_id}")
+            return list(members.values())
+    
+    async def _walk_transitive_members(self, group_id: str) -> List[MemberRecord]:
+        """
+        Walk the nested groups level by level, listing each level concurrently. Every group
+        is listed once: a group reached again (shared by several parents, or a cycle) is skipped,
+        and direct member lists come from the read cache when another request already loaded them.
+        """
+        with graph_errors("get transitive members"):
+            logger.info(f"Walking nested groups of group: {group_id}")
+            semaphore = asyncio.Semaphore(TRANSITIVE_WALK_CONCURRENCY)
+            
+            async def list_members(nested_id: str) -> List[MemberRecord]:
+                async with semaphore:
+                    return await self.get_group_members(nested_id)
             
+            visited = {group_id.lower()}
+            members: Dict[str, MemberRecord] = {}
+            level = [group_id]
+            depth = 0
+            skipped = 0
+            while level:
+                next_level = []
+                for page in await asyncio.gather(*(list_members(nested_id) for nested_id in level)):
+                    for member in page:
+                        if member.type != "group":
+                            members.setdefault(member.id, member)
+                        elif member.id.lower() in visited:
+                            skipped += 1
+                        else:
+                            visited.add(member.id.lower())
+                            next_level.append(member.id)
+                level = next_level
+                depth += 1
+            
+            logger.info(
+                f"Found {len(members)} transitive members in group {group_id} "
+                f"({len(visited)} groups, {depth} levels, {skipped} repeated group references skipped)"
+            )
+            return list(members.values())
+    
+    @telemetry.traced("service.get_members_of_groups")
+    async def get_members_of_groups(self, group_ids: List[str], use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Get the members of many groups in one call
+        
+        Repeated ids are fetched once. Member lists in the read cache are served from it; the
+        rest are fetched concurrently (up to MEMBERS_QUERY_CONCURRENCY at once) with their first
+        pages packed into Graph $batch envelopes. A group that fails doesn't fail the others.
+        
+        Args:
+            group_ids: Azure AD group GUIDs
+            use_cache: False bypasses (and doesn't fill) the read caches, e.g. for exports
+                that would otherwise evict every hot entry
+        
+        Returns:
+            One result per distinct group, in request order: groupId and members, or
+            groupId, status and error
+        """
+        unique_ids = list(dict.fromkeys(group_id.lower() for group_id in group_ids))
+        logger.info(f"Getting members for {len(unique_ids)} groups ({len(group_ids)} requested)")
+        
+        batcher = GraphBatcher(self._post_batch)
+        semaphore = asyncio.Semaphore(self.settings.MEMBERS_QUERY_CONCURRENCY)
+        
+        async def fetch(group_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    if use_cache:
+                        members = await self._cached_tracked(
+                            members_cache_key(group_id), (group_id,),
+                            lambda: self._get_group_members_batched(group_id, batcher)
+                        )
+                    else:
+                        members = await self._get_group_members_batched(group_id, batcher)
+                    return {"groupId": group_id, "members": members}
+                except GraphThrottledError as e:
+                    return {"groupId": group_id, "status": 503, "error": str(e), "retryAfter": e.retry_after}
+                except Exception as e:
+                    logger.warning(f"Get members of group {group_id} failed: {str(e)}")
+                    return {"groupId": group_id, "status": get_status_code(e) or 500, "error": str(e)}
+        
+        results = await asyncio.gather(*(fetch(group_id) for group_id in unique_ids))
+        logger.info(
+            f"Fetched members of {len(unique_ids)} groups with {batcher.envelope_count} $batch envelopes "
+            f"({batcher.request_count} requests)"
+        )
+        return results
+    
+    async def _get_group_members_batched(self, group_id: str, batcher: GraphBatcher) -> List[MemberRecord]:
+        """Like _get_group_members_live, but the first page is requested through a $batch envelope"""
+        url = (
+            f"/groups/{quote(group_id, safe='')}/members"
+            f"?$top={MEMBER_PAGE_SIZE}&$select={','.join(MEMBER_SELECT)}"
+        )
+        # Throttled inside the envelope - the scheduler backs off for the request's own
+        # Retry-After and sends it again in a later envelope, which pays its tokens (cost 0 here)
+        page = await self._scheduler.call(lambda: batcher.get(url), cost=0)
+        
+        members = [member_record_from_json(member) for member in page.get("value", [])]
+        next_link = page.get("@odata.nextLink")
+        if next_link:
+            members_builder = self._get_graph_client().groups.by_group_id(group_id).members
+            while next_link:
+                result = await self._scheduler.call(lambda: members_builder.with_url(next_link).get())
+                members.extend(member_record(member) for member in (result.value or []))
+                next_link = result.odata_next_link
+        
+        if self._membership_index:
+            self._membership_index.record_group_members(group_id, [member.id for member in members])
+        return members
+    
+    async def _post_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Send one $batch envelope through the scheduler, returning its responses by request id"""
+        credential = self._get_credential()
+        http_client = get_graph_http_client(self.settings)
+        
+        async def send() -> Dict[str, Dict[str, Any]]:
+            token = await credential.get_token(GRAPH_SCOPE)
+            response = await http_client.post(
+                GRAPH_BATCH_URL,
+                json={"requests": requests},
+                headers={"Authorization": f"Bearer {token.token}"}
+            )
+            if response.status_code >= 400:
+                raise GraphBatchError(
+                    f"Graph $batch failed with status {response.status_code}",
+                    response.status_code, response.headers
+                )
+            return {item["id"]: item for item in response.json().get("responses", [])}
+        
+        return await self._scheduler.call(send, cost=len(requests))
+    
+    async def iter_group_pages(
+        self, prefix: str, link: Optional[str] = None
+    ) -> AsyncIterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        Page through the groups whose displayName starts with a prefix
+        
+        Args:
+            prefix: displayName prefix (e.g. AAD.TA.)
+            link: Optional nextLink of a previous page to resume from
+        
+        Yields:
+            Tuple of (groups on this page with GROUP_SELECT fields, nextLink or None)
+        """
+        from msgraph.generated.groups.groups_request_builder import GroupsRequestBuilder
+        
+        client = self._get_graph_client()
+        if link:
+            result = await self._scheduler.call(lambda: client.groups.with_url(link).get())
+        else:
+            query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
+                filter=f"startswith(displayName, '{odata_quote(prefix)}')",
+                top=MEMBER_PAGE_SIZE,
+                select=GROUP_SELECT
+            )
+            request_config = GroupsRequestBuilder.GroupsRequestBuilderGetRequestConfiguration(
+                query_parameters=query_params
+            )
+            result = await self._scheduler.call(
+                lambda: client.groups.get(request_configuration=request_config)
+            )
+        
+        while result:
+            next_link = result.odata_next_link
+            yield [group_to_dict(group, GROUP_SELECT) for group in result.value or []], next_link
+            if not next_link:
+                break
+            result = await self._scheduler.call(lambda: client.groups.with_url(next_link).get())
+    
+    async def get_group_delta_link(self) -> str:
+        """A groups/delta link for the current state of the directory (changes are tracked from now)"""
+        client = self._get_graph_client()
+        result = await self._scheduler.call(lambda: client.groups.delta.with_url(GROUP_DELTA_LATEST_URL).get())
+        if not result or not result.odata_delta_link:
+            raise Exception("Graph returned no deltaLink for groups")
+        return result.odata_delta_link
+    
+    async def get_group_delta_page(
+        self, link: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        """
+        Get one page of group changes from a groups/delta link
+        
+        Returns:
+            Tuple of (changes, nextLink, deltaLink). Each change has id, removed, the group
+            fields Graph returned (others are None), membersAdded as (id, type) pairs and
+            membersRemoved ids. deltaLink is set on the last page only.
+        Raises:
+            ValueError: the link has expired (Graph answered 410), a full export is needed
+        """
+        client = self._get_graph_client()
+        try:
+            result = await self._scheduler.call(lambda: client.groups.delta.with_url(link).get())
         except Exception as e:
-            logger.error(f"Get group members failed: {str(e)}")
-            raise Exception(f"Failed to get group members: {str(e)}")
+            if get_status_code(e) == 410:
+                raise ValueError("The groups delta link has expired - run a full export")
+            raise
+        
+        changes = []
+        for group in result.value or []:
+            additional_data = group.additional_data or {}
+            change = {
+                "id": group.id,
+                "removed": "@removed" in additional_data,
+                "membersAdded": [],
+                "membersRemoved": []
+            }
+            for field in GROUP_SELECT[1:]:
+                change[field] = getattr(group, GROUP_FIELDS[field], None)
+            for member in additional_data.get("members@delta") or []:
+                if "@removed" in member:
+                    change["membersRemoved"].append(member.get("id"))
+                else:
+                    odata_type = member.get("@odata.type")
+                    change["membersAdded"].append(
+                        (member.get("id"), odata_type.rsplit(".", 1)[-1] if odata_type else "Unknown")
+                    )
+            changes.append(change)
+        return changes, result.odata_next_link, result.odata_delta_link
+    
+    async def get_group_names(self, group_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Look up the displayName of many groups, packed into $batch envelopes
+        
+        Returns:
+            group id -> displayName (None for groups that no longer exist)
+        """
+        batcher = GraphBatcher(self._post_batch)
+        semaphore = asyncio.Semaphore(self.settings.MEMBERS_QUERY_CONCURRENCY)
+        
+        async def lookup(group_id: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    group = await batcher.get(f"/groups/{quote(group_id, safe='')}?$select=id,displayName")
+                except GraphBatchError as e:
+                    if get_status_code(e) == 404:
+                        return None
+                    if get_status_code(e) in RETRYABLE_STATUS_CODES:
+                        raise GraphThrottledError(str(e), retry_after=get_retry_after(e) or 1.0)
+                    raise
+                return group.get("displayName")
+        
+        unique_ids = list(dict.fromkeys(group_ids))
+        names = await asyncio.gather(*(lookup(group_id) for group_id in unique_ids))
+        return dict(zip(unique_ids, names))
     
+    @telemetry.traced("service.create_group")
     async def create_group(self, name: str, description: str, group_type: str) -> Dict[str, Any]:
         """
         Create a new Azure AD group
@@ -186,45 +1182,38 @@ class AzureGraphService:
         Returns:
             Created group information
         """
-        try:
+        with graph_errors("create group", ValueError):
             logger.info(f"Creating group: {name}, type: {group_type}")
             client = self._get_graph_client()
             
             # Check if group already exists - MUST await the async call
             from msgraph.generated.groups.groups_request_builder import GroupsRequestBuilder
             
-            filter_query = f"displayName eq '{name}'"
+            filter_query = f"displayName eq '{odata_quote(name)}'"
             query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
                 filter=filter_query
             )
             request_config = GroupsRequestBuilder.GroupsRequestBuilderGetRequestConfiguration(
                 query_parameters=query_params
             )
-            existing = await client.groups.get(request_configuration=request_config)
+            existing = await self._scheduler.call(
+                lambda: client.groups.get(request_configuration=request_config)
+            )
             
             if existing and existing.value and len(existing.value) > 0:
                 raise ValueError(f"Group '{name}' already exists")
             
             # Create new group object
-            new_group = Group()
-            new_group.display_name = name
-            new_group.description = description
-            new_group.mail_nickname = name.replace('.', '-').replace(' ', '-')
-            
-            if group_type == "Security":
-                new_group.security_enabled = True
-                new_group.mail_enabled = False
-            else:  # Microsoft365
-                new_group.security_enabled = False
-                new_group.mail_enabled = True
-                new_group.group_types = ["Unified"]
-                new_group.visibility = "Public"
+            new_group = build_group(name, description, group_type)
             
             # Create the group - MUST await the async call
-            created_group = await client.groups.post(new_group)
+            created_group = await self._scheduler.call(lambda: client.groups.post(new_group), idempotent=False)
             
             logger.info(f"Group created successfully: {created_group.id}")
             
+            # Any cached search could now be missing the new group
+            await self._invalidate_searches()
+            
             return {
                 "id": created_group.id,
                 "displayName": created_group.display_name,
@@ -232,17 +1221,157 @@ class AzureGraphService:
                 "mailEnabled": created_group.mail_enabled,
                 "securityEnabled": created_group.security_enabled
             }
+
+    @telemetry.traced("service.provision_groups")
+    async def provision_groups(self, specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create many groups from a manifest, skipping the ones that already exist
+        
+        Existing names are resolved with a few `displayName in (...)` queries, then the
+        missing groups are created concurrently (up to BULK_CONCURRENCY at once) with
+        their initial members/owners bound on create (owners first, 20 in all - the rest are
+        added once the group exists). Re-running the same manifest is safe: existing groups
+        are reported as existed and only missing members are added.
+        
+        Args:
+            specs: Group specs with name, description, type and optional members/owners
+        
+        Returns:
+            One result per spec with name and status: created, existed or failed
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(specs)
+        to_provision: Dict[str, int] = {}
+        
+        for position, spec in enumerate(specs):
+            error = validate_group_spec(spec)
+            if not error and spec["name"].casefold() in to_provision:
+                error = "Duplicate name in manifest"
+            if error:
+                results[position] = {"name": spec.get("name"), "status": "failed", "error": error}
+            else:
+                to_provision[spec["name"].casefold()] = position
+        
+        logger.info(f"Provisioning {len(to_provision)} groups")
+        existing = await self._find_groups_by_name([specs[position]["name"] for position in to_provision.values()])
+        
+        semaphore = asyncio.Semaphore(self.settings.BULK_CONCURRENCY)
+        
+        async def provision(position: int):
+            async with semaphore:
+                spec = specs[position]
+                results[position] = await self._provision_group(spec, existing.get(spec["name"].casefold()))
+        
+        await asyncio.gather(*(provision(position) for position in to_provision.values()))
+        
+        if any(result["status"] == "created" for result in results):
+            await self._invalidate_searches()
+        return results
+
+    async def _find_groups_by_name(self, names: List[str]) -> Dict[str, str]:
+        """Map case-folded displayName -> group id for the names that already exist"""
+        from msgraph.generated.groups.groups_request_builder import GroupsRequestBuilder
+        
+        client = self._get_graph_client()
+        chunks = [names[i:i + NAME_FILTER_CHUNK_SIZE] for i in range(0, len(names), NAME_FILTER_CHUNK_SIZE)]
+        semaphore = asyncio.Semaphore(self.settings.BULK_CONCURRENCY)
+        found: Dict[str, str] = {}
+        
+        async def lookup(chunk: List[str]):
+            quoted = ", ".join(f"'{odata_quote(name)}'" for name in chunk)
+            query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
+                filter=f"displayName in ({quoted})",
+                select=['id', 'displayName'],
+                top=MEMBER_PAGE_SIZE
+            )
+            request_config = GroupsRequestBuilder.GroupsRequestBuilderGetRequestConfiguration(
+                query_parameters=query_params
+            )
+            async with semaphore:
+                result = await self._scheduler.call(
+                    lambda: client.groups.get(request_configuration=request_config)
+                )
+            for group in (result.value if result and result.value else []):
+                found.setdefault(group.display_name.casefold(), group.id)
+        
+        with graph_errors("look up existing groups"):
+            await asyncio.gather(*(lookup(chunk) for chunk in chunks))
+        
+        logger.info(f"{len(found)} of {len(names)} groups already exist")
+        return found
+
+    async def _provision_group(self, spec: Dict[str, Any], existing_id: Optional[str]) -> Dict[str, Any]:
+        """Create one group (or reuse the existing one) and make sure its initial members are in it"""
+        name = spec["name"]
+        owners = list(dict.fromkeys(spec.get("owners") or []))
+        members = list(dict.fromkeys(spec.get("members") or []))
+        
+        try:
+            if existing_id:
+                result = {"name": name, "status": "existed", "id": existing_id}
+                pending_owners = []
+                pending_members = members
+            else:
+                # Graph binds at most 20 members + owners on create - add the rest afterwards
+                bound_owners = owners[:CREATE_BIND_LIMIT]
+                pending_owners = owners[len(bound_owners):]
+                bound_members = members[:CREATE_BIND_LIMIT - len(bound_owners)]
+                pending_members = members[len(bound_members):]
+                
+                new_group = build_group(name, spec["description"], spec.get("type", "Security"))
+                bindings = {}
+                if bound_members:
+                    bindings["members@odata.bind"] = [f"{DIRECTORY_OBJECTS_URL}{user_id}" for user_id in bound_members]
+                if bound_owners:
+                    bindings["owners@odata.bind"] = [f"{DIRECTORY_OBJECTS_URL}{user_id}" for user_id in bound_owners]
+                if bindings:
+                    new_group.additional_data = bindings
+                
+                client = self._get_graph_client()
+                created_group = await self._scheduler.call(lambda: client.groups.post(new_group), idempotent=False)
+                logger.info(f"Group created successfully: {created_group.id}")
+                result = {"name": name, "status": "created", "id": created_group.id}
+            
+            if pending_owners:
+                owner_results = await self._add_group_owners(result["id"], pending_owners)
+                failed = [owner for owner in owner_results if owner["status"] == "failed"]
+                if failed:
+                    result["ownerErrors"] = failed
+            if pending_members:
+                member_results = await self.add_group_members_bulk(result["id"], pending_members)
+                failed = [member for member in member_results if member["status"] == "failed"]
+                if failed:
+                    result["memberErrors"] = failed
+            return result
             
-        except ValueError as e:
-            # Re-raise validation errors
-            raise e
         except Exception as e:
-            logger.error(f"Create group failed: {str(e)}")
-            raise Exception(f"Failed to create group: {str(e)}")
+            logger.error(f"Provision group '{name}' failed: {graph_error_message(e)}")
+            return {"name": name, "status": "failed", "error": graph_error_message(e)}
+
+    async def _add_group_owners(self, group_id: str, owner_ids: List[str]) -> List[Dict[str, Any]]:
+        """Add owners to a group one reference at a time (there is no owners bind PATCH)"""
+        from msgraph.generated.models.reference_create import ReferenceCreate
+        
+        owners_ref = self._get_graph_client().groups.by_group_id(group_id).owners.ref
+        semaphore = asyncio.Semaphore(self.settings.BULK_CONCURRENCY)
+        
+        async def add(owner_id: str) -> Dict[str, Any]:
+            reference = ReferenceCreate()
+            reference.odata_id = f"{DIRECTORY_OBJECTS_URL}{owner_id}"
+            async with semaphore:
+                try:
+                    await self._scheduler.call(lambda: owners_ref.post(reference))
+                    return {"userId": owner_id, "status": "added"}
+                except Exception as e:
+                    if is_already_member_error(e):
+                        return {"userId": owner_id, "status": "alreadyOwner"}
+                    return {"userId": owner_id, "status": "failed", "error": graph_error_message(e)}
+        
+        return list(await asyncio.gather(*(add(owner_id) for owner_id in owner_ids)))
 
+    @telemetry.traced("service.add_group_member")
     async def add_group_member(self, group_id: str, user_id: str) -> Dict[str, Any]:
         """Add a member to a group"""
-        try:
+        with graph_errors("add member"):
             logger.info(f"Adding user {user_id} to group {group_id}")
             client = self._get_graph_client()
             
@@ -250,18 +1379,511 @@ class AzureGraphService:
             from msgraph.generated.models.reference_create import ReferenceCreate
             
             reference = ReferenceCreate()
-            reference.odata_id = f"https://graph.microsoft.com/v1.0/directoryObjects/{user_id}"
+            reference.odata_id = f"{DIRECTORY_OBJECTS_URL}{user_id}"
             
             # Add member to group
-            await client.groups.by_group_id(group_id).members.ref.post(reference)
+            await self._scheduler.call(lambda: client.groups.by_group_id(group_id).members.ref.post(reference))
             
             logger.info(f"Successfully added user {user_id} to group {group_id}")
+            await self._invalidate_group_members(group_id, [user_id])
             return {
                 "message": "Member added successfully",
                 "groupId": group_id,
                 "userId": user_id
             }
-            
+
+    @telemetry.traced("service.add_group_members_bulk")
+    async def add_group_members_bulk(
+        self, group_id: str, user_ids: List[str], raise_on_throttle: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Add many members to a group
+        
+        Users are added 20 at a time with a members@odata.bind PATCH, running up to
+        BULK_CONCURRENCY requests at once. If a PATCH is rejected (e.g. one of the
+        users is already a member) that chunk falls back to add_group_member per user.
+        
+        Args:
+            group_id: Azure AD group GUID
+            user_ids: User GUIDs to add (duplicates are ignored)
+            raise_on_throttle: Raise GraphThrottledError instead of reporting the users as
+                failed, so a job can resume them once Graph lets it
+        
+        Returns:
+            One result per user with userId and status: added, alreadyMember or failed
+        """
+        unique_ids = list(dict.fromkeys(user_ids))
+        chunks = [unique_ids[i:i + BULK_CHUNK_SIZE] for i in range(0, len(unique_ids), BULK_CHUNK_SIZE)]
+        logger.info(f"Bulk adding {len(unique_ids)} users to group {group_id} in {len(chunks)} chunks")
+        
+        semaphore = asyncio.Semaphore(self.settings.BULK_CONCURRENCY)
+        
+        async def run_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._add_member_chunk(group_id, chunk, raise_on_throttle)
+        
+        chunk_results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+        results = [result for chunk_result in chunk_results for result in chunk_result]
+        
+        added = sum(1 for result in results if result["status"] == "added")
+        logger.info(f"Bulk add to group {group_id} finished: {added}/{len(results)} added")
+        return results
+
+    async def _add_member_chunk(
+        self, group_id: str, user_ids: List[str], raise_on_throttle: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Add up to BULK_CHUNK_SIZE users in one PATCH, falling back to one call per user"""
+        client = self._get_graph_client()
+        
+        group = Group()
+        group.additional_data = {
+            "members@odata.bind": [f"{DIRECTORY_OBJECTS_URL}{user_id}" for user_id in user_ids]
+        }
+        
+        try:
+            await self._scheduler.call(lambda: client.groups.by_group_id(group_id).patch(group))
+            await self._invalidate_group_members(group_id, user_ids)
+            return [{"userId": user_id, "status": "added"} for user_id in user_ids]
+        except GraphThrottledError as e:
+            # Don't retry a throttled chunk user by user
+            if raise_on_throttle:
+                raise
+            return [{"userId": user_id, "status": "failed", "error": str(e)} for user_id in user_ids]
         except Exception as e:
-            logger.error(f"Add member failed: {str(e)}")
-            raise Exception(f"Failed to add member: {str(e)}")
\ No newline at end of file
+            logger.warning(f"Bulk add chunk rejected, retrying per user: {graph_error_message(e)}")
+        
+        results = []
+        for user_id in user_ids:
+            try:
+                await self.add_group_member(group_id, user_id)
+                results.append({"userId": user_id, "status": "added"})
+            except GraphThrottledError as e:
+                if raise_on_throttle:
+                    raise
+                results.append({"userId": user_id, "status": "failed", "error": str(e)})
+            except Exception as e:
+                if is_already_member_error(e):
+                    results.append({"userId": user_id, "status": "alreadyMember"})
+                else:
+                    results.append({"userId": user_id, "status": "failed", "error": str(e)})
+        return results
+
+    @telemetry.traced("service.sync_mirror")
+    async def sync_mirror(self, force: bool = True) -> Dict[str, Any]:
+        """
+        Bring the local directory mirror up to date using Graph delta queries
+        
+        Args:
+            force: Sync even if the last sync is newer than MIRROR_SYNC_INTERVAL
+        
+        Returns:
+            Number of changes applied and mirror row counts
+        """
+        if not self._mirror:
+            raise ValueError("Directory mirror is not enabled (set MIRROR_ENABLED=true)")
+        
+        if self._mirror_lock is None:
+            self._mirror_lock = asyncio.Lock()
+        with graph_errors("sync directory mirror"):
+            async with self._mirror_lock:
+                # Another request may have synced while we waited for the lock
+                age = time.time() - await self._mirror.get_last_synced()
+                if not force and age < self.settings.MIRROR_SYNC_INTERVAL:
+                    return {"users": 0, "groups": 0, **await self._mirror.get_stats()}
+                
+                logger.info("Syncing directory mirror")
+                client = self._get_graph_client()
+                users = await self._sync_delta("users", client.users.delta, USER_DELTA_URL,
+                                               self._mirror.apply_user_changes)
+                groups = await self._sync_delta("groups", client.groups.delta, GROUP_DELTA_URL,
+                                                self._mirror.apply_group_changes)
+                await self._mirror.mark_synced()
+            
+            logger.info(f"Directory mirror synced: {users} user changes, {groups} group changes")
+            return {"users": users, "groups": groups, **await self._mirror.get_stats()}
+
+    async def _sync_delta(self, resource: str, delta_builder, initial_url: str, apply) -> int:
+        """Follow a delta query from the stored deltaLink (or from scratch), applying each page"""
+        link = await self._mirror.get_delta_link(resource) or initial_url
+        changes = 0
+        resync = False
+        
+        while link:
+            try:
+                result = await self._scheduler.call(lambda: delta_builder.with_url(link).get())
+            except Exception as e:
+                if get_status_code(e) == 410 and link != initial_url:
+                    # deltaLink expired - Graph wants a full resync. Rebuild the tables from
+                    # scratch, or objects deleted while the token was expired would stay.
+                    logger.warning(f"Delta token for {resource} expired, resyncing")
+                    await self._mirror.begin_resync(resource)
+                    resync = True
+                    link = initial_url
+                    continue
+                raise
+            
+            values = result.value or []
+            await apply(values, resync)
+            changes += len(values)
+            
+            if result.odata_next_link:
+                link = result.odata_next_link
+            else:
+                if resync:
+                    await self._mirror.finish_resync(resource, result.odata_delta_link)
+                elif result.odata_delta_link:
+                    await self._mirror.set_delta_link(resource, result.odata_delta_link)
+                link = None
+        
+        return changes
+
+    async def _get_fresh_mirror(self) -> DirectoryMirror:
+        """Get the mirror, syncing it first when it is older than MIRROR_SYNC_INTERVAL"""
+        if not self._mirror:
+            raise ValueError("Directory mirror is not enabled (set MIRROR_ENABLED=true)")
+        if time.time() - await self._mirror.get_last_synced() >= self.settings.MIRROR_SYNC_INTERVAL:
+            await self.sync_mirror(force=False)
+        return self._mirror
+
+    @telemetry.traced("service.search_groups_mirror")
+    async def search_groups_mirror(self, search_term: str = "", top: int = 100) -> List[Dict[str, Any]]:
+        """Search groups by displayName prefix in the local directory mirror"""
+        mirror = await self._get_fresh_mirror()
+        groups = await mirror.search_groups(search_term, top)
+        logger.info(f"Found {len(groups)} groups in mirror")
+        return groups
+
+    @telemetry.traced("service.get_group_members_mirror")
+    async def get_group_members_mirror(self, group_id: str, max_items: Optional[int] = None) -> List[MemberRecord]:
+        """Get a group's direct members from the local directory mirror"""
+        mirror = await self._get_fresh_mirror()
+        members = await mirror.get_group_members(group_id.lower(), max_items)
+        logger.info(f"Found {len(members)} members in mirror for group {group_id}")
+        return members
+
+    @telemetry.traced("service.get_user_groups")
+    async def get_user_groups(self, user_id: str, prefix: str = "") -> List[Dict[str, Any]]:
+        """
+        Get every group a user belongs to, directly or through nested groups
+        
+        Args:
+            user_id: Azure AD user GUID or userPrincipalName
+            prefix: Optional displayName prefix filter (e.g. 'AAD.TA.')
+        
+        Returns:
+            List of groups with id, displayName, description
+        """
+        groups = await self._cached(
+            member_of_cache_key(user_id), lambda: self._get_user_groups_live(user_id)
+        )
+        if prefix:
+            prefix = prefix.casefold()
+            groups = [group for group in groups if (group["displayName"] or "").casefold().startswith(prefix)]
+        return groups
+
+    async def _get_user_groups_live(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get a user's groups from Graph via transitiveMemberOf (follows every @odata.nextLink)"""
+        with graph_errors("get user groups"):
+            logger.info(f"Getting groups for user: {user_id}")
+            client = self._get_graph_client()
+            groups_builder = client.users.by_user_id(user_id).transitive_member_of.graph_group
+            
+            query_params = GraphGroupRequestBuilder.GraphGroupRequestBuilderGetQueryParameters(
+                top=MEMBER_PAGE_SIZE,
+                select=GROUP_SELECT
+            )
+            request_config = GraphGroupRequestBuilder.GraphGroupRequestBuilderGetRequestConfiguration(
+                query_parameters=query_params
+            )
+            result = await self._scheduler.call(
+                lambda: groups_builder.get(request_configuration=request_config)
+            )
+            
+            groups = []
+            while result:
+                for group in result.value or []:
+                    groups.append(group_to_dict(group, GROUP_SELECT))
+                
+                next_link = result.odata_next_link
+                if not next_link:
+                    break
+                result = await self._scheduler.call(lambda: groups_builder.with_url(next_link).get())
+            
+            logger.info(f"Found {len(groups)} groups for user {user_id}")
+            return groups
+
+    def get_user_groups_indexed(self, user_id: str, prefix: str = "") -> Dict[str, Any]:
+        """
+        Answer user -> groups from the in-memory membership index (no Graph calls)
+        
+        Only direct memberships of groups whose member list this worker has already
+        loaded are known, so the answer is partial by design.
+        """
+        if not self._membership_index:
+            raise ValueError("Membership index is not enabled (set MEMBERSHIP_INDEX_ENABLED=true)")
+        return {
+            "groups": self._membership_index.get_member_groups(user_id, prefix),
+            "indexedGroups": self._membership_index.indexed_group_count
+        }
+
+    @telemetry.traced("service.sync_group_members")
+    async def sync_group_members(
+        self, group_id: str, desired_ids: List[str], dry_run: bool = False, include_ids: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Make a group's direct membership match a desired set, changing only the difference
+        
+        Args:
+            group_id: Azure AD group GUID
+            desired_ids: Complete desired set of member object ids
+            dry_run: Only compute the diff and the Graph calls it would take
+            include_ids: Also return the ids to add and remove after applying the diff
+                (a dry run always returns them)
+        
+        Returns:
+            Diff counts (and ids), estimated Graph calls and (unless dry_run) change counts
+            and failures
+        """
+        with graph_errors("sync group members"):
+            logger.info(f"Syncing members of group {group_id} to {len(desired_ids)} desired members")
+            
+            current = set()
+            pages = 0
+            async for page, _ in self.iter_group_member_pages(group_id, select=['id']):
+                current.update(member.id.lower() for member in page)
+                pages += 1
+            desired = {member_id.lower() for member_id in desired_ids}
+            
+            to_add = sorted(desired - current)
+            to_remove = sorted(current - desired)
+            add_calls = -(-len(to_add) // BULK_CHUNK_SIZE)
+            remove_calls = -(-len(to_remove) // BATCH_MAX_REQUESTS)
+            
+            diff = {
+                "groupId": group_id,
+                "dryRun": dry_run,
+                "current": len(current),
+                "desired": len(desired),
+                "unchanged": len(current & desired),
+                "toAddCount": len(to_add),
+                "toRemoveCount": len(to_remove),
+                "toAdd": to_add,
+                "toRemove": to_remove,
+                "estimatedGraphCalls": {
+                    "read": pages,
+                    "add": add_calls,
+                    "remove": remove_calls,
+                    "total": pages + add_calls + remove_calls
+                }
+            }
+            logger.info(f"Group {group_id} diff: +{len(to_add)} -{len(to_remove)}")
+            if dry_run:
+                return diff
+            
+            add_results = await self.add_group_members_bulk(group_id, to_add) if to_add else []
+            remove_results = await self.remove_group_members(group_id, to_remove)
+            
+            if not include_ids:
+                # A large reconcile would otherwise echo every id back
+                del diff["toAdd"], diff["toRemove"]
+            failures = [result for result in add_results + remove_results if result["status"] == "failed"]
+            diff["added"] = sum(1 for result in add_results if result["status"] == "added")
+            diff["removed"] = sum(1 for result in remove_results if result["status"] == "removed")
+            diff["failures"] = failures
+            return diff
+
+    async def remove_group_members(
+        self, group_id: str, member_ids: List[str], raise_on_throttle: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Remove members from a group with $batch envelopes of reference DELETEs, a bounded
+        number of envelopes at a time (`raise_on_throttle`: raise GraphThrottledError instead
+        of reporting the members as failed)
+        """
+        batcher = GraphBatcher(self._post_batch)
+        semaphore = asyncio.Semaphore(SYNC_REMOVE_CONCURRENCY)
+        throttled: Optional[GraphThrottledError] = None
+        group_path = f"/groups/{quote(group_id, safe='')}/members"
+        
+        async def remove(member_id: str) -> Dict[str, Any]:
+            nonlocal throttled
+            url = f"{group_path}/{quote(member_id, safe='')}/$ref"
+            try:
+                # The envelope was paid for when it was sent; this only retries throttled requests
+                await self._scheduler.call(lambda: batcher.delete(url), cost=0)
+                return {"userId": member_id, "status": "removed"}
+            except GraphThrottledError as e:
+                throttled = e
+                return {"userId": member_id, "status": "failed", "error": str(e)}
+            except Exception as e:
+                if get_status_code(e) == 404:
+                    # Already gone - the desired state holds
+                    return {"userId": member_id, "status": "notMember"}
+                return {"userId": member_id, "status": "failed", "error": graph_error_message(e)}
+        
+        async def remove_envelope(envelope_ids: List[str]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await asyncio.gather(*(remove(member_id) for member_id in envelope_ids))
+        
+        envelopes = [member_ids[i:i + BATCH_MAX_REQUESTS] for i in range(0, len(member_ids), BATCH_MAX_REQUESTS)]
+        results = [
+            result
+            for envelope_results in await asyncio.gather(*(remove_envelope(ids) for ids in envelopes))
+            for result in envelope_results
+        ]
+        if envelopes:
+            logger.info(
+                f"Removed members of group {group_id} with {batcher.envelope_count} $batch envelopes "
+                f"({batcher.request_count} requests)"
+            )
+        
+        removed = [result["userId"] for result in results if result["status"] == "removed"]
+        if removed:
+            await self._invalidate(members_cache_key(group_id))
+            await self._invalidate_transitive_members()
+            for member_id in removed:
+                await self._invalidate(member_of_cache_key(member_id))
+            if self._membership_index:
+                self._membership_index.remove_members(group_id, removed)
+            if self._mirror:
+                await self._mirror.mark_stale()
+        if throttled and raise_on_throttle:
+            # Raised once the removals that went through are reflected in the caches
+            raise throttled
+        return results
+    
+    @telemetry.traced("service.apply_group_changes")
+    async def apply_group_changes(self, changes: List[GroupChange], refresh: bool = False) -> Dict[str, Any]:
+        """
+        Invalidate only the cache entries a batch of (coalesced) group changes affects
+        
+        - Membership changes: the group's member list, the group lists of the added and
+          removed members, and every transitive member list
+        - Created, renamed/updated or deleted groups: cached searches and the group name index
+        - Deleted groups: also the group's member list and its members' group lists
+        
+        Args:
+            changes: Changes from Graph change notifications, one per group
+            refresh: Reload member lists that were cached, so the next read stays warm
+        
+        Returns:
+            Counts of what was invalidated and refreshed
+        """
+        searches_changed = False
+        membership_changes = 0
+        refresh_ids = []
+        for change in changes:
+            if change.created or change.deleted or change.properties_changed:
+                searches_changed = True
+            if not (change.membership_changed or change.deleted):
+                continue
+            
+            membership_changes += 1
+            key = members_cache_key(change.group_id)
+            cached = self._cache.get(key)
+            await self._invalidate(key)
+            
+            affected = change.members_added | change.members_removed
+            if change.deleted:
+                # The notification doesn't list a deleted group's members - use the cached list
+                affected |= {member.id.lower() for member in cached or []}
+                if self._membership_index:
+                    self._membership_index.remove_group(change.group_id)
+            else:
+                if cached is not None and refresh:
+                    refresh_ids.append(change.group_id)
+                if self._membership_index:
+                    for member_id in change.members_added:
+                        self._membership_index.add_member(change.group_id, member_id)
+                    self._membership_index.remove_members(change.group_id, change.members_removed)
+            for member_id in affected:
+                await self._invalidate(member_of_cache_key(member_id))
+        
+        if membership_changes:
+            await self._invalidate_transitive_members()
+            if self._mirror:
+                await self._mirror.mark_stale()
+        if searches_changed:
+            await self._invalidate_searches()
+        
+        if refresh_ids:
+            semaphore = asyncio.Semaphore(self.settings.BULK_CONCURRENCY)
+            
+            async def reload(group_id: str):
+                async with semaphore:
+                    await self.get_group_members(group_id)
+            
+            results = await asyncio.gather(*(reload(group_id) for group_id in refresh_ids), return_exceptions=True)
+            for group_id, result in zip(refresh_ids, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Refreshing members of group {group_id} failed: {str(result)}")
+        
+        logger.info(
+            f"Applied {len(changes)} group changes: {membership_changes} membership, "
+            f"searches invalidated: {searches_changed}, {len(refresh_ids)} member lists refreshed"
+        )
+        return {
+            "groups": len(changes),
+            "membershipChanges": membership_changes,
+            "searchesInvalidated": searches_changed,
+            "membersRefreshed": len(refresh_ids)
+        }
+    
+    @telemetry.traced("service.ensure_group_subscription")
+    async def ensure_group_subscription(
+        self, notification_url: str, client_state: str, lifetime_hours: float
+    ) -> Dict[str, Any]:
+        """
+        Create the Graph change-notification subscription for groups, or extend it if it exists
+        
+        Args:
+            notification_url: Public URL of the GraphNotifications function (with its key)
+            client_state: Secret Graph echoes in every notification
+            lifetime_hours: New expiry, counted from now
+        
+        Returns:
+            Subscription id, whether it was created or renewed, and its expiry
+        """
+        with graph_errors("ensure group subscription"):
+            client = self._get_graph_client()
+            expires_at = datetime.now(timezone.utc) + timedelta(hours=lifetime_hours)
+            
+            result = await self._scheduler.call(lambda: client.subscriptions.get())
+            existing = next(
+                (
+                    subscription for subscription in (result.value or [])
+                    if subscription.resource == SUBSCRIPTION_RESOURCE
+                    and subscription.notification_url == notification_url
+                ),
+                None
+            )
+            
+            if existing:
+                update = Subscription()
+                update.expiration_date_time = expires_at
+                await self._scheduler.call(
+                    lambda: client.subscriptions.by_subscription_id(existing.id).patch(update)
+                )
+                subscription_id = existing.id
+                action = "renewed"
+            else:
+                subscription = Subscription()
+                subscription.change_type = SUBSCRIPTION_CHANGE_TYPES
+                subscription.notification_url = notification_url
+                subscription.resource = SUBSCRIPTION_RESOURCE
+                subscription.expiration_date_time = expires_at
+                subscription.client_state = client_state
+                # Graph calls the webhook with a validation token before this returns
+                created = await self._scheduler.call(
+                    lambda: client.subscriptions.post(subscription), idempotent=False
+                )
+                subscription_id = created.id
+                action = "created"
+            
+            logger.info(f"Group subscription {subscription_id} {action}, expires {expires_at.isoformat()}")
+            return {
+                "tenantId": self.settings.AZURE_TENANT_ID,
+                "subscriptionId": subscription_id,
+                "action": action,
+                "expiresAt": expires_at.isoformat()
+            }
@@ -0,0 +1,180 @@
+"""
+In-process Read Cache
+TTL + LRU cache with request coalescing for Graph read results
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from services import telemetry
+from services.serialization import MemberRecord
+
+logger = logging.getLogger(__name__)
+
+# JSON size of a typical member record (GUID id, display name, type and UPN)
+MEMBER_RECORD_SIZE = 100
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Approximate memory cost of a cached value (its JSON size). Member lists - the largest
+    values by far - are estimated per record instead of being serialized on every store.
+    """
+    if isinstance(value, list) and value and isinstance(value[0], MemberRecord):
+        return len(value) * MEMBER_RECORD_SIZE
+    try:
+        return len(json.dumps(value, separators=(',', ':')))
+    except (TypeError, ValueError):
+        return 0
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire after `ttl` seconds.
+    Bounded by both entry count and (approximate) byte size.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, size, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        # Bumped on every invalidation so loads started before a write aren't stored
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a fresh value or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Seconds until a fresh entry expires, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        remaining = entry[0] - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting least recently used entries to stay within budget"""
+        if not self.enabled:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        self._generation += 1
+        self._remove(key)
+        # New readers must not join a load that started before the write
+        self._in_flight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches the predicate"""
+        self._generation += 1
+        for key in [key for key in self._entries if predicate(key)]:
+            self._remove(key)
+        for key in [key for key in self._in_flight if predicate(key)]:
+            self._in_flight.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Get a cached value, or load it. Concurrent misses for the same key
+        share a single in-flight load.
+        """
+        if not self.enabled:
+            return await loader()
+
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            telemetry.record_cache_lookup(hit=True)
+            return value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            telemetry.record_cache_lookup(hit=True)
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        telemetry.record_cache_lookup(hit=False)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                self._in_flight.pop(key)
+
+        if generation == self._generation:
+            self.set(key, value)
+        future.set_result(value)
+        return value
+
+    async def refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Load a value and store it even if the cached one is still fresh (pre-warming)"""
+        generation = self._generation
+        value = await loader()
+        if generation == self._generation:
+            self.set(key, value)
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache counters"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hitRatio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0
+        }
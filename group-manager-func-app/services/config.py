@@ -2,10 +2,15 @@
 Configuration management for Azure Functions
 Loads from environment variables / local.settings.json
 """
+import json
 import os
+import tempfile
 from typing import Optional
 from functools import lru_cache
 
+from services.notifications import MAX_SUBSCRIPTION_HOURS
+from services.tenants import validate_tenant_configs
+
 
 class Settings:
     """Application settings loaded from environment"""
@@ -16,6 +21,123 @@ class Settings:
         self.AZURE_CLIENT_ID = os.environ.get("AZURE_CLIENT_ID", "")
         self.AZURE_CLIENT_SECRET = os.environ.get("AZURE_CLIENT_SECRET", "")
         
+        # Other tenants served by this app: JSON keyed by tenant id, e.g.
+        # {"<tenantId>": {"clientSecretSetting": "SUBSIDIARY_SECRET", "rateLimit": 20}}
+        # (see services/tenants.py). The whole value may be a Key Vault reference.
+        self.GRAPH_TENANTS = self._load_tenants(os.environ.get("GRAPH_TENANTS", ""))
+        # Live per-tenant services kept per worker (least recently used is evicted)
+        self.TENANT_POOL_SIZE = int(os.environ.get("TENANT_POOL_SIZE", "16"))
+        # Read cache budget per pooled tenant unless its entry sets cacheMaxBytes
+        self.TENANT_CACHE_MAX_BYTES = int(os.environ.get("TENANT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+        
+        # Graph token manager - refresh this many seconds before expiry, optionally
+        # persisting the token (encrypted) so recycled workers skip a login round trip
+        self.TOKEN_REFRESH_MARGIN = float(os.environ.get("TOKEN_REFRESH_MARGIN", "300"))
+        self.TOKEN_CACHE_ENABLED = os.environ.get("TOKEN_CACHE_ENABLED", "false").lower() == "true"
+        self.TOKEN_CACHE_PATH = os.environ.get(
+            "TOKEN_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), f"group-manager-token-{self.AZURE_CLIENT_ID}.bin")
+        )
+        
+        # Shared HTTP transport (one pooled client per worker)
+        self.HTTP_HTTP2 = os.environ.get("HTTP_HTTP2", "true").lower() == "true"
+        self.HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+        self.HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+        self.HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "120"))
+        self.HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+        self.HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "60"))
+        
+        # Offline benchmarks only: send Graph traffic to a local stand-in (benchmarks/mock_graph.py)
+        # and skip Azure AD login. Never set this in a deployed app.
+        self.GRAPH_MOCK_URL = os.environ.get("GRAPH_MOCK_URL", "")
+        
+        # Graph request scheduler (per tenant). Graph's identity & access budget is
+        # 3,500 resource units / 10s per app per tenant on large tenants (less on
+        # smaller ones), and reads cost 1-5 units each - stay well under it.
+        self.GRAPH_RATE_LIMIT = float(os.environ.get("GRAPH_RATE_LIMIT", "50"))
+        self.GRAPH_RATE_BURST = int(os.environ.get("GRAPH_RATE_BURST", "100"))
+        self.GRAPH_MAX_RETRIES = int(os.environ.get("GRAPH_MAX_RETRIES", "4"))
+        self.GRAPH_BACKOFF_BASE = float(os.environ.get("GRAPH_BACKOFF_BASE", "0.5"))
+        self.GRAPH_BACKOFF_MAX = float(os.environ.get("GRAPH_BACKOFF_MAX", "30"))
+        self.GRAPH_BREAKER_THRESHOLD = int(os.environ.get("GRAPH_BREAKER_THRESHOLD", "5"))
+        self.GRAPH_BREAKER_COOLDOWN = float(os.environ.get("GRAPH_BREAKER_COOLDOWN", "30"))
+        
+        # In-process read cache (search results and member lists). TTL 0 disables it.
+        self.CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "30"))
+        self.CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1000"))
+        self.CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        
+        # Shared second-level cache for scaled-out workers: redis://, rediss:// (e.g. Azure Cache
+        # for Redis) or memory:// (in-process fake for local testing). Empty disables it.
+        self.L2_CACHE_URL = os.environ.get("L2_CACHE_URL", "")
+        self.L2_CACHE_TTL_SECONDS = float(os.environ.get("L2_CACHE_TTL_SECONDS", "300"))
+        self.L2_CACHE_COMPRESS_BYTES = int(os.environ.get("L2_CACHE_COMPRESS_BYTES", "4096"))
+        # Longest a worker waits for another worker's load of the same entry
+        self.L2_CACHE_LOCK_SECONDS = float(os.environ.get("L2_CACHE_LOCK_SECONDS", "10"))
+        self.L2_CACHE_TIMEOUT = float(os.environ.get("L2_CACHE_TIMEOUT", "1"))
+        # After a backend error the shared cache is bypassed for this long
+        self.L2_CACHE_RETRY_SECONDS = float(os.environ.get("L2_CACHE_RETRY_SECONDS", "30"))
+        
+        # Pre-warm timer (PrewarmHotData): how many of the most requested searches and member
+        # lists it reloads per tenant. Request counts halve every PREWARM_HALF_LIFE_SECONDS.
+        # Its schedule is the PREWARM_SCHEDULE app setting (NCRONTAB, default every 5 minutes).
+        self.PREWARM_ENABLED = os.environ.get("PREWARM_ENABLED", "true").lower() == "true"
+        self.PREWARM_HOT_SEARCHES = int(os.environ.get("PREWARM_HOT_SEARCHES", "20"))
+        self.PREWARM_HOT_GROUPS = int(os.environ.get("PREWARM_HOT_GROUPS", "50"))
+        self.PREWARM_HALF_LIFE_SECONDS = float(os.environ.get("PREWARM_HALF_LIFE_SECONDS", "3600"))
+        
+        # Inverted member -> groups index built from member listings (memory cost ~ members loaded)
+        self.MEMBERSHIP_INDEX_ENABLED = os.environ.get("MEMBERSHIP_INDEX_ENABLED", "false").lower() == "true"
+        
+        # Local directory mirror (SQLite, synced with Graph delta queries)
+        self.MIRROR_ENABLED = os.environ.get("MIRROR_ENABLED", "false").lower() == "true"
+        self.MIRROR_PATH = os.environ.get(
+            "MIRROR_PATH", os.path.join(tempfile.gettempdir(), "group-manager-mirror.sqlite3")
+        )
+        self.MIRROR_SYNC_INTERVAL = float(os.environ.get("MIRROR_SYNC_INTERVAL", "60"))
+        
+        # Graph change notifications (push invalidation of the cache and mirror). NOTIFICATION_URL
+        # is the public GraphNotifications URL including ?code=<function key>; leaving it empty
+        # disables subscription management.
+        self.NOTIFICATION_URL = os.environ.get("NOTIFICATION_URL", "")
+        self.NOTIFICATION_CLIENT_STATE = os.environ.get("NOTIFICATION_CLIENT_STATE", "")
+        self.NOTIFICATION_SUBSCRIPTION_HOURS = float(os.environ.get("NOTIFICATION_SUBSCRIPTION_HOURS", "72"))
+        # Notifications are collected this long, then applied once per group
+        self.NOTIFICATION_COALESCE_SECONDS = float(os.environ.get("NOTIFICATION_COALESCE_SECONDS", "2"))
+        # Reload member lists that were cached when their group changes (instead of only dropping them)
+        self.NOTIFICATION_REFRESH = os.environ.get("NOTIFICATION_REFRESH", "true").lower() == "true"
+        # Append every notification body to this JSON Lines file (for benchmarks/replay_notifications.py)
+        self.NOTIFICATION_RECORD_PATH = os.environ.get("NOTIFICATION_RECORD_PATH", "")
+        
+        # Bulk operations
+        self.BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", "4"))
+        # POST /groups/members:query: most groups per request, and groups fetched at once
+        # (the first pages of up to 20 of them share one Graph $batch envelope)
+        self.MEMBERS_QUERY_MAX_GROUPS = int(os.environ.get("MEMBERS_QUERY_MAX_GROUPS", "100"))
+        self.MEMBERS_QUERY_CONCURRENCY = int(os.environ.get("MEMBERS_QUERY_CONCURRENCY", "20"))
+        
+        # Async jobs. Production uses Azure Storage (queue + table) via AzureWebJobsStorage;
+        # JOB_QUEUE=memory with JOB_STORE=memory|sqlite runs everything in-process for local testing.
+        self.STORAGE_CONNECTION_STRING = os.environ.get("AzureWebJobsStorage", "")
+        self.JOB_QUEUE = os.environ.get("JOB_QUEUE", "storage").lower()
+        self.JOB_STORE = os.environ.get("JOB_STORE", "table").lower()
+        self.JOB_TABLE_NAME = os.environ.get("JOB_TABLE_NAME", "groupmanagerjobs")
+        self.JOB_SQLITE_PATH = os.environ.get(
+            "JOB_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "group-manager-jobs.sqlite3")
+        )
+        # Work per invocation before a job checkpoints and re-queues itself (keep < functionTimeout)
+        self.JOB_SLICE_SECONDS = float(os.environ.get("JOB_SLICE_SECONDS", "240"))
+        
+        # Directory exports (exportDirectory jobs): blob container on AzureWebJobsStorage in
+        # production, EXPORT_STORE=local writes under EXPORT_LOCAL_PATH for local testing
+        self.EXPORT_STORE = os.environ.get("EXPORT_STORE", "blob").lower()
+        self.EXPORT_CONTAINER = os.environ.get("EXPORT_CONTAINER", "group-manager-exports")
+        self.EXPORT_LOCAL_PATH = os.environ.get(
+            "EXPORT_LOCAL_PATH", os.path.join(tempfile.gettempdir(), "group-manager-exports")
+        )
+        # Rows buffered per file before a part is written (bounds the export's memory use)
+        self.EXPORT_PART_ROWS = int(os.environ.get("EXPORT_PART_ROWS", "50000"))
+        
         # Validation
         if not self.AZURE_TENANT_ID:
             raise ValueError("AZURE_TENANT_ID environment variable is required")
@@ -23,6 +145,43 @@ class Settings:
             raise ValueError("AZURE_CLIENT_ID environment variable is required")
         if not self.AZURE_CLIENT_SECRET:
             raise ValueError("AZURE_CLIENT_SECRET environment variable is required")
+        if self.GRAPH_RATE_LIMIT <= 0 or self.GRAPH_RATE_BURST < 1:
+            raise ValueError("GRAPH_RATE_LIMIT and GRAPH_RATE_BURST must be positive")
+        if self.BULK_CONCURRENCY < 1:
+            raise ValueError("BULK_CONCURRENCY must be at least 1")
+        if self.MEMBERS_QUERY_MAX_GROUPS < 1 or self.MEMBERS_QUERY_CONCURRENCY < 1:
+            raise ValueError("MEMBERS_QUERY_MAX_GROUPS and MEMBERS_QUERY_CONCURRENCY must be at least 1")
+        if self.JOB_QUEUE not in ("storage", "memory"):
+            raise ValueError("JOB_QUEUE must be 'storage' or 'memory'")
+        if self.JOB_STORE not in ("table", "sqlite", "memory"):
+            raise ValueError("JOB_STORE must be 'table', 'sqlite' or 'memory'")
+        if self.EXPORT_STORE not in ("blob", "local"):
+            raise ValueError("EXPORT_STORE must be 'blob' or 'local'")
+        if self.EXPORT_PART_ROWS < 1:
+            raise ValueError("EXPORT_PART_ROWS must be at least 1")
+        if self.NOTIFICATION_URL and not self.NOTIFICATION_CLIENT_STATE:
+            raise ValueError("NOTIFICATION_CLIENT_STATE is required when NOTIFICATION_URL is set")
+        if not 1 <= self.NOTIFICATION_SUBSCRIPTION_HOURS <= MAX_SUBSCRIPTION_HOURS:
+            raise ValueError(f"NOTIFICATION_SUBSCRIPTION_HOURS must be between 1 and {MAX_SUBSCRIPTION_HOURS}")
+        if self.L2_CACHE_URL and self.L2_CACHE_TTL_SECONDS <= 0:
+            raise ValueError("L2_CACHE_TTL_SECONDS must be positive")
+        if self.PREWARM_HOT_SEARCHES < 0 or self.PREWARM_HOT_GROUPS < 0:
+            raise ValueError("PREWARM_HOT_SEARCHES and PREWARM_HOT_GROUPS must not be negative")
+        if self.PREWARM_HALF_LIFE_SECONDS <= 0:
+            raise ValueError("PREWARM_HALF_LIFE_SECONDS must be positive")
+        if self.TENANT_POOL_SIZE < 1:
+            raise ValueError("TENANT_POOL_SIZE must be at least 1")
+    
+    @staticmethod
+    def _load_tenants(value: str) -> dict:
+        """Parse GRAPH_TENANTS (empty means single-tenant)"""
+        if not value.strip():
+            return {}
+        try:
+            tenants = json.loads(value)
+        except json.JSONDecodeError:
+            raise ValueError("GRAPH_TENANTS must be valid JSON")
+        return validate_tenant_configs(tenants)
     
     def validate_credentials(self) -> bool:
         """Check if all Azure credentials are configured"""
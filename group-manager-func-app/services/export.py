@@ -0,0 +1,205 @@
+"""
+Directory Export
+Sinks and part-file writers for streaming group/membership snapshots (exportDirectory jobs)
+to NDJSON, columnar JSON or Parquet files without holding the directory in memory
+"""
+import asyncio
+import importlib.util
+from abc import ABC, abstractmethod
+import io
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from services.serialization import dumps
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ["ndjson", "columnar", "parquet"]
+
+FILE_EXTENSIONS = {"ndjson": "ndjson", "columnar": "json", "parquet": "parquet"}
+
+# Row layouts. Incremental exports add a `change` column:
+# groups: upsert | deleted, members: added | removed
+GROUP_COLUMNS = ["id", "displayName", "description", "mailEnabled", "securityEnabled"]
+MEMBER_COLUMNS = ["groupId", "memberId", "type", "displayName", "userPrincipalName"]
+
+# Exports only cover groups under this prefix
+EXPORT_PREFIX = "AAD.TA."
+
+# Pointer to the last completed snapshot of an export (read by incremental exports)
+LATEST_MANIFEST = "latest.json"
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident memory of this worker process so far (None where unavailable)"""
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def encode_part(columns: Sequence[str], rows: List[Tuple], output_format: str) -> bytes:
+    """Encode one part file: NDJSON lines, a columnar JSON document, or a Parquet file"""
+    if output_format == "ndjson":
+        return ("\n".join(dumps(dict(zip(columns, row))) for row in rows) + "\n").encode()
+    if output_format == "columnar":
+        return dumps({"columns": list(columns), "rows": [list(row) for row in rows]}).encode()
+
+    # Imported here: pyarrow is optional and slow to import, and jobs.py is loaded at startup
+    import pyarrow
+    import pyarrow.parquet
+
+    table = pyarrow.table({column: [row[i] for row in rows] for i, column in enumerate(columns)})
+    buffer = io.BytesIO()
+    pyarrow.parquet.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+def validate_export_format(output_format: Any) -> Optional[str]:
+    """Validate an export format, returning an error message or None"""
+    if output_format not in EXPORT_FORMATS:
+        return f"params.format must be one of: {', '.join(EXPORT_FORMATS)}"
+    if output_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        return "params.format=parquet needs the pyarrow package"
+    return None
+
+
+# Export sinks
+
+class ExportSink(ABC):
+    """Stores export files by relative path"""
+
+    @abstractmethod
+    async def write(self, path: str, data: bytes):
+        """Create or replace a file"""
+
+    @abstractmethod
+    async def read(self, path: str) -> Optional[bytes]:
+        """Read a file (None if it doesn't exist)"""
+
+    @abstractmethod
+    def location(self, path: str) -> str:
+        """Where a file can be found, for job results"""
+
+
+class LocalExportSink(ExportSink):
+    """Files under a local directory (local testing)"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _write(self, path: str, data: bytes):
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_path = f"{full_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def write(self, path: str, data: bytes):
+        await asyncio.to_thread(self._write, path, data)
+
+    async def read(self, path: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, path)
+
+    def location(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+
+class BlobExportSink(ExportSink):
+    """Azure Blob Storage container on AzureWebJobsStorage (production)"""
+
+    def __init__(self, connection_string: str, container_name: str):
+        from azure.storage.blob import BlobServiceClient
+
+        service = BlobServiceClient.from_connection_string(connection_string)
+        self._container = service.get_container_client(container_name)
+        self._container_ready = False
+
+    def _ensure_container(self):
+        from azure.core.exceptions import ResourceExistsError
+
+        if not self._container_ready:
+            try:
+                self._container.create_container()
+            except ResourceExistsError:
+                pass
+            self._container_ready = True
+
+    def _write(self, path: str, data: bytes):
+        self._ensure_container()
+        self._container.upload_blob(path, data, overwrite=True)
+
+    def _read(self, path: str) -> Optional[bytes]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self._container.download_blob(path).readall()
+        except ResourceNotFoundError:
+            return None
+
+    async def write(self, path: str, data: bytes):
+        await asyncio.to_thread(self._write, path, data)
+
+    async def read(self, path: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, path)
+
+    def location(self, path: str) -> str:
+        return f"{self._container.url}/{path}"
+
+
+def create_export_sink(settings) -> ExportSink:
+    if settings.EXPORT_STORE == "local":
+        return LocalExportSink(settings.EXPORT_LOCAL_PATH)
+    if not settings.STORAGE_CONNECTION_STRING:
+        raise ValueError("AzureWebJobsStorage must be set for the blob export store")
+    return BlobExportSink(settings.STORAGE_CONNECTION_STRING, settings.EXPORT_CONTAINER)
+
+
+# Part files
+
+class PartWriter:
+    """
+    Buffers the rows of one file kind (groups or members) and writes them as numbered
+    part files, so memory is bounded by one part however large the directory is.
+    Part names are deterministic: a part rewritten after resuming from a checkpoint
+    replaces the earlier attempt instead of duplicating rows.
+    """
+
+    def __init__(self, sink: ExportSink, prefix: str, kind: str, columns: Sequence[str],
+                 output_format: str, part: int = 0):
+        self.sink = sink
+        self.prefix = prefix
+        self.kind = kind
+        self.columns = list(columns)
+        self.format = output_format
+        self.part = part
+        self.rows: List[Tuple] = []
+
+    def add(self, rows: List[Tuple]):
+        self.rows.extend(rows)
+
+    async def flush(self) -> Optional[Dict[str, Any]]:
+        """Write the buffered rows as the next part file (None when nothing is buffered)"""
+        if not self.rows:
+            return None
+        path = f"{self.prefix}/{self.kind}-{self.part:05d}.{FILE_EXTENSIONS[self.format]}"
+        data = await asyncio.to_thread(encode_part, self.columns, self.rows, self.format)
+        await self.sink.write(path, data)
+        written = {"path": path, "rows": len(self.rows), "bytes": len(data)}
+        self.part += 1
+        self.rows = []
+        return written
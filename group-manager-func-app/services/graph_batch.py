@@ -0,0 +1,115 @@
+"""
+Graph $batch
+Packs concurrent GET (and reference DELETE) requests into JSON $batch envelopes, so touching
+many small resources costs one round trip per envelope instead of one per resource
+"""
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+GRAPH_BATCH_URL = "https://graph.microsoft.com/v1.0/$batch"
+
+# Graph accepts at most 20 requests per JSON $batch
+BATCH_MAX_REQUESTS = 20
+
+
+class GraphBatchError(Exception):
+    """
+    A failed $batch envelope or request. Carries the status code and headers the way
+    kiota's APIError does, so the scheduler retries and throttles it like any Graph call.
+    """
+
+    def __init__(self, message: str, status: int, headers: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.response_status_code = status
+        self.response_headers = dict(headers or {})
+
+
+def batch_response_error(response: Dict[str, Any]) -> GraphBatchError:
+    """The error for one failed response of a $batch envelope"""
+    body = response.get("body")
+    error = body.get("error") if isinstance(body, dict) else None
+    status = response.get("status", 500)
+    message = (error or {}).get("message") or f"Graph returned {status}"
+    return GraphBatchError(message, status, response.get("headers"))
+
+
+class GraphBatcher:
+    """
+    Collects requests issued in the same event loop iteration and sends them as one
+    $batch envelope (a new envelope is started every BATCH_MAX_REQUESTS requests).
+
+    `send` posts one envelope and returns its responses keyed by request id.
+    """
+
+    def __init__(self, send: Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Dict[str, Any]]]],
+                 max_requests: int = BATCH_MAX_REQUESTS):
+        self._send = send
+        self.max_requests = max_requests
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._ids = itertools.count(1)
+        self._flush_scheduled = False
+        self.envelope_count = 0
+        self.request_count = 0
+
+    async def get(self, url: str) -> Dict[str, Any]:
+        """
+        GET a Graph URL relative to the version root (e.g. /groups/{id}/members?$top=999)
+
+        Returns:
+            The response body
+        Raises:
+            GraphBatchError: the request (or its whole envelope) failed
+        """
+        return await self._request("GET", url)
+
+    async def delete(self, url: str):
+        """
+        DELETE a Graph URL relative to the version root (e.g. /groups/{id}/members/{id}/$ref)
+
+        Raises:
+            GraphBatchError: the request (or its whole envelope) failed
+        """
+        await self._request("DELETE", url)
+
+    async def _request(self, method: str, url: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(({"id": str(next(self._ids)), "method": method, "url": url}, future))
+        if len(self._pending) >= self.max_requests:
+            self._flush()
+        elif not self._flush_scheduled:
+            # Let the other requests issued in this loop iteration join the envelope
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+
+        response = await future
+        if response.get("status", 500) >= 400:
+            raise batch_response_error(response)
+        return response.get("body") or {}
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending[:self.max_requests], self._pending[self.max_requests:]
+        if pending:
+            asyncio.get_running_loop().create_task(self._send_envelope(pending))
+
+    async def _send_envelope(self, pending: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.envelope_count += 1
+        self.request_count += len(pending)
+        try:
+            responses = await self._send([request for request, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for request, future in pending:
+            if future.done():
+                continue
+            response = responses.get(request["id"])
+            if response is None:
+                future.set_exception(GraphBatchError("Request missing from the $batch response", 500))
+            else:
+                future.set_result(response)
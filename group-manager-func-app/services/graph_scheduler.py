@@ -0,0 +1,228 @@
+"""
+Graph Request Scheduler
+Rate limits, retries and sheds load for all MS Graph API calls of a tenant
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Status codes Graph uses to signal throttling / transient overload
+THROTTLE_STATUS_CODES = (429, 503)
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+
+
+class GraphThrottledError(Exception):
+    """Raised when Graph keeps throttling us or the circuit breaker is open"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """Get the HTTP status code of a kiota APIError, if any"""
+    return getattr(error, 'response_status_code', None)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Get the Retry-After header (in seconds) of a kiota APIError, if any"""
+    headers = getattr(error, 'response_headers', None) or {}
+    for key, value in dict(headers).items():
+        if key.lower() == 'retry-after':
+            if isinstance(value, (list, tuple, set)):
+                value = next(iter(value), None)
+            try:
+                return max(0.0, float(value))
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class TokenBucket:
+    """Token bucket rate limiter (rate tokens per second, up to burst)"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        # Created on first acquire, inside the running loop: before Python 3.10 a Lock binds to
+        # the loop current when it is created, and buckets may be built on a warm-up thread
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int = 1):
+        """Wait until `tokens` tokens (at most burst) are available and take them"""
+        tokens = min(tokens, self.burst)
+        if tokens <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # The lock makes waiters queue up in FIFO order
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive throttled calls and rejects calls until
+    the cooldown (or Graph's Retry-After, whichever is longer) has passed.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._consecutive_throttles = 0
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self._open_until - time.monotonic())
+
+    def record_success(self):
+        self._consecutive_throttles = 0
+
+    def record_throttle(self, retry_after: Optional[float] = None):
+        self._consecutive_throttles += 1
+        if self._consecutive_throttles >= self.threshold:
+            open_for = max(self.cooldown, retry_after or 0.0)
+            self._open_until = max(self._open_until, time.monotonic() + open_for)
+            logger.warning(f"Graph circuit breaker open for {open_for:.1f}s")
+
+
+class GraphRequestScheduler:
+    """Runs Graph calls through a token bucket, retry policy and circuit breaker"""
+
+    def __init__(self, settings):
+        self.bucket = TokenBucket(settings.GRAPH_RATE_LIMIT, settings.GRAPH_RATE_BURST)
+        self.breaker = CircuitBreaker(settings.GRAPH_BREAKER_THRESHOLD, settings.GRAPH_BREAKER_COOLDOWN)
+        self.max_retries = settings.GRAPH_MAX_RETRIES
+        self.backoff_base = settings.GRAPH_BACKOFF_BASE
+        self.backoff_max = settings.GRAPH_BACKOFF_MAX
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.request_count = 0
+        self.throttle_count = 0
+        self.retry_count = 0
+        self.rejected_count = 0
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _reject_if_open(self):
+        if self.breaker.is_open:
+            self.rejected_count += 1
+            telemetry.record_throttle()
+            raise GraphThrottledError(
+                "Graph API is throttling this tenant, try again later",
+                retry_after=self.breaker.remaining
+            )
+
+    async def call(self, request: Callable[[], Awaitable[Any]], idempotent: bool = True,
+                   cost: int = 1) -> Any:
+        """
+        Run a Graph call with rate limiting and retries
+
+        Args:
+            request: Factory returning a new awaitable for each attempt
+            idempotent: False for creates (POST), which are only retried on 429 - after a
+                502/503/504 the object may exist already and a retry could duplicate it
+            cost: Tokens each attempt takes - Graph counts every request of a $batch
+                envelope, so an envelope costs its request count (0: paid for elsewhere)
+
+        Returns:
+            Result of the Graph call
+        """
+        attempt = 0
+        while True:
+            self._reject_if_open()
+
+            self.waiting += 1
+            try:
+                with telemetry.phase("graph.rateLimitWait"):
+                    await self.bucket.acquire(cost)
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            self.request_count += 1
+            started = time.perf_counter()
+            try:
+                result = await request()
+                telemetry.record_graph_call(time.perf_counter() - started)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                status = get_status_code(e)
+                telemetry.record_graph_call(time.perf_counter() - started, status or 0)
+                if status not in RETRYABLE_STATUS_CODES:
+                    raise
+
+                retry_after = get_retry_after(e)
+                if status in THROTTLE_STATUS_CODES:
+                    self.throttle_count += 1
+                    telemetry.record_throttle()
+                    self.breaker.record_throttle(retry_after)
+
+                if not idempotent and status != 429:
+                    raise
+
+                if attempt >= self.max_retries or self.breaker.is_open:
+                    raise GraphThrottledError(
+                        f"Graph API request failed with status {status} after {attempt + 1} attempts",
+                        retry_after=retry_after or self.breaker.remaining or self.backoff_base
+                    )
+
+                delay = self._backoff(attempt, retry_after)
+                logger.warning(f"Graph returned {status}, retrying in {delay:.2f}s (attempt {attempt + 1})")
+            finally:
+                self.in_flight -= 1
+
+            self.retry_count += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Scheduler counters for sizing scale-out"""
+        return {
+            "queueDepth": self.waiting,
+            "inFlight": self.in_flight,
+            "requests": self.request_count,
+            "throttled": self.throttle_count,
+            "retries": self.retry_count,
+            "rejected": self.rejected_count,
+            "circuitOpen": self.breaker.is_open
+        }
+
+
+_schedulers: Dict[str, GraphRequestScheduler] = {}
+
+
+def get_scheduler(tenant_id: str, settings) -> GraphRequestScheduler:
+    """Get the shared scheduler for a tenant (one per tenant per worker)"""
+    if tenant_id not in _schedulers:
+        _schedulers[tenant_id] = GraphRequestScheduler(settings)
+    return _schedulers[tenant_id]
@@ -0,0 +1,85 @@
+"""
+Group Name Index
+Local trigram/prefix index over group displayNames with relevance ranking
+"""
+import re
+from typing import Any, Dict, List, Set
+
+# Separators inside names like AAD.TA.DM.DEVOPS.ENGINEER
+SEGMENT_SEPARATORS = re.compile(r"[.\-_\s/]+")
+
+# Minimum trigram similarity for a name that doesn't contain the term at all
+MIN_FUZZY_SIMILARITY = 0.25
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a case-folded, space-padded string"""
+    padded = f"  {text.casefold()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def relevance(term: str, name: str) -> float:
+    """
+    Score how well a displayName matches a search term (0..1)
+
+    exact > prefix > segment prefix > substring > trigram similarity
+    """
+    term = term.casefold()
+    name = (name or "").casefold()
+    if not term:
+        return 0.0
+    if name == term:
+        return 1.0
+    # Shorter names win among equal match types - they are closer to the term
+    closeness = len(term) / max(len(name), 1)
+    if name.startswith(term):
+        return 0.9 + 0.09 * closeness
+    if any(segment.startswith(term) for segment in SEGMENT_SEPARATORS.split(name)):
+        return 0.8 + 0.09 * closeness
+    if term in name:
+        return 0.7 + 0.09 * closeness
+
+    # Typo tolerance: best trigram similarity against the whole name or any segment
+    term_grams = trigrams(term)
+    similarity = 0.0
+    for candidate in [name] + SEGMENT_SEPARATORS.split(name):
+        candidate_grams = trigrams(candidate)
+        similarity = max(similarity, len(term_grams & candidate_grams) / len(term_grams | candidate_grams))
+    return 0.6 * similarity if similarity >= MIN_FUZZY_SIMILARITY else 0.0
+
+
+def rank_groups(term: str, groups: List[Dict[str, Any]], top: int) -> List[Dict[str, Any]]:
+    """Sort groups by relevance to the term (best first), dropping non-matches"""
+    scored = []
+    for group in groups:
+        score = relevance(term, group.get("displayName"))
+        if score > 0:
+            scored.append((score, group))
+    scored.sort(key=lambda item: (-item[0], item[1].get("displayName") or ""))
+    return [{**group, "score": round(score, 3)} for score, group in scored[:top]]
+
+
+class GroupNameIndex:
+    """Inverted trigram index over a list of groups"""
+
+    def __init__(self, groups: List[Dict[str, Any]]):
+        self.source = groups
+        self._postings: Dict[str, Set[int]] = {}
+        for position, group in enumerate(groups):
+            for gram in trigrams(group.get("displayName") or ""):
+                self._postings.setdefault(gram, set()).add(position)
+
+    def search(self, term: str, top: int = 100) -> List[Dict[str, Any]]:
+        """Ranked fuzzy/substring search"""
+        if not term:
+            return []
+
+        if len(term) < 3:
+            # Too short for meaningful trigrams - rank every name
+            return rank_groups(term, self.source, top)
+
+        candidates: Set[int] = set()
+        for gram in trigrams(term):
+            candidates |= self._postings.get(gram, set())
+
+        return rank_groups(term, [self.source[position] for position in candidates], top)
@@ -0,0 +1,854 @@
+"""
+Async Jobs
+Queue-backed long-running group operations with checkpointed, resumable progress
+"""
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import logging
+import re
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from services.export import (
+    EXPORT_PREFIX, GROUP_COLUMNS, LATEST_MANIFEST, MEMBER_COLUMNS, ExportSink, PartWriter, peak_memory_mb,
+    validate_export_format
+)
+from services.graph_scheduler import GraphThrottledError
+
+logger = logging.getLogger(__name__)
+
+# Must match the RunJob queue trigger in function_app.py
+JOB_QUEUE_NAME = "group-manager-jobs"
+
+JOB_TYPES = ["listMembers", "bulkAddMembers", "syncMembers", "bulkCreateGroups", "exportDirectory"]
+
+# Items per stored result chunk - keeps each chunk well under the 64KB Table property limit
+RESULT_CHUNK_SIZE = 200
+
+# Work units per checkpoint
+MEMBER_PAGE_SIZE = 999
+BULK_ADD_SLICE = 200
+BULK_CREATE_SLICE = 20
+# Groups whose members are fetched together during an export
+EXPORT_GROUP_SLICE = 50
+# Group ids per scope file (the ids a snapshot covers, read by the next incremental export)
+SCOPE_FILE_IDS = 50000
+
+DEFAULT_EXPORT_NAME = "aad-ta"
+EXPORT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+# Failures kept in a job's result summary (the rest are only counted)
+MAX_REPORTED_FAILURES = 1000
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def validate_job_request(job_type: Any, params: Any) -> Optional[str]:
+    """Validate a job submission, returning an error message or None"""
+    if job_type not in JOB_TYPES:
+        return f"type must be one of: {', '.join(JOB_TYPES)}"
+    if not isinstance(params, dict):
+        return "params must be an object"
+    if job_type in ("listMembers", "bulkAddMembers", "syncMembers") and not params.get("groupId"):
+        return "params.groupId is required"
+    if job_type == "bulkAddMembers" and not _is_id_list(params.get("userIds"), allow_empty=False):
+        return "params.userIds must be a non-empty list of user IDs"
+    if job_type == "syncMembers":
+        member_ids = params.get("memberIds")
+        if not _is_id_list(member_ids, allow_empty=True):
+            return "params.memberIds must be a list of object IDs"
+        if not member_ids and not params.get("allowEmpty"):
+            return "params.memberIds is empty; set params.allowEmpty to remove every member"
+    if job_type == "bulkCreateGroups" and (not isinstance(params.get("groups"), list) or not params["groups"]):
+        return "params.groups must be a non-empty list"
+    if job_type == "exportDirectory":
+        prefix = params.get("prefix", EXPORT_PREFIX)
+        if not isinstance(prefix, str) or not prefix.startswith(EXPORT_PREFIX):
+            return f"params.prefix must start with '{EXPORT_PREFIX}' (case sensitive)"
+        if not EXPORT_NAME_PATTERN.match(str(params.get("name", DEFAULT_EXPORT_NAME))):
+            return "params.name may only contain letters, digits, '.', '_' and '-'"
+        if not isinstance(params.get("incremental", False), bool):
+            return "params.incremental must be true or false"
+        return validate_export_format(params.get("format", "ndjson"))
+    return None
+
+
+def _is_id_list(value: Any, allow_empty: bool) -> bool:
+    return (
+        isinstance(value, list)
+        and (allow_empty or bool(value))
+        and all(isinstance(item, str) and item for item in value)
+    )
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job record as returned by GET /jobs/{id} (params can be large, so they are left out)"""
+    return {key: value for key, value in job.items() if key != "params"}
+
+
+# Job state stores
+
+class JobStore(ABC):
+    """Persists job records and their result chunks"""
+
+    @abstractmethod
+    async def create(self, job: Dict[str, Any]):
+        """Store a new job record"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job record (None if unknown)"""
+
+    @abstractmethod
+    async def save(self, job: Dict[str, Any]):
+        """Replace a job record"""
+
+    @abstractmethod
+    async def put_result_chunk(self, job_id: str, chunk: int, items: List[Any]):
+        """Store one numbered chunk of a job's results"""
+
+    @abstractmethod
+    async def get_result_chunk(self, job_id: str, chunk: int) -> Optional[List[Any]]:
+        """Get one chunk of a job's results (None if missing)"""
+
+
+class MemoryJobStore(JobStore):
+    """In-process store for local testing"""
+
+    def __init__(self):
+        self._jobs: Dict[str, str] = {}
+        self._chunks: Dict[str, List[Any]] = {}
+
+    async def create(self, job: Dict[str, Any]):
+        await self.save(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self._jobs.get(job_id)
+        return json.loads(data) if data else None
+
+    async def save(self, job: Dict[str, Any]):
+        # Stored serialized so callers can't mutate stored state by accident
+        self._jobs[job["id"]] = json.dumps(job)
+
+    async def put_result_chunk(self, job_id: str, chunk: int, items: List[Any]):
+        self._chunks[f"{job_id}:{chunk}"] = list(items)
+
+    async def get_result_chunk(self, job_id: str, chunk: int) -> Optional[List[Any]]:
+        return self._chunks.get(f"{job_id}:{chunk}")
+
+
+class SqliteJobStore(JobStore):
+    """Single-file store for local testing that survives host restarts"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS job_results (job_id TEXT NOT NULL, chunk INTEGER NOT NULL, "
+            "data TEXT NOT NULL, PRIMARY KEY (job_id, chunk));"
+        )
+        self._conn.commit()
+
+    async def create(self, job: Dict[str, Any]):
+        await self.save(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def save(self, job: Dict[str, Any]):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data) VALUES (?, ?)", (job["id"], json.dumps(job))
+            )
+
+    async def put_result_chunk(self, job_id: str, chunk: int, items: List[Any]):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, chunk, data) VALUES (?, ?, ?)",
+                (job_id, chunk, json.dumps(items))
+            )
+
+    async def get_result_chunk(self, job_id: str, chunk: int) -> Optional[List[Any]]:
+        row = self._conn.execute(
+            "SELECT data FROM job_results WHERE job_id = ? AND chunk = ?", (job_id, chunk)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class TableJobStore(JobStore):
+    """Azure Table Storage store shared by every worker (production)"""
+
+    # Table string properties hold at most 32K characters - longer JSON is split across several
+    PROPERTY_CHARS = 30000
+    # Characters of params per entity: 12 properties, well under the 1MB entity limit
+    PARAMS_CHUNK_CHARS = 12 * PROPERTY_CHARS
+    # Stored on the job row in place of its params, which live in `params<n>` rows of the
+    # job's partition (a 100k-id list is ~4M characters, far over one entity)
+    PARAMS_REF = {"$stored": "paramsChunks"}
+
+    def __init__(self, connection_string: str, table_name: str):
+        from azure.data.tables import TableServiceClient
+
+        service = TableServiceClient.from_connection_string(connection_string)
+        self._table = service.create_table_if_not_exists(table_name)
+
+    @classmethod
+    def _to_entity(cls, partition_key: str, row_key: str, value: Any) -> Dict[str, Any]:
+        data = json.dumps(value)
+        parts = [data[i:i + cls.PROPERTY_CHARS] for i in range(0, len(data), cls.PROPERTY_CHARS)] or [""]
+        entity = {"PartitionKey": partition_key, "RowKey": row_key, "parts": len(parts)}
+        for position, part in enumerate(parts):
+            entity[f"data{position}"] = part
+        return entity
+
+    @staticmethod
+    def _from_entity(entity: Dict[str, Any]) -> Any:
+        return json.loads("".join(entity[f"data{position}"] for position in range(entity["parts"])))
+
+    async def _get_entity(self, partition_key: str, row_key: str) -> Optional[Any]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            entity = await asyncio.to_thread(self._table.get_entity, partition_key, row_key)
+        except ResourceNotFoundError:
+            return None
+        return self._from_entity(entity)
+
+    async def _upsert(self, partition_key: str, row_key: str, value: Any):
+        from azure.data.tables import UpdateMode
+
+        entity = self._to_entity(partition_key, row_key, value)
+        await asyncio.to_thread(self._table.upsert_entity, entity, mode=UpdateMode.REPLACE)
+
+    async def create(self, job: Dict[str, Any]):
+        data = json.dumps(job["params"])
+        for position, start in enumerate(range(0, len(data), self.PARAMS_CHUNK_CHARS)):
+            await self._upsert(job["id"], f"params{position:05d}", data[start:start + self.PARAMS_CHUNK_CHARS])
+        await self.save(job)
+
+    async def _get_params(self, job_id: str) -> Any:
+        entities = await asyncio.to_thread(
+            lambda: list(self._table.query_entities(
+                "PartitionKey eq @job and RowKey ge 'params' and RowKey lt 'paramt'",
+                parameters={"job": job_id}
+            ))
+        )
+        # Returned in RowKey order
+        return json.loads("".join(self._from_entity(entity) for entity in entities))
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self._get_entity("job", job_id)
+        if job and job.get("params") == self.PARAMS_REF:
+            job["params"] = await self._get_params(job_id)
+        return job
+
+    async def save(self, job: Dict[str, Any]):
+        # Params never change after create - only the reference goes on the job row
+        await self._upsert("job", job["id"], {**job, "params": self.PARAMS_REF})
+
+    async def put_result_chunk(self, job_id: str, chunk: int, items: List[Any]):
+        await self._upsert(job_id, f"{chunk:08d}", items)
+
+    async def get_result_chunk(self, job_id: str, chunk: int) -> Optional[List[Any]]:
+        return await self._get_entity(job_id, f"{chunk:08d}")
+
+
+# Job queues
+
+class JobQueue(ABC):
+    """Hands job ids to the worker that runs them"""
+
+    @abstractmethod
+    async def send(self, job_id: str, delay: float = 0):
+        """Enqueue a job id, visible after `delay` seconds"""
+
+
+class MemoryJobQueue(JobQueue):
+    """Runs jobs as background tasks in this process (local testing)"""
+
+    def __init__(self):
+        self.handler: Optional[Callable[[str], Awaitable[None]]] = None
+        self._tasks = set()
+
+    async def send(self, job_id: str, delay: float = 0):
+        async def run():
+            if delay:
+                await asyncio.sleep(delay)
+            await self.handler(job_id)
+
+        task = asyncio.create_task(run())
+        # Keep a reference so the task isn't garbage collected mid-run
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+class StorageJobQueue(JobQueue):
+    """Azure Storage queue consumed by the RunJob queue trigger (production)"""
+
+    def __init__(self, connection_string: str, queue_name: str = JOB_QUEUE_NAME):
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+        # The queue trigger expects base64 message bodies
+        self._queue = QueueClient.from_connection_string(
+            connection_string, queue_name, message_encode_policy=TextBase64EncodePolicy()
+        )
+        try:
+            self._queue.create_queue()
+        except ResourceExistsError:
+            pass
+
+    async def send(self, job_id: str, delay: float = 0):
+        await asyncio.to_thread(self._queue.send_message, job_id, visibility_timeout=int(delay) or None)
+
+
+def _require_storage(settings):
+    if not settings.STORAGE_CONNECTION_STRING:
+        raise ValueError("AzureWebJobsStorage must be set for the storage job queue and table job store")
+
+
+def create_job_store(settings) -> JobStore:
+    if settings.JOB_STORE == "memory":
+        return MemoryJobStore()
+    if settings.JOB_STORE == "sqlite":
+        return SqliteJobStore(settings.JOB_SQLITE_PATH)
+    _require_storage(settings)
+    return TableJobStore(settings.STORAGE_CONNECTION_STRING, settings.JOB_TABLE_NAME)
+
+
+def create_job_queue(settings) -> JobQueue:
+    if settings.JOB_QUEUE == "memory":
+        return MemoryJobQueue()
+    _require_storage(settings)
+    return StorageJobQueue(settings.STORAGE_CONNECTION_STRING)
+
+
+# Runner
+
+class JobRunner:
+    """
+    Runs jobs in time slices. Progress is checkpointed after every unit of work; when a
+    slice runs out the job re-enqueues itself and the next invocation resumes from the
+    checkpoint, so no single invocation gets near functionTimeout.
+    """
+
+    def __init__(self, get_service: Callable[[Optional[str]], Any], store: JobStore, queue: JobQueue,
+                 slice_seconds: float, get_export_sink: Optional[Callable[[], ExportSink]] = None):
+        # Graph service for a job's tenant (None is the home tenant)
+        self.get_service = get_service
+        self.store = store
+        self.queue = queue
+        self.slice_seconds = slice_seconds
+        # Export files are only stored by exportDirectory jobs - the sink is created on first use
+        self._get_export_sink = get_export_sink
+        self._export_sink: Optional[ExportSink] = None
+        if isinstance(queue, MemoryJobQueue):
+            queue.handler = self.run
+
+    async def submit(self, job_type: str, params: Dict[str, Any],
+                     tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Create a job and enqueue it"""
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "tenantId": tenant_id,
+            "status": "queued",
+            "params": params,
+            "checkpoint": {},
+            "progress": {"processed": 0, "total": None},
+            "result": None,
+            "resultChunks": 0,
+            "error": None,
+            "createdAt": _now(),
+            "updatedAt": _now()
+        }
+        await self.store.create(job)
+        await self.queue.send(job["id"])
+        logger.info(f"Job {job['id']} ({job_type}) queued")
+        return job
+
+    async def _save(self, job: Dict[str, Any]):
+        job["updatedAt"] = _now()
+        await self.store.save(job)
+
+    async def run(self, job_id: str):
+        """Run (or resume) a job for one time slice"""
+        job = await self.store.get(job_id)
+        if not job:
+            logger.warning(f"Job {job_id} not found")
+            return
+        if job["status"] in ("succeeded", "failed"):
+            return
+
+        job["status"] = "running"
+        await self._save(job)
+        deadline = time.monotonic() + self.slice_seconds
+        step = getattr(self, f"_run_{job['type']}")
+
+        try:
+            service = self.get_service(job.get("tenantId"))
+            finished = await step(job, service, deadline)
+        except GraphThrottledError as e:
+            # Checkpoint is saved - pick up again once Graph lets us
+            logger.warning(f"Job {job_id} throttled, resuming in {e.retry_after:.0f}s")
+            job["status"] = "queued"
+            await self._save(job)
+            await self.queue.send(job_id, delay=max(1.0, e.retry_after))
+            return
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+            await self._save(job)
+            return
+
+        if finished:
+            job["status"] = "succeeded"
+            await self._save(job)
+            logger.info(f"Job {job_id} succeeded")
+        else:
+            job["status"] = "queued"
+            await self._save(job)
+            await self.queue.send(job_id)
+            logger.info(f"Job {job_id} paused at checkpoint, re-queued")
+
+    async def _append_results(self, job: Dict[str, Any], items: List[Any]):
+        for i in range(0, len(items), RESULT_CHUNK_SIZE):
+            await self.store.put_result_chunk(job["id"], job["resultChunks"], items[i:i + RESULT_CHUNK_SIZE])
+            job["resultChunks"] += 1
+
+    @staticmethod
+    def _tally(job: Dict[str, Any], results: List[Dict[str, Any]]):
+        """Add per-item statuses to the job's result summary"""
+        summary = job["result"] or {"counts": {}, "failures": []}
+        for result in results:
+            summary["counts"][result["status"]] = summary["counts"].get(result["status"], 0) + 1
+            if result["status"] == "failed" and len(summary["failures"]) < MAX_REPORTED_FAILURES:
+                summary["failures"].append(result)
+        job["result"] = summary
+
+    async def _run_listMembers(self, job: Dict[str, Any], service, deadline: float) -> bool:
+        group_id = job["params"]["groupId"]
+        cursor = job["checkpoint"].get("cursor")
+
+        while True:
+            members = []
+            next_cursor = None
+            async for chunk, chunk_cursor in service.iter_group_members(
+                group_id, MEMBER_PAGE_SIZE, cursor
+            ):
+                members.extend(chunk)
+                next_cursor = chunk_cursor
+
+            await self._append_results(job, [member._asdict() for member in members])
+            job["progress"]["processed"] += len(members)
+            job["checkpoint"] = {"cursor": next_cursor}
+            await self._save(job)
+
+            if not next_cursor:
+                job["result"] = {"groupId": group_id, "count": job["progress"]["processed"]}
+                return True
+            if time.monotonic() > deadline:
+                return False
+            cursor = next_cursor
+
+    async def _run_bulkAddMembers(self, job: Dict[str, Any], service, deadline: float) -> bool:
+        group_id = job["params"]["groupId"]
+        user_ids = list(dict.fromkeys(job["params"]["userIds"]))
+        offset = job["checkpoint"].get("offset", 0)
+        job["progress"]["total"] = len(user_ids)
+
+        while offset < len(user_ids):
+            batch = user_ids[offset:offset + BULK_ADD_SLICE]
+            results = await service.add_group_members_bulk(group_id, batch, raise_on_throttle=True)
+            self._tally(job, results)
+
+            offset += len(batch)
+            job["progress"]["processed"] = offset
+            job["checkpoint"] = {"offset": offset}
+            await self._save(job)
+
+            if offset < len(user_ids) and time.monotonic() > deadline:
+                return False
+        return True
+
+    async def _run_bulkCreateGroups(self, job: Dict[str, Any], service, deadline: float) -> bool:
+        specs = job["params"]["groups"]
+        offset = job["checkpoint"].get("offset", 0)
+        job["progress"]["total"] = len(specs)
+
+        while offset < len(specs):
+            batch = specs[offset:offset + BULK_CREATE_SLICE]
+            # provision_groups is idempotent, so replaying a slice after a crash is safe
+            results = await service.provision_groups(batch)
+            self._tally(job, results)
+            await self._append_results(job, results)
+
+            offset += len(batch)
+            job["progress"]["processed"] = offset
+            job["checkpoint"] = {"offset": offset}
+            await self._save(job)
+
+            if offset < len(specs) and time.monotonic() > deadline:
+                return False
+        return True
+
+    async def _run_syncMembers(self, job: Dict[str, Any], service, deadline: float) -> bool:
+        params = job["params"]
+        group_id = params["groupId"]
+
+        if not job["checkpoint"]:
+            # Diff once and checkpoint it: the add/remove ids go to result chunks (adds first)
+            # and the summary keeps counts; the slices below then work through the chunks
+            diff = await service.sync_group_members(group_id, params["memberIds"], dry_run=True)
+            to_add, to_remove = diff.pop("toAdd"), diff.pop("toRemove")
+            await self._append_results(
+                job,
+                [{"op": "add", "id": member_id} for member_id in to_add]
+                + [{"op": "remove", "id": member_id} for member_id in to_remove]
+            )
+            diff["dryRun"] = bool(params.get("dryRun", False))
+            if not diff["dryRun"]:
+                diff.update({"added": 0, "removed": 0, "failed": 0, "failures": []})
+            job["result"] = diff
+            job["progress"]["total"] = len(to_add) + len(to_remove)
+            job["checkpoint"] = {"offset": 0, "changes": len(to_add) + len(to_remove)}
+            await self._save(job)
+            if diff["dryRun"]:
+                return True
+
+        summary = job["result"]
+        checkpoint = job["checkpoint"]
+        while checkpoint["offset"] < checkpoint["changes"]:
+            # One result chunk per slice, adds first. Throttling propagates out of the service,
+            # so the runner resumes the chunk later instead of reporting it as failed
+            items = await self.store.get_result_chunk(job["id"], checkpoint["offset"] // RESULT_CHUNK_SIZE) or []
+            add_ids = [item["id"] for item in items if item["op"] == "add"]
+            remove_ids = [item["id"] for item in items if item["op"] == "remove"]
+
+            if add_ids and not checkpoint.get("chunkAdded"):
+                results = await service.add_group_members_bulk(group_id, add_ids, raise_on_throttle=True)
+                # Only real changes count - a replay finds earlier ones alreadyMember
+                summary["added"] += sum(1 for result in results if result["status"] == "added")
+                self._record_failures(summary, results)
+                # Saved, so a throttled removal half doesn't replay (and lose count of) the adds
+                checkpoint["chunkAdded"] = True
+                await self._save(job)
+            if remove_ids:
+                results = await service.remove_group_members(group_id, remove_ids, raise_on_throttle=True)
+                summary["removed"] += sum(1 for result in results if result["status"] == "removed")
+                self._record_failures(summary, results)
+
+            checkpoint["offset"] = min(checkpoint["changes"], checkpoint["offset"] + RESULT_CHUNK_SIZE)
+            checkpoint["chunkAdded"] = False
+            job["progress"]["processed"] = checkpoint["offset"]
+            await self._save(job)
+
+            if checkpoint["offset"] < checkpoint["changes"] and time.monotonic() > deadline:
+                return False
+        return True
+
+    @staticmethod
+    def _record_failures(summary: Dict[str, Any], results: List[Dict[str, Any]]):
+        failures = [result for result in results if result["status"] == "failed"]
+        summary["failed"] += len(failures)
+        summary["failures"].extend(failures[:max(0, MAX_REPORTED_FAILURES - len(summary["failures"]))])
+
+    # Directory export
+
+    def _export_store(self) -> ExportSink:
+        if self._export_sink is None:
+            if self._get_export_sink is None:
+                raise ValueError("Directory exports are not configured")
+            self._export_sink = self._get_export_sink()
+        return self._export_sink
+
+    async def _run_exportDirectory(self, job: Dict[str, Any], service, deadline: float) -> bool:
+        """
+        Stream the prefix's groups and memberships to part files. A full export pages through
+        the groups and fetches their members EXPORT_GROUP_SLICE groups at a time; an
+        incremental export follows the groups/delta link saved with the previous snapshot.
+        Buffered rows are written (and the position checkpointed) once a file kind reaches
+        EXPORT_PART_ROWS rows - checked after every group - and at the end of each slice, so
+        memory stays bounded by one part per file plus the member lists of one slice.
+        Each snapshot also stores the ids of the groups it covers as scope files, so the next
+        incremental export can tell which groups entered or left the prefix.
+        """
+        sink = self._export_store()
+        state = job["checkpoint"] or await self._start_export(job, service, sink)
+        change_column = ["change"] if state["incremental"] else []
+        writers = {
+            kind: PartWriter(sink, state["path"], kind, columns + change_column, state["format"], state["parts"][kind])
+            for kind, columns in (("groups", GROUP_COLUMNS), ("members", MEMBER_COLUMNS))
+        }
+        part_rows = service.settings.EXPORT_PART_ROWS
+        timer = time.monotonic()
+
+        def parts_full() -> bool:
+            return any(len(writer.rows) >= part_rows for writer in writers.values())
+
+        async def checkpoint(position: Dict[str, Any]):
+            nonlocal timer
+            state["peakBufferedRows"] = max(state["peakBufferedRows"], sum(len(w.rows) for w in writers.values()))
+            if not state["incremental"] and writers["groups"].rows:
+                await self._write_scope(sink, state, [row[0].lower() for row in writers["groups"].rows])
+            for writer in writers.values():
+                written = await writer.flush()
+                if written:
+                    state["files"].append(written)
+                    state["rows"][writer.kind] += written["rows"]
+            state["parts"] = {kind: writer.part for kind, writer in writers.items()}
+            state.update(position)
+            state["seconds"] += time.monotonic() - timer
+            timer = time.monotonic()
+            state["peakMemoryMb"] = max(state["peakMemoryMb"] or 0, peak_memory_mb() or 0) or None
+            job["checkpoint"] = state
+            job["progress"]["processed"] = state["rows"]["groups"] + state["rows"]["members"]
+            await self._save(job)
+
+        export = self._export_changes if state["incremental"] else self._export_snapshot
+        if not await export(state, service, writers, parts_full, checkpoint, deadline):
+            return False
+        await self._finish_export(job, state, sink)
+        return True
+
+    async def _start_export(self, job: Dict[str, Any], service, sink: ExportSink) -> Dict[str, Any]:
+        params = job["params"]
+        root = f"{service.settings.AZURE_TENANT_ID.lower()}/{params.get('name', DEFAULT_EXPORT_NAME)}"
+        snapshot_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        state = {
+            "root": root,
+            "path": f"{root}/{snapshot_id}",
+            "snapshotId": snapshot_id,
+            "prefix": params.get("prefix", EXPORT_PREFIX),
+            "format": params.get("format", "ndjson"),
+            "incremental": bool(params.get("incremental", False)),
+            "link": None,
+            "offset": 0,
+            "parts": {"groups": 0, "members": 0},
+            "rows": {"groups": 0, "members": 0},
+            "files": [],
+            "scopeParts": 0,
+            "seconds": 0.0,
+            "peakMemoryMb": None,
+            "peakBufferedRows": 0
+        }
+
+        if state["incremental"]:
+            data = await sink.read(f"{root}/{LATEST_MANIFEST}")
+            if data is None:
+                raise ValueError("No previous snapshot to export changes from - run a full export first")
+            base = json.loads(data)
+            if base["prefix"] != state["prefix"]:
+                raise ValueError(f"The previous snapshot covers prefix {base['prefix']}, not {state['prefix']}")
+            if "scopeParts" not in base:
+                raise ValueError("The previous snapshot has no scope files - run a full export first")
+            state["baseSnapshotId"] = base["snapshotId"]
+            state["baseScopeParts"] = base["scopeParts"]
+            # Group id -> whether it is in the prefix, for groups that entered or left it so far
+            state["scopeChanges"] = {}
+            state["link"] = base["deltaLink"]
+            state["deltaLink"] = None
+        else:
+            # Taken before listing, so changes made during the export show up in the next incremental one
+            state["deltaLink"] = await service.get_group_delta_link()
+
+        job["checkpoint"] = state
+        await self._save(job)
+        return state
+
+    async def _export_snapshot(self, state: Dict[str, Any], service, writers: Dict[str, PartWriter],
+                               parts_full: Callable[[], bool], checkpoint, deadline: float) -> bool:
+        link, offset = state["link"], state["offset"]
+        async for groups, next_link in service.iter_group_pages(state["prefix"], link):
+            for start in range(offset, len(groups), EXPORT_GROUP_SLICE):
+                batch = groups[start:start + EXPORT_GROUP_SLICE]
+                # Popped per group, so a group's member list is released once its rows are buffered
+                by_id = {
+                    result["groupId"]: result
+                    for result in await service.get_members_of_groups([group["id"] for group in batch], use_cache=False)
+                }
+                for index, group in enumerate(batch, start):
+                    result = by_id.pop(group["id"].lower())
+                    if "error" in result:
+                        if result["status"] == 404:
+                            # Deleted since it was listed
+                            continue
+                        if result["status"] == 503:
+                            raise GraphThrottledError(result["error"], retry_after=result["retryAfter"])
+                        raise Exception(f"Failed to export members of group {group['id']}: {result['error']}")
+                    writers["groups"].add([tuple(group[column] for column in GROUP_COLUMNS)])
+                    writers["members"].add([
+                        (group["id"], member.id, member.type, member.displayName, member.userPrincipalName)
+                        for member in result["members"]
+                    ])
+                    # A large group can fill a part on its own - write it before the next group
+                    if parts_full():
+                        await checkpoint({"link": link, "offset": index + 1})
+
+                if time.monotonic() > deadline:
+                    await checkpoint({"link": link, "offset": start + len(batch)})
+                    return False
+            link, offset = next_link, 0
+
+        await checkpoint({"link": None, "offset": 0})
+        return True
+
+    async def _export_changes(self, state: Dict[str, Any], service, writers: Dict[str, PartWriter],
+                              parts_full: Callable[[], bool], checkpoint, deadline: float) -> bool:
+        prefix = state["prefix"].casefold()
+        link = state["link"]
+        scope = await self._read_scope(
+            self._export_store(), f"{state['root']}/{state['baseSnapshotId']}", state["baseScopeParts"]
+        )
+        # Saved with the position only: a page replayed after a throttle must see the scope it started with
+        scope_changes = dict(state["scopeChanges"])
+        while True:
+            changes, next_link, delta_link = await service.get_group_delta_page(link)
+            # Membership-only changes come without the group's properties
+            unnamed = [change["id"] for change in changes if not change["removed"] and change["displayName"] is None]
+            names = await service.get_group_names(unnamed) if unnamed else {}
+
+            entered = []
+            for change in changes:
+                group_id = change["id"]
+                scope_key = group_id.lower()
+                in_scope = scope_changes.get(scope_key, scope_key in scope)
+                name = None
+                if not change["removed"]:
+                    name = change["displayName"] if change["displayName"] is not None else names.get(group_id)
+                if name is None or not name.casefold().startswith(prefix):
+                    if in_scope:
+                        # Deleted or renamed out of the prefix - deleted rows have no name,
+                        # consumers match them against the snapshot
+                        writers["groups"].add([(group_id, None, None, None, None, "deleted")])
+                        scope_changes[scope_key] = False
+                    continue
+                if not in_scope:
+                    # Created or renamed into the prefix: the consumer has none of its members yet
+                    entered.append((change, name))
+                    scope_changes[scope_key] = True
+                    continue
+                if change["displayName"] is not None:
+                    writers["groups"].add([(
+                        group_id, name, change["description"], change["mailEnabled"], change["securityEnabled"],
+                        "upsert"
+                    )])
+                writers["members"].add(
+                    [(group_id, member_id, member_type, None, None, "added")
+                     for member_id, member_type in change["membersAdded"]]
+                    + [(group_id, member_id, None, None, None, "removed") for member_id in change["membersRemoved"]]
+                )
+
+            if entered:
+                await self._export_entered_groups(entered, service, writers, scope_changes)
+
+            if not next_link:
+                state["deltaLink"] = delta_link
+                await checkpoint({"link": None, "scopeChanges": scope_changes})
+                return True
+            link = next_link
+            if parts_full() or time.monotonic() > deadline:
+                await checkpoint({"link": link, "scopeChanges": dict(scope_changes)})
+                if time.monotonic() > deadline:
+                    return False
+
+    async def _export_entered_groups(self, entered: List[Any], service, writers: Dict[str, PartWriter],
+                                     scope_changes: Dict[str, bool]):
+        """Write groups that entered the prefix as upserts with their full member lists"""
+        results = await service.get_members_of_groups([change["id"] for change, _ in entered], use_cache=False)
+        by_id = {result["groupId"]: result for result in results}
+        for change, name in entered:
+            group_id = change["id"]
+            result = by_id[group_id.lower()]
+            if "error" in result:
+                if result["status"] == 404:
+                    # Deleted since the change - it never reached the consumer
+                    scope_changes[group_id.lower()] = False
+                    continue
+                if result["status"] == 503:
+                    raise GraphThrottledError(result["error"], retry_after=result["retryAfter"])
+                raise Exception(f"Failed to export members of group {group_id}: {result['error']}")
+            writers["groups"].add([(
+                group_id, name, change["description"], change["mailEnabled"], change["securityEnabled"], "upsert"
+            )])
+            writers["members"].add([
+                (group_id, member.id, member.type, member.displayName, member.userPrincipalName, "added")
+                for member in result["members"]
+            ])
+
+    @staticmethod
+    async def _read_scope(sink: ExportSink, path: str, parts: int) -> Set[str]:
+        """The ids of the groups a snapshot covers"""
+        scope = set()
+        for part in range(parts):
+            data = await sink.read(f"{path}/scope-{part:05d}.json")
+            if data is None:
+                raise Exception(f"Scope file {part} of snapshot {path} is missing - run a full export")
+            scope.update(json.loads(data))
+        return scope
+
+    @staticmethod
+    async def _write_scope(sink: ExportSink, state: Dict[str, Any], group_ids: List[str]):
+        # Numbered like part files, so a scope file rewritten after resuming replaces the earlier one
+        await sink.write(f"{state['path']}/scope-{state['scopeParts']:05d}.json", json.dumps(group_ids).encode())
+        state["scopeParts"] += 1
+
+    async def _finish_export(self, job: Dict[str, Any], state: Dict[str, Any], sink: ExportSink):
+        """Write the snapshot manifest, point latest.json at it and summarize the run"""
+        if state["incremental"]:
+            # This snapshot's scope: the previous one plus the groups that entered, minus those that left
+            scope = await self._read_scope(
+                sink, f"{state['root']}/{state['baseSnapshotId']}", state["baseScopeParts"]
+            )
+            for group_id, in_scope in state["scopeChanges"].items():
+                if in_scope:
+                    scope.add(group_id)
+                else:
+                    scope.discard(group_id)
+            group_ids = sorted(scope)
+            for start in range(0, len(group_ids), SCOPE_FILE_IDS):
+                await self._write_scope(sink, state, group_ids[start:start + SCOPE_FILE_IDS])
+
+        change_column = ["change"] if state["incremental"] else []
+        manifest = {
+            "snapshotId": state["snapshotId"],
+            "baseSnapshotId": state.get("baseSnapshotId"),
+            "incremental": state["incremental"],
+            "prefix": state["prefix"],
+            "format": state["format"],
+            "columns": {"groups": GROUP_COLUMNS + change_column, "members": MEMBER_COLUMNS + change_column},
+            "rows": state["rows"],
+            "files": state["files"],
+            "scopeParts": state["scopeParts"],
+            "deltaLink": state["deltaLink"],
+            "createdAt": _now()
+        }
+        data = json.dumps(manifest, indent=2).encode()
+        await sink.write(f"{state['path']}/manifest.json", data)
+        await sink.write(f"{state['root']}/{LATEST_MANIFEST}", data)
+
+        await self._append_results(job, state["files"])
+        rows = state["rows"]["groups"] + state["rows"]["members"]
+        job["result"] = {
+            "snapshotId": state["snapshotId"],
+            "baseSnapshotId": state.get("baseSnapshotId"),
+            "incremental": state["incremental"],
+            "format": state["format"],
+            "location": sink.location(state["path"]),
+            "rows": state["rows"],
+            "files": len(state["files"]),
+            "bytes": sum(written["bytes"] for written in state["files"]),
+            "seconds": round(state["seconds"], 2),
+            "rowsPerSecond": round(rows / state["seconds"], 1) if state["seconds"] else None,
+            "peakMemoryMb": state["peakMemoryMb"],
+            "peakBufferedRows": state["peakBufferedRows"]
+        }
+        logger.info(f"Export {state['snapshotId']} finished: {job['result']}")
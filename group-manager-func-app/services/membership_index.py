@@ -0,0 +1,87 @@
+"""
+Membership Index
+In-memory inverted index (member -> groups) built from member listings already fetched
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class MembershipIndex:
+    """
+    Tracks group -> members and member -> groups for every group whose full
+    member list has been loaded by this worker.
+    """
+
+    def __init__(self):
+        self._group_members: Dict[str, Set[str]] = {}
+        self._member_groups: Dict[str, Set[str]] = {}
+        self._groups: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def indexed_group_count(self) -> int:
+        return len(self._group_members)
+
+    def record_groups(self, groups: Iterable[Dict[str, Any]]):
+        """Remember group details (from search results) for index answers"""
+        for group in groups:
+            self._groups[group["id"].lower()] = group
+
+    def record_group_members(self, group_id: str, member_ids: Iterable[str]):
+        """Replace the indexed member set of a group with a complete listing"""
+        group_id = group_id.lower()
+        new_members = {member_id.lower() for member_id in member_ids}
+        old_members = self._group_members.get(group_id, set())
+
+        for member_id in old_members - new_members:
+            groups = self._member_groups.get(member_id)
+            if groups is not None:
+                groups.discard(group_id)
+                if not groups:
+                    del self._member_groups[member_id]
+        for member_id in new_members - old_members:
+            self._member_groups.setdefault(member_id, set()).add(group_id)
+
+        self._group_members[group_id] = new_members
+
+    def add_member(self, group_id: str, member_id: str):
+        """Record a single membership added through this worker"""
+        group_id = group_id.lower()
+        member_id = member_id.lower()
+        # Only indexed groups have a complete member set worth updating
+        if group_id in self._group_members:
+            self._group_members[group_id].add(member_id)
+            self._member_groups.setdefault(member_id, set()).add(group_id)
+
+    def remove_members(self, group_id: str, member_ids: Iterable[str]):
+        """Record memberships removed through this worker"""
+        group_id = group_id.lower()
+        members = self._group_members.get(group_id)
+        for member_id in member_ids:
+            member_id = member_id.lower()
+            if members is not None:
+                members.discard(member_id)
+            groups = self._member_groups.get(member_id)
+            if groups is not None:
+                groups.discard(group_id)
+                if not groups:
+                    del self._member_groups[member_id]
+
+    def remove_group(self, group_id: str):
+        """Forget a deleted group"""
+        group_id = group_id.lower()
+        self.remove_members(group_id, list(self._group_members.pop(group_id, ())))
+        self._groups.pop(group_id, None)
+
+    def get_member_groups(self, member_id: str, prefix: str = "") -> List[Dict[str, Any]]:
+        """Indexed groups the member directly belongs to, optionally filtered by displayName prefix"""
+        prefix = prefix.casefold()
+        groups = []
+        for group_id in sorted(self._member_groups.get(member_id.lower(), ())):
+            group = self._groups.get(group_id, {"id": group_id, "displayName": None})
+            display_name = group.get("displayName") or ""
+            if prefix and not display_name.casefold().startswith(prefix):
+                continue
+            groups.append(group)
+        return groups
@@ -0,0 +1,286 @@
+"""
+Directory Mirror
+Local SQLite copy of groups, users and memberships kept in sync with Graph delta queries
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from services.serialization import MemberRecord
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Mirrored tables, by name. A full resync fills `<name>_resync` copies and swaps them in.
+TABLES = {
+    "groups": """
+CREATE TABLE IF NOT EXISTS {table} (
+    id TEXT PRIMARY KEY,
+    display_name TEXT COLLATE NOCASE,
+    description TEXT,
+    mail_enabled INTEGER,
+    security_enabled INTEGER
+);""",
+    "users": """
+CREATE TABLE IF NOT EXISTS {table} (
+    id TEXT PRIMARY KEY,
+    display_name TEXT,
+    user_principal_name TEXT
+);""",
+    "members": """
+CREATE TABLE IF NOT EXISTS {table} (
+    group_id TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    member_type TEXT,
+    PRIMARY KEY (group_id, member_id)
+) WITHOUT ROWID;"""
+}
+
+INDEXES = {
+    "groups": "CREATE INDEX IF NOT EXISTS ix_groups_display_name ON groups (display_name COLLATE NOCASE);",
+    "users": "",
+    "members": "CREATE INDEX IF NOT EXISTS ix_members_member_id ON members (member_id);"
+}
+
+# Tables filled by each delta query (groups/delta also carries the memberships)
+RESOURCE_TABLES = {"users": ["users"], "groups": ["groups", "members"]}
+
+SCHEMA = "".join(TABLES[table].format(table=table) + "\n" + INDEXES[table] for table in TABLES) + """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _odata_type_name(odata_type: Optional[str]) -> str:
+    """'#microsoft.graph.user' -> 'user'"""
+    return odata_type.split('.')[-1] if odata_type else "Unknown"
+
+
+def _escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class DirectoryMirror:
+    """
+    SQLite store for the mirrored directory. The public methods are coroutines that run the
+    SQLite work on a worker thread, one call at a time, so a large delta page or member
+    listing doesn't block the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        # The connection is shared by the worker threads - one statement batch at a time
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    async def _run(self, call: Callable[..., T], *args: Any) -> T:
+        def locked() -> T:
+            with self._lock:
+                return call(*args)
+
+        return await asyncio.to_thread(locked)
+
+    # State
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: Optional[str]):
+        self._conn.execute(
+            "INSERT INTO state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+        self._conn.commit()
+
+    async def get_delta_link(self, resource: str) -> Optional[str]:
+        return await self._run(self._get_state, f"deltaLink:{resource}")
+
+    async def set_delta_link(self, resource: str, delta_link: str):
+        await self._run(self._set_state, f"deltaLink:{resource}", delta_link)
+
+    async def get_last_synced(self) -> float:
+        """Unix time of the last completed sync (0 if never synced or marked stale)"""
+        return float(await self._run(self._get_state, "lastSynced") or 0)
+
+    async def mark_synced(self):
+        await self._run(self._set_state, "lastSynced", str(time.time()))
+
+    async def mark_stale(self):
+        """Force the next read to sync first (e.g. after a write through this worker)"""
+        await self._run(self._set_state, "lastSynced", "0")
+
+    # Full resync (the deltaLink expired): rebuild into copies, so objects deleted meanwhile
+    # disappear, while reads keep using the current tables until the copies are complete
+
+    async def begin_resync(self, resource: str):
+        """Start (or restart) an empty copy of the resource's tables"""
+        await self._run(self._begin_resync, resource)
+
+    def _begin_resync(self, resource: str):
+        with self._conn:
+            for table in RESOURCE_TABLES[resource]:
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}_resync")
+                self._conn.execute(TABLES[table].format(table=f"{table}_resync"))
+
+    async def finish_resync(self, resource: str, delta_link: Optional[str]):
+        """Swap the rebuilt copies in for the resource's tables (and store the new deltaLink)"""
+        await self._run(self._finish_resync, resource, delta_link)
+
+    def _finish_resync(self, resource: str, delta_link: Optional[str]):
+        with self._conn:
+            # sqlite3 doesn't open a transaction for DDL by itself - make the swap atomic
+            self._conn.execute("BEGIN")
+            for table in RESOURCE_TABLES[resource]:
+                self._conn.execute(f"DROP TABLE {table}")
+                self._conn.execute(f"ALTER TABLE {table}_resync RENAME TO {table}")
+                if INDEXES[table]:
+                    self._conn.execute(INDEXES[table])
+            if delta_link:
+                self._conn.execute(
+                    "INSERT INTO state (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (f"deltaLink:{resource}", delta_link)
+                )
+
+    # Applying delta pages
+
+    async def apply_user_changes(self, users: Iterable[Any], resync: bool = False):
+        """Apply one page of users/delta results (`resync`: into the copy being rebuilt)"""
+        await self._run(self._apply_user_changes, users, resync)
+
+    def _apply_user_changes(self, users: Iterable[Any], resync: bool):
+        users_table = "users_resync" if resync else "users"
+        removed, upserts = [], []
+        for user in users:
+            if "@removed" in (user.additional_data or {}):
+                removed.append((user.id,))
+            else:
+                upserts.append((user.id, user.display_name, user.user_principal_name))
+
+        with self._conn:
+            # Memberships live with the groups, so a deleted user leaves the current members table
+            self._conn.executemany("DELETE FROM members WHERE member_id = ?", removed)
+            self._conn.executemany(f"DELETE FROM {users_table} WHERE id = ?", removed)
+            self._conn.executemany(
+                f"INSERT INTO {users_table} (id, display_name, user_principal_name) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "display_name = COALESCE(excluded.display_name, display_name), "
+                "user_principal_name = COALESCE(excluded.user_principal_name, user_principal_name)",
+                upserts
+            )
+
+    async def apply_group_changes(self, groups: Iterable[Any], resync: bool = False):
+        """Apply one page of groups/delta results, including members@delta (`resync`: into the copies)"""
+        await self._run(self._apply_group_changes, groups, resync)
+
+    def _apply_group_changes(self, groups: Iterable[Any], resync: bool):
+        groups_table, members_table = ("groups_resync", "members_resync") if resync else ("groups", "members")
+        removed, upserts, member_adds, member_removes = [], [], [], []
+        for group in groups:
+            additional_data = group.additional_data or {}
+            if "@removed" in additional_data:
+                removed.append((group.id,))
+                continue
+
+            upserts.append((
+                group.id,
+                group.display_name,
+                group.description,
+                group.mail_enabled,
+                group.security_enabled
+            ))
+            for member in additional_data.get("members@delta") or []:
+                if "@removed" in member:
+                    member_removes.append((group.id, member.get("id")))
+                else:
+                    member_adds.append((group.id, member.get("id"), _odata_type_name(member.get("@odata.type"))))
+
+        with self._conn:
+            self._conn.executemany(f"DELETE FROM {members_table} WHERE group_id = ?", removed)
+            # A deleted group also leaves the groups it was nested in
+            self._conn.executemany(f"DELETE FROM {members_table} WHERE member_id = ?", removed)
+            self._conn.executemany(f"DELETE FROM {groups_table} WHERE id = ?", removed)
+            self._conn.executemany(
+                f"INSERT INTO {groups_table} (id, display_name, description, mail_enabled, security_enabled) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "display_name = COALESCE(excluded.display_name, display_name), "
+                "description = COALESCE(excluded.description, description), "
+                "mail_enabled = COALESCE(excluded.mail_enabled, mail_enabled), "
+                "security_enabled = COALESCE(excluded.security_enabled, security_enabled)",
+                upserts
+            )
+            self._conn.executemany(f"DELETE FROM {members_table} WHERE group_id = ? AND member_id = ?", member_removes)
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {members_table} (group_id, member_id, member_type) VALUES (?, ?, ?)",
+                member_adds
+            )
+
+    # Reads
+
+    async def search_groups(self, search_term: str = "", top: int = 100) -> List[Dict[str, Any]]:
+        """Groups whose displayName starts with search_term (case-insensitive)"""
+        return await self._run(self._search_groups, search_term, top)
+
+    def _search_groups(self, search_term: str, top: int) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT id, display_name, description, mail_enabled, security_enabled FROM groups "
+            "WHERE display_name LIKE ? ESCAPE '\\' ORDER BY display_name LIMIT ?",
+            (_escape_like(search_term) + '%', top)
+        ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "displayName": row[1],
+                "description": row[2] if row[2] else "",
+                "mailEnabled": bool(row[3]) if row[3] is not None else None,
+                "securityEnabled": bool(row[4]) if row[4] is not None else None
+            }
+            for row in rows
+        ]
+
+    async def get_group_members(self, group_id: str, max_items: Optional[int] = None) -> List[MemberRecord]:
+        """Direct members of a group"""
+        return await self._run(self._get_group_members, group_id, max_items)
+
+    def _get_group_members(self, group_id: str, max_items: Optional[int]) -> List[MemberRecord]:
+        rows = self._conn.execute(
+            "SELECT m.member_id, m.member_type, COALESCE(u.display_name, g.display_name), "
+            "u.user_principal_name FROM members m "
+            "LEFT JOIN users u ON u.id = m.member_id "
+            "LEFT JOIN groups g ON g.id = m.member_id "
+            "WHERE m.group_id = ? LIMIT ?",
+            (group_id, max_items if max_items is not None else -1)
+        ).fetchall()
+
+        return [
+            MemberRecord(member_id, display_name, member_type, user_principal_name)
+            for member_id, member_type, display_name, user_principal_name in rows
+        ]
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Row counts and sync time"""
+        return await self._run(self._get_stats)
+
+    def _get_stats(self) -> Dict[str, Any]:
+        counts = {
+            table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("groups", "users", "members")
+        }
+        counts["lastSynced"] = float(self._get_state("lastSynced") or 0)
+        return counts
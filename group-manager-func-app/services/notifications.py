@@ -0,0 +1,189 @@
+"""
+Graph Change Notifications
+Parsing, clientState checks and coalescing of Graph change notifications for groups, so
+caches and the mirror are invalidated on push instead of by polling
+"""
+import asyncio
+import hmac
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Graph subscription for group property and membership changes
+SUBSCRIPTION_RESOURCE = "groups"
+SUBSCRIPTION_CHANGE_TYPES = "created,updated,deleted"
+
+# Graph allows group subscriptions of up to 41,760 minutes (29 days)
+MAX_SUBSCRIPTION_HOURS = 696
+
+
+class GroupChange:
+    """Everything that happened to one group within a coalescing window"""
+
+    def __init__(self, group_id: str):
+        self.group_id = group_id
+        self.created = False
+        self.deleted = False
+        # Property change (possibly a rename) - any cached search may be affected
+        self.properties_changed = False
+        self.members_added: Set[str] = set()
+        self.members_removed: Set[str] = set()
+
+    @property
+    def membership_changed(self) -> bool:
+        return bool(self.members_added or self.members_removed)
+
+    def merge(self, other: "GroupChange"):
+        self.created = self.created or other.created
+        self.deleted = self.deleted or other.deleted
+        self.properties_changed = self.properties_changed or other.properties_changed
+        for member_id in other.members_added:
+            self.members_removed.discard(member_id)
+            self.members_added.add(member_id)
+        for member_id in other.members_removed:
+            self.members_added.discard(member_id)
+            self.members_removed.add(member_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "groupId": self.group_id,
+            "created": self.created,
+            "deleted": self.deleted,
+            "propertiesChanged": self.properties_changed,
+            "membersAdded": sorted(self.members_added),
+            "membersRemoved": sorted(self.members_removed)
+        }
+
+
+def _group_change(notification: Dict[str, Any]) -> Optional[GroupChange]:
+    """Map one notification to a GroupChange (None if it is not about a group)"""
+    resource_data = notification.get("resourceData") or {}
+    group_id = resource_data.get("id")
+    if not group_id:
+        resource = notification.get("resource") or ""
+        if resource.lower().startswith("groups/"):
+            group_id = resource.split("/", 1)[1]
+    if not group_id:
+        return None
+
+    change = GroupChange(group_id.lower())
+    change_type = notification.get("changeType")
+    if change_type == "created":
+        change.created = True
+    elif change_type == "deleted":
+        change.deleted = True
+
+    # Membership changes carry the affected members; anything else is a property change
+    member_delta = resource_data.get("members@delta")
+    if member_delta:
+        for member in member_delta:
+            if not member.get("id"):
+                continue
+            if "@removed" in member:
+                change.members_removed.add(member["id"].lower())
+            else:
+                change.members_added.add(member["id"].lower())
+    elif change_type == "updated":
+        change.properties_changed = True
+    return change
+
+
+def parse_notifications(body: Any, client_state: str) -> Tuple[List[Tuple[Optional[str], GroupChange]], int]:
+    """
+    Parse a notification POST body into (tenantId, change) pairs
+
+    Notifications whose clientState does not match are dropped and counted as rejected.
+    Returns:
+        Tuple of (accepted changes, rejected count)
+    """
+    if not isinstance(body, dict) or not isinstance(body.get("value"), list):
+        raise ValueError("Notification body must be an object with a 'value' array")
+
+    changes = []
+    rejected = 0
+    for notification in body["value"]:
+        if not isinstance(notification, dict):
+            rejected += 1
+            continue
+        received_state = notification.get("clientState") or ""
+        if not client_state or not hmac.compare_digest(received_state.encode(), client_state.encode()):
+            rejected += 1
+            continue
+        change = _group_change(notification)
+        if change is not None:
+            changes.append((notification.get("tenantId"), change))
+    return changes, rejected
+
+
+def record_payload(path: str, body: Any):
+    """Append a notification body to a JSON Lines file (replay with benchmarks/replay_notifications.py)"""
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(body) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not record notification payload: {str(e)}")
+
+
+class ChangeCoalescer:
+    """
+    Collects changes for `window` seconds and applies them once per group: a burst of
+    notifications for the same group (e.g. a bulk add) becomes a single invalidation.
+    """
+
+    def __init__(self, apply: Callable[[Optional[str], List[GroupChange]], Awaitable[Any]], window: float):
+        self._apply = apply
+        self.window = window
+        self._pending: Dict[Tuple[Optional[str], str], GroupChange] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.received_count = 0
+        self.coalesced_count = 0
+        self.applied_count = 0
+        self.failed_count = 0
+
+    def add(self, changes: List[Tuple[Optional[str], GroupChange]]):
+        """Queue changes; the first one starts the window"""
+        for tenant_id, change in changes:
+            self.received_count += 1
+            key = (tenant_id.lower() if tenant_id else None, change.group_id)
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = change
+            else:
+                pending.merge(change)
+                self.coalesced_count += 1
+
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Changes that arrive while a flush is applying wait for the next window
+        while self._pending:
+            await asyncio.sleep(self.window)
+            await self.flush()
+
+    async def flush(self):
+        """Apply everything pending now, one call per tenant"""
+        pending, self._pending = self._pending, {}
+        by_tenant: Dict[Optional[str], List[GroupChange]] = {}
+        for (tenant_id, _), change in pending.items():
+            by_tenant.setdefault(tenant_id, []).append(change)
+
+        for tenant_id, changes in by_tenant.items():
+            try:
+                await self._apply(tenant_id, changes)
+                self.applied_count += len(changes)
+            except Exception as e:
+                self.failed_count += len(changes)
+                logger.error(f"Applying {len(changes)} group changes for tenant {tenant_id} failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received_count,
+            "coalesced": self.coalesced_count,
+            "applied": self.applied_count,
+            "failed": self.failed_count,
+            "pending": len(self._pending),
+            "windowSeconds": self.window
+        }
@@ -0,0 +1,116 @@
+"""
+Pre-warm
+Tracks which searches and member lists are requested most, so the PrewarmHotData timer can
+reload them before they expire, and measures the latency that saves users
+"""
+import json
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+# Timer schedule (NCRONTAB) unless PREWARM_SCHEDULE is set
+DEFAULT_PREWARM_SCHEDULE = "0 */5 * * * *"
+
+# Most keys tracked per tenant; the least requested tenth is dropped when full
+MAX_TRACKED_KEYS = 2000
+
+# The timer runs on one instance, so with a shared cache every worker publishes its hottest
+# keys (at most HOT_PUBLISH_KEYS per kind) every HOT_PUBLISH_SECONDS for it to add in
+HOT_PUBLISH_SECONDS = 60
+HOT_PUBLISH_KEYS = 200
+
+
+class AccessTracker:
+    """
+    Exponentially decayed request counts per cache key. A request counts 1 now and half
+    that after `half_life` seconds, so the hot set follows the traffic of the last hours.
+
+    Each key keeps the arguments needed to reload it. Keys the timer pre-warmed remember what
+    the reload cost; the first request served from cache after the old entry would have had
+    to be reloaded counts that cost as latency saved.
+    """
+
+    def __init__(self, half_life: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        # key -> [score, scored_at, args]
+        self._entries: Dict[Hashable, List[Any]] = {}
+        # key -> (load ms paid by the pre-warm, monotonic time the replaced entry went stale)
+        self._prewarmed: Dict[Hashable, Tuple[float, float]] = {}
+
+        self.warm_hits = 0
+        self.latency_saved_ms = 0.0
+
+    def _score(self, entry: List[Any], now: float) -> float:
+        return entry[0] * 0.5 ** ((now - entry[1]) / self.half_life)
+
+    def record(self, key: Hashable, args: Tuple, warm: bool):
+        """Count one request for a key (`warm`: it was answered from cache, without a load)"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_keys:
+                self._prune(now)
+            self._entries[key] = [1.0, now, args]
+        else:
+            entry[0] = self._score(entry, now) + 1
+            entry[1] = now
+
+        prewarmed = self._prewarmed.get(key)
+        if prewarmed is None:
+            return
+        load_ms, stale_at = prewarmed
+        if not warm:
+            # The pre-warmed entry is gone (invalidated or evicted)
+            del self._prewarmed[key]
+        elif now >= stale_at:
+            # Without the pre-warm this request would have waited for the load
+            del self._prewarmed[key]
+            self.warm_hits += 1
+            self.latency_saved_ms += load_ms
+
+    def _prune(self, now: float):
+        by_score = sorted(self._entries, key=lambda key: self._score(self._entries[key], now))
+        for key in by_score[:max(1, len(by_score) // 10)]:
+            del self._entries[key]
+            self._prewarmed.pop(key, None)
+
+    def scores(self, kind: str, count: int) -> List[Tuple[Tuple, float]]:
+        """The `count` most requested keys of a kind as (arguments, current score), hottest first"""
+        now = time.monotonic()
+        scored = [(entry[2], self._score(entry, now)) for key, entry in self._entries.items() if key[0] == kind]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:count]
+
+    def mark_prewarmed(self, key: Hashable, load_ms: float, stale_at: Optional[float]):
+        """
+        Remember a pre-warm reload. `stale_at` is when the entry it replaced would have needed
+        a reload (None: nothing was cached, so the next warm request benefits)
+        """
+        stale_at = stale_at if stale_at is not None else 0.0
+        if key not in self._prewarmed and len(self._prewarmed) >= self.max_keys:
+            # Drop the keys pre-warmed for other workers' users and never requested here
+            for untracked in [key for key in self._prewarmed if key not in self._entries]:
+                del self._prewarmed[untracked]
+        previous = self._prewarmed.get(key)
+        if previous is not None:
+            # Not requested since the last pre-warm - without either, it went stale earlier
+            stale_at = min(stale_at, previous[1])
+        self._prewarmed[key] = (load_ms, stale_at)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "trackedKeys": len(self._entries),
+            "pendingPrewarmed": len(self._prewarmed),
+            "warmHits": self.warm_hits,
+            "latencySavedMs": round(self.latency_saved_ms, 1)
+        }
+
+
+def rank_hot(scored: Iterable[Tuple[Sequence, float]], count: int) -> List[Tuple]:
+    """Add up the scores of the same arguments (counted by several workers), hottest `count` first"""
+    totals: Dict[str, List[Any]] = {}
+    for args, score in scored:
+        entry = totals.setdefault(json.dumps(list(args)), [tuple(args), 0.0])
+        entry[1] += score
+    ranked = sorted(totals.values(), key=lambda entry: entry[1], reverse=True)
+    return [args for args, _ in ranked[:count]]
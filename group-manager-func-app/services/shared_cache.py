@@ -0,0 +1,430 @@
+"""
+Shared Cache
+Second-level cache shared by every worker (Redis-compatible, or an in-process fake for local
+testing), so scaled-out instances don't each load the same listings from Graph
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from services.serialization import MemberRecord, dumps
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - only needed when L2_CACHE_URL points at Redis
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored layout of any value changes - old entries are then simply never read
+SCHEMA_VERSION = 2
+
+# Cache kinds whose values are member records (stored as arrays)
+RECORD_KINDS = ("members", "transitiveMembers")
+
+# Entries are refreshed by one worker once this fraction of their TTL has passed,
+# while the others keep serving the current value
+EARLY_REFRESH_FRACTION = 0.8
+
+# How often a worker waiting for another worker's load checks for the value
+LOCK_POLL_SECONDS = 0.05
+
+# Per-key versions outlive the entry they guard by this many TTLs, so a load still running
+# when its key was invalidated can't find the version gone (back at 0) when it stores
+VERSION_TTL_FACTOR = 2
+
+_RAW = b"j"
+_COMPRESSED = b"z"
+
+
+class MemoryBackend:
+    """In-process stand-in for Redis (memory://) - shared by every service in the worker"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, Any]] = {}
+
+    def _get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] and entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[1]
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        return [self._get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def set_if_absent(self, key: str, value: bytes, ttl: float) -> bool:
+        if self._get(key) is not None:
+            return False
+        self._data[key] = (time.monotonic() + ttl, value)
+        return True
+
+    async def delete(self, keys: Sequence[str]):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        value = int(self._get(key) or 0) + 1
+        self._data[key] = (time.monotonic() + ttl if ttl else 0.0, str(value).encode())
+        return value
+
+    async def hash_set(self, key: str, field: str, value: bytes, ttl: float):
+        fields = dict(self._get(key) or {})
+        fields[field] = value
+        self._data[key] = (time.monotonic() + ttl, fields)
+
+    async def hash_get_all(self, key: str) -> Dict[str, bytes]:
+        return dict(self._get(key) or {})
+
+    async def hash_delete(self, key: str, fields: Sequence[str]):
+        for field in fields:
+            (self._get(key) or {}).pop(field, None)
+
+
+class RedisBackend:
+    """Redis (or any Redis-protocol service, e.g. Azure Cache for Redis)"""
+
+    def __init__(self, url: str, timeout: float):
+        if redis_asyncio is None:
+            raise ValueError("L2_CACHE_URL points at Redis but the redis package is not installed")
+        self._client = redis_asyncio.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        return await self._client.mget(keys)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._client.set(key, value, px=int(ttl * 1000))
+
+    async def set_if_absent(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(await self._client.set(key, value, px=int(ttl * 1000), nx=True))
+
+    async def delete(self, keys: Sequence[str]):
+        await self._client.delete(*keys)
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        if not ttl:
+            return await self._client.incr(key)
+        async with self._client.pipeline(transaction=True) as pipeline:
+            pipeline.incr(key)
+            pipeline.pexpire(key, int(ttl * 1000))
+            value, _ = await pipeline.execute()
+        return value
+
+    async def hash_set(self, key: str, field: str, value: bytes, ttl: float):
+        async with self._client.pipeline(transaction=True) as pipeline:
+            pipeline.hset(key, field, value)
+            pipeline.pexpire(key, int(ttl * 1000))
+            await pipeline.execute()
+
+    async def hash_get_all(self, key: str) -> Dict[str, bytes]:
+        return {field.decode(): value for field, value in (await self._client.hgetall(key)).items()}
+
+    async def hash_delete(self, key: str, fields: Sequence[str]):
+        await self._client.hdel(key, *fields)
+
+
+class SharedCacheUnavailable(Exception):
+    """The shared cache backend failed; callers fall back to loading directly"""
+
+
+class SharedCache:
+    """
+    One tenant's view of the shared cache.
+
+    - Keys are `<prefix>:v<SCHEMA_VERSION>:<tenant>:<kind>:<hash of the rest of the key>`
+    - Every value carries the generation of its kind and the version of its key; invalidating
+      a whole kind (e.g. all searches) bumps the generation, invalidating one key bumps its
+      version. Both are read together with the value in one MGET, so a load that started
+      before an invalidation and stores after it is never served
+    - Concurrent misses across workers: one takes a short lock and loads, the others wait
+      for its value (and load themselves if it doesn't show up in time)
+    - Past EARLY_REFRESH_FRACTION of the TTL one worker reloads while the others serve the
+      current value, so hot entries never expire under load
+    - Values over `compress_bytes` are zlib-compressed
+    - Any backend error skips the cache for `retry_seconds` and loads straight from Graph
+    """
+
+    def __init__(self, backend, tenant_id: str, ttl: float, compress_bytes: int, lock_seconds: float,
+                 retry_seconds: float, prefix: str = "group-manager"):
+        self._backend = backend
+        self._namespace = f"{prefix}:v{SCHEMA_VERSION}:{tenant_id.lower()}"
+        self.ttl = ttl
+        self.compress_bytes = compress_bytes
+        self.lock_seconds = lock_seconds
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.early_refreshes = 0
+        self.lock_waits = 0
+        self.errors = 0
+
+    # Keys and values
+
+    def _key(self, key: Tuple[Hashable, ...]) -> str:
+        digest = hashlib.sha1(json.dumps(key[1:], default=list).encode()).hexdigest()
+        return f"{self._namespace}:{key[0]}:{digest}"
+
+    def _generation_key(self, kind: str) -> str:
+        return f"{self._namespace}:{kind}:generation"
+
+    @staticmethod
+    def _version_key(cache_key: str) -> str:
+        return f"{cache_key}:version"
+
+    def _hot_key(self) -> str:
+        return f"{self._namespace}:hot"
+
+    def _encode(self, kind: str, value: Any, stamp: Tuple[int, int]) -> bytes:
+        if kind in RECORD_KINDS:
+            value = [list(record) for record in value]
+        body = dumps({
+            "generation": stamp[0],
+            "version": stamp[1],
+            "refreshAt": time.time() + self.ttl * EARLY_REFRESH_FRACTION,
+            "value": value
+        }).encode()
+        if len(body) > self.compress_bytes:
+            return _COMPRESSED + zlib.compress(body, 6)
+        return _RAW + body
+
+    @staticmethod
+    def _decode(kind: str, raw: bytes) -> Dict[str, Any]:
+        body = zlib.decompress(raw[1:]) if raw[:1] == _COMPRESSED else raw[1:]
+        envelope = json.loads(body)
+        if kind in RECORD_KINDS:
+            envelope["value"] = [MemberRecord(*row) for row in envelope["value"]]
+        return envelope
+
+    # Backend calls (errors switch the cache off for a while)
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    async def _call(self, operation: Awaitable[Any]) -> Any:
+        try:
+            return await operation
+        except Exception as e:
+            self.errors += 1
+            if self.available:
+                logger.warning(f"Shared cache unavailable, bypassing it for {self.retry_seconds:.0f}s: {str(e)}")
+            self._down_until = time.monotonic() + self.retry_seconds
+            raise SharedCacheUnavailable(str(e))
+
+    async def _read(self, kind: str, cache_key: str) -> Tuple[Optional[Dict[str, Any]], Tuple[int, int]]:
+        """The entry (None on a miss) and the (generation, version) a value loaded now is stored with"""
+        raw, generation, version = await self._call(
+            self._backend.get_many([cache_key, self._generation_key(kind), self._version_key(cache_key)])
+        )
+        stamp = (int(generation or 0), int(version or 0))
+        if raw is None:
+            return None, stamp
+        try:
+            envelope = self._decode(kind, raw)
+        except Exception as e:
+            # Unreadable entry (e.g. written by an incompatible version) - treat as a miss
+            logger.warning(f"Ignoring unreadable shared cache entry {cache_key}: {str(e)}")
+            return None, stamp
+        if (envelope["generation"], envelope["version"]) != stamp:
+            return None, stamp
+        return envelope, stamp
+
+    async def _load_and_store(self, kind: str, cache_key: str, lock_key: str, stamp: Tuple[int, int],
+                              loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            try:
+                await self._call(self._backend.set(cache_key, self._encode(kind, value, stamp), self.ttl))
+            except SharedCacheUnavailable:
+                pass
+            return value
+        finally:
+            if self.available:
+                try:
+                    await self._call(self._backend.delete([lock_key]))
+                except SharedCacheUnavailable:
+                    pass
+
+    # Public API
+
+    async def get_or_load(self, key: Tuple[Hashable, ...], loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Get a value from the shared cache, or load it (once across workers) and store it"""
+        if not self.available:
+            return await loader()
+
+        kind = key[0]
+        cache_key = self._key(key)
+        lock_key = f"{cache_key}:lock"
+        try:
+            envelope, stamp = await self._read(kind, cache_key)
+            if envelope is not None:
+                self.hits += 1
+                if time.time() < envelope["refreshAt"]:
+                    return envelope["value"]
+                if not await self._call(self._backend.set_if_absent(lock_key, b"1", self.lock_seconds)):
+                    # Someone else is refreshing - the current value is still valid
+                    return envelope["value"]
+                self.early_refreshes += 1
+                return await self._load_and_store(kind, cache_key, lock_key, stamp, loader)
+
+            self.misses += 1
+            deadline = time.monotonic() + self.lock_seconds
+            while not await self._call(self._backend.set_if_absent(lock_key, b"1", self.lock_seconds)):
+                # Another worker is loading this key - wait for its value
+                self.lock_waits += 1
+                if time.monotonic() > deadline:
+                    return await loader()
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+                envelope, stamp = await self._read(kind, cache_key)
+                if envelope is not None:
+                    return envelope["value"]
+        except SharedCacheUnavailable:
+            return await loader()
+
+        return await self._load_and_store(kind, cache_key, lock_key, stamp, loader)
+
+    async def refresh(self, key: Tuple[Hashable, ...],
+                      loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[float]]:
+        """
+        Load a value and store it even if the shared one is still fresh (pre-warming)
+
+        Returns:
+            The value, and the seconds the replaced entry had left before readers would have
+            reloaded it (None when there was no entry)
+        """
+        if not self.available:
+            return await loader(), None
+
+        kind = key[0]
+        cache_key = self._key(key)
+        try:
+            envelope, stamp = await self._read(kind, cache_key)
+        except SharedCacheUnavailable:
+            return await loader(), None
+
+        value = await loader()
+        try:
+            await self._call(self._backend.set(cache_key, self._encode(kind, value, stamp), self.ttl))
+        except SharedCacheUnavailable:
+            pass
+        if envelope is None:
+            return value, None
+        return value, max(0.0, envelope["refreshAt"] - time.time())
+
+    async def invalidate(self, key: Tuple[Hashable, ...]):
+        """Drop one entry for every worker"""
+        if not self.available:
+            return
+        # Bumping the key's version (rather than deleting the entry) also voids a value that
+        # is being loaded right now, when it is stored
+        try:
+            await self._call(
+                self._backend.incr(self._version_key(self._key(key)), self.ttl * VERSION_TTL_FACTOR)
+            )
+        except SharedCacheUnavailable:
+            pass
+
+    async def invalidate_kind(self, kind: str):
+        """Drop every entry of a kind (e.g. all searches) for every worker"""
+        if not self.available:
+            return
+        try:
+            await self._call(self._backend.incr(self._generation_key(kind)))
+        except SharedCacheUnavailable:
+            pass
+
+    async def publish_hot(self, worker_id: str, hot: Dict[str, List[Tuple[Tuple, float]]], half_life: float):
+        """Share one worker's hottest keys (arguments and request scores, by kind) with the pre-warm timer"""
+        if not self.available:
+            return
+        body = dumps({
+            "at": time.time(),
+            "hot": {kind: [[list(args), score] for args, score in scored] for kind, scored in hot.items()}
+        }).encode()
+        try:
+            await self._call(self._backend.hash_set(self._hot_key(), worker_id, body, half_life))
+        except SharedCacheUnavailable:
+            pass
+
+    async def read_hot(self, half_life: float, exclude: Optional[str] = None) -> Dict[str, List[Tuple[List, float]]]:
+        """
+        Every worker's hottest keys by kind, with their scores decayed to now (`exclude`: the
+        caller's own). Hot sets not republished for `half_life` seconds are from workers that
+        are gone, and are dropped.
+        """
+        if not self.available:
+            return {}
+        try:
+            published = await self._call(self._backend.hash_get_all(self._hot_key()))
+        except SharedCacheUnavailable:
+            return {}
+
+        now = time.time()
+        hot: Dict[str, List[Tuple[List, float]]] = {}
+        gone = []
+        for worker_id, body in published.items():
+            if worker_id == exclude:
+                continue
+            snapshot = json.loads(body)
+            age = now - snapshot["at"]
+            if age > half_life:
+                gone.append(worker_id)
+                continue
+            decay = 0.5 ** (age / half_life)
+            for kind, scored in snapshot["hot"].items():
+                hot.setdefault(kind, []).extend((args, score * decay) for args, score in scored)
+        if gone:
+            try:
+                await self._call(self._backend.hash_delete(self._hot_key(), gone))
+            except SharedCacheUnavailable:
+                pass
+        return hot
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "available": self.available,
+            "hits": self.hits,
+            "misses": self.misses,
+            "earlyRefreshes": self.early_refreshes,
+            "lockWaits": self.lock_waits,
+            "errors": self.errors,
+            "hitRatio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+_backends: Dict[str, Any] = {}
+
+
+def create_shared_cache(settings) -> Optional[SharedCache]:
+    """The shared cache for the settings' tenant, or None when L2_CACHE_URL is not set"""
+    url = settings.L2_CACHE_URL
+    if not url:
+        return None
+    # One backend (connection pool) per worker, shared by every tenant
+    if url not in _backends:
+        if url.startswith("memory://"):
+            _backends[url] = MemoryBackend()
+        elif url.startswith(("redis://", "rediss://", "unix://")):
+            _backends[url] = RedisBackend(url, settings.L2_CACHE_TIMEOUT)
+        else:
+            raise ValueError("L2_CACHE_URL must start with redis://, rediss://, unix:// or memory://")
+    return SharedCache(
+        _backends[url],
+        settings.AZURE_TENANT_ID,
+        ttl=settings.L2_CACHE_TTL_SECONDS,
+        compress_bytes=settings.L2_CACHE_COMPRESS_BYTES,
+        lock_seconds=settings.L2_CACHE_LOCK_SECONDS,
+        retry_seconds=settings.L2_CACHE_RETRY_SECONDS
+    )
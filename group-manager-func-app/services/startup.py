@@ -0,0 +1,63 @@
+"""
+Startup Timing
+Cold-start mode and per-import timing report
+"""
+import importlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# eager: build the Graph service while function_app.py loads (blocks the first request)
+# background: load msgraph and build the service on a warm-up thread (default)
+# lazy: do nothing until the first request that needs Graph
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "background").lower()
+
+# Heaviest imports first, so each timing is that module's own incremental cost
+WARMUP_IMPORTS = [
+    "azure.identity",
+    "httpx",
+    "msgraph",
+    "msgraph.generated.models.group",
+    "msgraph.generated.models.reference_create",
+    "msgraph.generated.groups.groups_request_builder",
+    "msgraph.generated.groups.item.members.members_request_builder",
+    "services.azure_graph_service",
+]
+
+
+class StartupTimer:
+    """Collects how long each startup step took"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.steps.append({"step": name, "seconds": round(elapsed, 4)})
+            logger.info(f"Startup step '{name}' took {elapsed:.3f}s")
+
+    def import_timed(self, module_name: str):
+        """Import a module, recording its incremental import time"""
+        with self.measure(f"import {module_name}"):
+            return importlib.import_module(module_name)
+
+    def get_report(self) -> Dict[str, Any]:
+        return {
+            "mode": STARTUP_MODE,
+            "secondsSinceAppLoad": round(time.perf_counter() - self.started, 3),
+            "steps": list(self.steps),
+            "totalMeasuredSeconds": round(sum(step["seconds"] for step in self.steps), 4)
+        }
+
+
+startup_timer = StartupTimer()
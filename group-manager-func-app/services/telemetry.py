@@ -0,0 +1,296 @@
+"""
+Telemetry
+Per-request phase timers, Graph call counters and latency percentiles, also exported
+as OpenTelemetry spans and metrics
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+try:
+    from opentelemetry import metrics as otel_metrics
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover - the API is optional, local numbers still work
+    otel_metrics = None
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# Latest samples kept per histogram for percentiles (per worker)
+HISTOGRAM_SAMPLES = 2048
+
+# Set OTEL_EXPORTER=azuremonitor (with azure-monitor-opentelemetry installed and
+# APPLICATIONINSIGHTS_CONNECTION_STRING set) to ship spans and metrics unsampled
+OTEL_EXPORTER = os.environ.get("OTEL_EXPORTER", "").lower()
+
+if otel_trace is not None:
+    # Proxies - they start exporting once an SDK is configured, even if that happens later
+    _tracer = otel_trace.get_tracer("group-manager")
+    _meter = otel_metrics.get_meter("group-manager")
+    _otel_request_duration = _meter.create_histogram(
+        "group_manager.request.duration", unit="s", description="HTTP handler duration")
+    _otel_phase_duration = _meter.create_histogram(
+        "group_manager.phase.duration", unit="s", description="Duration of a phase within a request")
+    _otel_graph_duration = _meter.create_histogram(
+        "group_manager.graph.duration", unit="s", description="Duration of one Graph API call")
+    _otel_graph_bytes = _meter.create_counter(
+        "group_manager.graph.bytes_received", unit="By", description="Graph response bytes on the wire")
+    _otel_cache_lookups = _meter.create_counter(
+        "group_manager.cache.lookups", description="Read cache lookups by outcome")
+    _otel_throttles = _meter.create_counter(
+        "group_manager.graph.throttles", description="Graph 429/503 responses and breaker rejections")
+else:
+    _tracer = None
+
+
+class LatencyHistogram:
+    """Count/total of every sample plus a window of the latest ones for percentiles"""
+
+    def __init__(self, max_samples: int = HISTOGRAM_SAMPLES):
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": self.count,
+            "meanMs": round(1000 * self.total / self.count, 2) if self.count else 0.0,
+            "p50Ms": round(1000 * percentile(0.50), 2),
+            "p95Ms": round(1000 * percentile(0.95), 2),
+            "p99Ms": round(1000 * percentile(0.99), 2),
+            "maxMs": round(1000 * self.max, 2)
+        }
+
+
+class RequestMetrics:
+    """Everything measured while handling one request (shared by its child tasks)"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.graph_calls = 0
+        self.graph_seconds = 0.0
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.throttle_events = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "endpoint": self.endpoint,
+            "totalMs": round(1000 * (time.perf_counter() - self.started), 2),
+            # Phases can nest (e.g. token acquisition happens inside a Graph call)
+            "phasesMs": {name: round(1000 * seconds, 2) for name, seconds in self.phases.items()},
+            "graphCalls": self.graph_calls,
+            "graphMs": round(1000 * self.graph_seconds, 2),
+            "bytesReceived": self.bytes_received,
+            "cacheHitRatio": round(self.cache_hits / lookups, 3) if lookups else None,
+            "throttleEvents": self.throttle_events
+        }
+
+
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar(
+    "group_manager_request_metrics", default=None
+)
+
+_histograms: Dict[str, Dict[str, LatencyHistogram]] = {"endpoints": {}, "phases": {}, "graph": {}}
+_totals = {
+    "requests": 0,
+    "graphCalls": 0,
+    "bytesReceived": 0,
+    "cacheHits": 0,
+    "cacheMisses": 0,
+    "throttleEvents": 0
+}
+
+
+def _record_latency(kind: str, name: str, seconds: float):
+    histogram = _histograms[kind].get(name)
+    if histogram is None:
+        histogram = _histograms[kind][name] = LatencyHistogram()
+    histogram.record(seconds)
+
+
+_exporter_configured = False
+
+
+def configure_exporter():
+    """Hook OpenTelemetry up to Azure Monitor when OTEL_EXPORTER=azuremonitor (once per worker)"""
+    global _exporter_configured
+    if OTEL_EXPORTER != "azuremonitor" or _exporter_configured:
+        return
+    _exporter_configured = True
+    try:
+        from azure.monitor.opentelemetry import configure_azure_monitor
+        configure_azure_monitor()
+        logger.info("OpenTelemetry export to Azure Monitor enabled")
+    except Exception as e:
+        logger.warning(f"OpenTelemetry exporter not configured: {str(e)}")
+
+
+# Recording
+
+def _span(name: str):
+    return _tracer.start_as_current_span(name) if _tracer is not None else nullcontext()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a phase of the current request (and emit it as a span)"""
+    started = time.perf_counter()
+    try:
+        with _span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.phases[name] = metrics.phases.get(name, 0.0) + elapsed
+        _record_latency("phases", name, elapsed)
+        if _tracer is not None:
+            _otel_phase_duration.record(elapsed, {"phase": name})
+
+
+def record_graph_call(seconds: float, status: Optional[int] = None):
+    """One Graph API attempt finished (status None means success)"""
+    _totals["graphCalls"] += 1
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.graph_calls += 1
+        metrics.graph_seconds += seconds
+    _record_latency("graph", "call", seconds)
+    if _tracer is not None:
+        _otel_graph_duration.record(seconds, {"status": status or 200})
+
+
+def record_bytes_received(count: int):
+    _totals["bytesReceived"] += count
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.bytes_received += count
+    if _tracer is not None:
+        _otel_graph_bytes.add(count)
+
+
+def record_cache_lookup(hit: bool):
+    _totals["cacheHits" if hit else "cacheMisses"] += 1
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+    if _tracer is not None:
+        _otel_cache_lookups.add(1, {"outcome": "hit" if hit else "miss"})
+
+
+def record_throttle():
+    _totals["throttleEvents"] += 1
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.throttle_events += 1
+    if _tracer is not None:
+        _otel_throttles.add(1)
+
+
+# Decorators
+
+def _finish_request(metrics: RequestMetrics, status_code: int):
+    elapsed = time.perf_counter() - metrics.started
+    _totals["requests"] += 1
+    _record_latency("endpoints", metrics.endpoint, elapsed)
+    if _tracer is not None:
+        _otel_request_duration.record(elapsed, {"endpoint": metrics.endpoint, "status": status_code})
+    summary = metrics.to_dict()
+    summary["status"] = status_code
+    logger.info(f"Request metrics: {json.dumps(summary)}")
+
+
+def instrument(endpoint: str) -> Callable:
+    """Measure an HTTP/queue handler: total latency, phases, Graph calls, bytes, cache and throttles"""
+
+    def decorator(handler: Callable) -> Callable:
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(*args, **kwargs):
+                metrics = RequestMetrics(endpoint)
+                token = _current.set(metrics)
+                status_code = 500
+                try:
+                    with _span(endpoint):
+                        response = await handler(*args, **kwargs)
+                    status_code = getattr(response, "status_code", 200)
+                    return response
+                finally:
+                    _current.reset(token)
+                    _finish_request(metrics, status_code)
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            metrics = RequestMetrics(endpoint)
+            token = _current.set(metrics)
+            status_code = 500
+            try:
+                with _span(endpoint):
+                    response = handler(*args, **kwargs)
+                status_code = getattr(response, "status_code", 200)
+                return response
+            finally:
+                _current.reset(token)
+                _finish_request(metrics, status_code)
+        return wrapper
+
+    return decorator
+
+
+def traced(name: str) -> Callable:
+    """Time an async service method as a phase of the current request"""
+
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            with phase(name):
+                return await method(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Worker-wide totals and p50/p95/p99 latencies (GET /metrics)"""
+    lookups = _totals["cacheHits"] + _totals["cacheMisses"]
+    return {
+        "totals": {
+            **_totals,
+            "cacheHitRatio": round(_totals["cacheHits"] / lookups, 3) if lookups else None
+        },
+        "endpoints": {name: h.get_stats() for name, h in sorted(_histograms["endpoints"].items())},
+        "phases": {name: h.get_stats() for name, h in sorted(_histograms["phases"].items())},
+        "graphCalls": _histograms["graph"]["call"].get_stats() if "call" in _histograms["graph"] else None,
+        "openTelemetry": _tracer is not None,
+        "windowSamples": HISTOGRAM_SAMPLES
+    }
@@ -0,0 +1,160 @@
+"""
+Tenants
+Per-tenant settings and a bounded (LRU) pool of Graph services, so one warm app can
+serve several tenants, each with its own credential, rate limit and cache partition
+"""
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Header selecting the tenant on the plain routes (the tenants/{tenantId}/... routes use the path)
+TENANT_HEADER = "X-Tenant-Id"
+
+# App settings holding Key Vault references that the platform could not resolve keep this prefix
+KEY_VAULT_REFERENCE_PREFIX = "@Microsoft.KeyVault("
+
+# GRAPH_TENANTS entry key -> Settings attribute (per-tenant overrides)
+TENANT_OVERRIDES = {
+    "clientId": "AZURE_CLIENT_ID",
+    "rateLimit": "GRAPH_RATE_LIMIT",
+    "rateBurst": "GRAPH_RATE_BURST",
+    "cacheTtlSeconds": "CACHE_TTL_SECONDS",
+    "cacheMaxEntries": "CACHE_MAX_ENTRIES",
+    "cacheMaxBytes": "CACHE_MAX_BYTES"
+}
+
+TENANT_CONFIG_KEYS = set(TENANT_OVERRIDES) | {"clientSecret", "clientSecretSetting"}
+
+
+def validate_tenant_configs(tenants: Any) -> Dict[str, Dict[str, Any]]:
+    """Check the parsed GRAPH_TENANTS object, returning it keyed by lower-case tenant id"""
+    if not isinstance(tenants, dict):
+        raise ValueError("GRAPH_TENANTS must be a JSON object keyed by tenant id")
+    configs = {}
+    for tenant_id, config in tenants.items():
+        if not isinstance(config, dict):
+            raise ValueError(f"GRAPH_TENANTS entry for {tenant_id} must be an object")
+        unknown = set(config) - TENANT_CONFIG_KEYS
+        if unknown:
+            raise ValueError(f"Unknown GRAPH_TENANTS keys for {tenant_id}: {', '.join(sorted(unknown))}")
+        configs[tenant_id.lower()] = config
+    return configs
+
+
+def resolve_client_secret(tenant_id: str, config: Dict[str, Any], default: str) -> str:
+    """
+    The tenant's client secret: a literal `clientSecret`, or the app setting named by
+    `clientSecretSetting` (which may be a Key Vault reference resolved by the platform).
+    Tenants without either use the app's own secret (multi-tenant app registration).
+    """
+    if config.get("clientSecretSetting"):
+        setting = config["clientSecretSetting"]
+        secret = os.environ.get(setting, "")
+        if not secret:
+            raise ValueError(f"App setting {setting} (client secret for tenant {tenant_id}) is not set")
+        if secret.startswith(KEY_VAULT_REFERENCE_PREFIX):
+            raise ValueError(
+                f"Key Vault reference in {setting} (tenant {tenant_id}) was not resolved - "
+                "check the app's managed identity has access to the vault"
+            )
+        return secret
+    return config.get("clientSecret") or default
+
+
+def tenant_settings(settings, tenant_id: str, config: Dict[str, Any]):
+    """A copy of the app settings for another tenant, with its overrides applied"""
+    overrides = copy.copy(settings)
+    overrides.AZURE_TENANT_ID = tenant_id
+    for key, attribute in TENANT_OVERRIDES.items():
+        if key in config:
+            setattr(overrides, attribute, type(getattr(settings, attribute))(config[key]))
+    if "cacheMaxBytes" not in config:
+        overrides.CACHE_MAX_BYTES = settings.TENANT_CACHE_MAX_BYTES
+    overrides.AZURE_CLIENT_SECRET = resolve_client_secret(tenant_id, config, settings.AZURE_CLIENT_SECRET)
+
+    # Tenants can share a client id, so anything persisted per tenant needs its own file
+    overrides.TOKEN_CACHE_PATH = os.path.join(
+        os.path.dirname(settings.TOKEN_CACHE_PATH),
+        f"group-manager-token-{tenant_id}-{overrides.AZURE_CLIENT_ID}.bin"
+    )
+    root, ext = os.path.splitext(settings.MIRROR_PATH)
+    overrides.MIRROR_PATH = f"{root}-{tenant_id}{ext}"
+
+    if overrides.GRAPH_RATE_LIMIT <= 0 or overrides.GRAPH_RATE_BURST < 1:
+        raise ValueError(f"rateLimit and rateBurst for tenant {tenant_id} must be positive")
+    return overrides
+
+
+class GraphServicePool:
+    """
+    Graph services for the configured tenants, created on first use and evicted least
+    recently used first. The home tenant (AZURE_TENANT_ID) is served by the caller's own
+    singleton and never enters the pool.
+
+    Rate limits outlive eviction: schedulers are shared per tenant (see get_scheduler), so
+    a tenant that is evicted and recreated keeps its token bucket and circuit breaker.
+    """
+
+    def __init__(self, settings, service_factory: Callable[[Any], Any], max_size: int):
+        self.settings = settings
+        self.home_tenant_id = settings.AZURE_TENANT_ID.lower()
+        self.max_size = max_size
+        self._configs = settings.GRAPH_TENANTS
+        self._factory = service_factory
+        self._services: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created_count = 0
+        self.evicted_count = 0
+
+    def resolve(self, tenant_id: Optional[str]) -> str:
+        """Normalize a requested tenant id (None means the home tenant)"""
+        if not tenant_id:
+            return self.home_tenant_id
+        tenant_id = tenant_id.strip().lower()
+        if tenant_id != self.home_tenant_id and tenant_id not in self._configs:
+            raise ValueError(f"Unknown tenant: {tenant_id}")
+        return tenant_id
+
+    def get(self, tenant_id: str):
+        """Get the service for a configured (non-home) tenant, creating it if needed"""
+        tenant_id = self.resolve(tenant_id)
+        with self._lock:
+            service = self._services.get(tenant_id)
+            if service is not None:
+                self._services.move_to_end(tenant_id)
+                return service
+
+            logger.info(f"Creating Graph service for tenant {tenant_id}")
+            service = self._factory(tenant_settings(self.settings, tenant_id, self._configs[tenant_id]))
+            self._services[tenant_id] = service
+            self.created_count += 1
+
+            while len(self._services) > self.max_size:
+                evicted_id, evicted = self._services.popitem(last=False)
+                # Requests already holding it keep working; only the background refresh stops
+                evicted.stop_token_prefetch()
+                self.evicted_count += 1
+                logger.info(f"Evicted Graph service for tenant {evicted_id}")
+            return service
+
+    def live_services(self) -> List[Tuple[str, Any]]:
+        """The (tenant id, service) pairs alive in the pool, without touching their recency"""
+        with self._lock:
+            return list(self._services.items())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool counters and the live tenants, least recently used first"""
+        live: List[str] = list(self._services)
+        return {
+            "homeTenant": self.home_tenant_id,
+            "configuredTenants": len(self._configs),
+            "liveTenants": live,
+            "maxSize": self.max_size,
+            "created": self.created_count,
+            "evicted": self.evicted_count
+        }
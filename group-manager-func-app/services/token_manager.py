@@ -0,0 +1,163 @@
+"""
+Token Manager
+Prefetches and proactively refreshes the Graph access token for a credential
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from azure.core.credentials import AccessToken
+from cryptography.fernet import Fernet, InvalidToken
+
+from services import telemetry
+
+logger = logging.getLogger(__name__)
+
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+
+
+class StaticTokenCredential:
+    """Credential returning a fixed token (offline benchmarks against the mock Graph)"""
+
+    def __init__(self, token: str, lifetime: int = 3600):
+        self._token = token
+        self._lifetime = lifetime
+
+    def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        return AccessToken(self._token, int(time.time()) + self._lifetime)
+
+
+class TokenManager:
+    """
+    Async credential wrapper around a (sync) azure-identity credential.
+
+    - The Graph token is fetched once and served from memory until it is close to expiry
+    - A background thread refreshes it `refresh_margin` seconds before it expires
+    - Only one refresh is ever in flight; concurrent callers wait for it
+    - Optionally the token is persisted, encrypted, so a recycled worker can reuse it
+    """
+
+    def __init__(self, credential, refresh_margin: float = 300, cache_path: Optional[str] = None,
+                 cache_secret: Optional[str] = None):
+        self._credential = credential
+        self.refresh_margin = refresh_margin
+        self._token: Optional[AccessToken] = None
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._cache_path = cache_path
+        self._fernet = None
+        if cache_path and cache_secret:
+            key = hashlib.sha256(f"group-manager-token-cache:{cache_secret}".encode()).digest()
+            self._fernet = Fernet(base64.urlsafe_b64encode(key))
+
+        self.fetch_count = 0
+        self.last_fetch_seconds = 0.0
+
+    def _is_fresh(self, token: Optional[AccessToken], margin: float) -> bool:
+        return token is not None and token.expires_on - time.time() > margin
+
+    # Persistence
+
+    def _load_cached_token(self) -> Optional[AccessToken]:
+        if not self._fernet or not os.path.exists(self._cache_path):
+            return None
+        try:
+            with open(self._cache_path, "rb") as f:
+                payload = json.loads(self._fernet.decrypt(f.read()))
+            return AccessToken(payload["token"], int(payload["expires_on"]))
+        except (InvalidToken, OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable token cache: {str(e)}")
+            return None
+
+    def _save_cached_token(self, token: AccessToken):
+        if not self._fernet:
+            return
+        try:
+            payload = json.dumps({"token": token.token, "expires_on": token.expires_on}).encode()
+            tmp_path = f"{self._cache_path}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._fernet.encrypt(payload))
+            os.replace(tmp_path, self._cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to persist token cache: {str(e)}")
+
+    # Fetching
+
+    def _fetch(self) -> AccessToken:
+        """Fetch a new token unless a fresh one appeared while waiting for the lock"""
+        with self._lock:
+            if self._is_fresh(self._token, self.refresh_margin):
+                return self._token
+
+            if self._token is None:
+                cached = self._load_cached_token()
+                if self._is_fresh(cached, self.refresh_margin):
+                    logger.info("Using persisted Graph token")
+                    self._token = cached
+                    return cached
+
+            started = time.perf_counter()
+            token = self._credential.get_token(GRAPH_SCOPE)
+            self.last_fetch_seconds = time.perf_counter() - started
+            self.fetch_count += 1
+            logger.info(f"Fetched Graph token in {self.last_fetch_seconds:.3f}s")
+
+            self._token = token
+            self._save_cached_token(token)
+            return token
+
+    def _refresh_loop(self):
+        """Background thread: refresh the token shortly before it expires"""
+        while not self._stopped.is_set():
+            try:
+                token = self._fetch()
+                delay = max(5.0, token.expires_on - time.time() - self.refresh_margin)
+            except Exception as e:
+                logger.error(f"Background token refresh failed: {str(e)}")
+                delay = 30.0
+            self._stopped.wait(delay)
+
+    def start(self):
+        """Fetch the token now (in the background) and keep it refreshed"""
+        if self._refresh_thread is None:
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop, name="graph-token-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+
+    def stop(self):
+        """Stop the background refresh (tokens are then fetched on demand)"""
+        self._stopped.set()
+
+    # AsyncTokenCredential protocol
+
+    async def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        """Get a Graph token, from memory when it is still fresh"""
+        if list(scopes) != [GRAPH_SCOPE] or kwargs.get("claims"):
+            # Other scopes and claims challenges bypass the managed token
+            return await asyncio.to_thread(self._credential.get_token, *scopes, **kwargs)
+
+        token = self._token
+        # Keep serving a token the background thread is about to refresh
+        if self._is_fresh(token, 60):
+            return token
+        with telemetry.phase("token"):
+            return await asyncio.to_thread(self._fetch)
+
+    async def close(self):
+        # The auth provider closes async credentials after each call - keep ours alive
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
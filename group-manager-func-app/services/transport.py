@@ -0,0 +1,138 @@
+"""
+Shared HTTP Transport
+One pooled, keep-alive, HTTP/2 httpx client per worker, shared by every Graph client
+"""
+import asyncio
+import atexit
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from services import telemetry
+
+logger = logging.getLogger(__name__)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Connection reuse counters, fed by httpcore trace events
+_stats = {
+    "requests": 0,
+    "http2Requests": 0,
+    "newConnections": 0,
+    "tlsHandshakes": 0
+}
+
+
+async def _trace(event_name: str, info: Dict[str, Any]):
+    """httpcore trace callback (async clients need a coroutine) - counts new connections and protocol per request"""
+    if event_name == "connection.connect_tcp.started":
+        _stats["newConnections"] += 1
+    elif event_name == "connection.start_tls.started":
+        _stats["tlsHandshakes"] += 1
+    elif event_name == "http2.send_request_headers.started":
+        _stats["http2Requests"] += 1
+
+
+class _CountingStream(httpx.AsyncByteStream):
+    """Response body stream that reports bytes as they arrive (before decompression)"""
+
+    def __init__(self, stream: httpx.AsyncByteStream):
+        self._stream = stream
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            telemetry.record_bytes_received(len(chunk))
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+
+class _MockGraphTransport(httpx.AsyncBaseTransport):
+    """Sends graph.microsoft.com requests to a local Graph stand-in, keeping the path and query"""
+
+    def __init__(self, mock_url: str, transport: httpx.AsyncBaseTransport):
+        self._mock_url = httpx.URL(mock_url)
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "graph.microsoft.com":
+            request.url = request.url.copy_with(
+                scheme=self._mock_url.scheme, host=self._mock_url.host, port=self._mock_url.port
+            )
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+async def _on_request(request: httpx.Request):
+    _stats["requests"] += 1
+    request.extensions["trace"] = _trace
+
+
+async def _on_response(response: httpx.Response):
+    # Hooks run before the body is read, so every byte read afterwards is counted
+    response.stream = _CountingStream(response.stream)
+
+
+def get_http_client(settings) -> httpx.AsyncClient:
+    """Get (or create) the worker-wide pooled HTTP client"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        logger.info(f"Creating shared HTTP client (http2={settings.HTTP_HTTP2}, "
+                    f"max_connections={settings.HTTP_MAX_CONNECTIONS})")
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        transport = None
+        if settings.GRAPH_MOCK_URL:
+            logger.warning(f"Graph requests are sent to the mock at {settings.GRAPH_MOCK_URL}")
+            transport = _MockGraphTransport(
+                settings.GRAPH_MOCK_URL,
+                httpx.AsyncHTTPTransport(http2=settings.HTTP_HTTP2, limits=limits)
+            )
+        _http_client = httpx.AsyncClient(
+            http2=settings.HTTP_HTTP2,
+            limits=limits,
+            transport=transport,
+            timeout=httpx.Timeout(
+                settings.HTTP_READ_TIMEOUT,
+                connect=settings.HTTP_CONNECT_TIMEOUT
+            ),
+            event_hooks={"request": [_on_request], "response": [_on_response]}
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections"""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        logger.info("Closing shared HTTP client")
+        await _http_client.aclose()
+    _http_client = None
+
+
+@atexit.register
+def _close_at_exit():
+    """Best-effort close when the Functions host shuts the worker down"""
+    if _http_client is None or _http_client.is_closed:
+        return
+    try:
+        asyncio.run(close_http_client())
+    except Exception as e:
+        logger.warning(f"Failed to close shared HTTP client: {str(e)}")
+
+
+def get_transport_stats() -> Dict[str, Any]:
+    """Connection reuse counters for this worker"""
+    requests = _stats["requests"]
+    return {
+        **_stats,
+        "reusedConnections": max(0, requests - _stats["newConnections"]),
+        "reuseRatio": round(1 - _stats["newConnections"] / requests, 3) if requests else 0.0
+    }
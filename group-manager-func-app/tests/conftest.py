@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The function app is not an installed package - import services/ from the app root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+import base64
+import json
+
+import pytest
+
+from services.azure_graph_service import decode_members_cursor, encode_members_cursor, graph_errors
+from services.graph_scheduler import GraphThrottledError
+
+GROUP_ID = "00000000-0000-4000-8000-000000000001"
+MEMBERS_LINK = f"https://graph.microsoft.com/v1.0/groups/{GROUP_ID}/members?$top=999&$skiptoken=abc"
+
+
+def forged_cursor(link, skip=0) -> str:
+    payload = json.dumps({"link": link, "skip": skip})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    assert decode_members_cursor(encode_members_cursor(MEMBERS_LINK, 7), GROUP_ID) == (MEMBERS_LINK, 7)
+    assert decode_members_cursor(encode_members_cursor(None, 3), GROUP_ID) == (None, 3)
+
+
+def test_cursor_accepts_case_differences():
+    link = MEMBERS_LINK.replace("graph.microsoft.com", "Graph.Microsoft.com").replace(GROUP_ID, GROUP_ID.upper())
+    assert decode_members_cursor(encode_members_cursor(link), GROUP_ID) == (link, 0)
+
+
+@pytest.mark.parametrize("link", [
+    # Another group's members
+    "https://graph.microsoft.com/v1.0/groups/00000000-0000-4000-8000-000000000002/members?$skiptoken=abc",
+    # Another resource of the same group, or another resource altogether
+    f"https://graph.microsoft.com/v1.0/groups/{GROUP_ID}/owners",
+    "https://graph.microsoft.com/v1.0/users?$select=id,passwordProfile",
+    f"https://graph.microsoft.com/beta/groups/{GROUP_ID}/members",
+    # Not Graph, or not over TLS
+    f"https://graph.microsoft.com.evil.example/v1.0/groups/{GROUP_ID}/members",
+    f"http://graph.microsoft.com/v1.0/groups/{GROUP_ID}/members",
+    f"https://user@graph.microsoft.com/v1.0/groups/{GROUP_ID}/members",
+])
+def test_cursor_rejects_links_outside_the_group_members(link):
+    with pytest.raises(ValueError):
+        decode_members_cursor(encode_members_cursor(link), GROUP_ID)
+
+
+def test_empty_cursor_payload_starts_the_listing():
+    assert decode_members_cursor(base64.urlsafe_b64encode(b"{}").decode(), GROUP_ID) == (None, 0)
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", forged_cursor(None, -1), forged_cursor(None, "x")])
+def test_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_members_cursor(cursor, GROUP_ID)
+
+
+def test_graph_errors_wraps_unexpected_errors():
+    with pytest.raises(Exception) as error:
+        with graph_errors("list groups"):
+            raise KeyError("value")
+    assert type(error.value) is Exception
+    assert str(error.value) == "Failed to list groups: 'value'"
+
+
+def test_graph_errors_lets_throttling_and_passthrough_types_through():
+    with pytest.raises(GraphThrottledError):
+        with graph_errors("list groups"):
+            raise GraphThrottledError("throttled", retry_after=1.0)
+
+    with pytest.raises(ValueError):
+        with graph_errors("create group", ValueError):
+            raise ValueError("Group 'x' already exists")
+
+    with pytest.raises(Exception) as error:
+        with graph_errors("list groups"):
+            raise ValueError("bad")
+    assert type(error.value) is Exception
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from services.cache import MEMBER_RECORD_SIZE, TTLCache, estimate_size
+from services.serialization import MemberRecord
+
+
+def make_cache(**overrides) -> TTLCache:
+    options = {"ttl": 60.0, "max_entries": 100, "max_bytes": 1_000_000}
+    options.update(overrides)
+    return TTLCache(**options)
+
+
+def test_concurrent_misses_share_one_load():
+    cache = make_cache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return ["a", "b"]
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == [["a", "b"]] * 5
+    assert len(loads) == 1
+    assert cache.misses == 1
+    assert cache.coalesced == 4
+    assert cache.get("key") == ["a", "b"]
+
+
+def test_failed_load_reaches_every_waiter_and_is_not_cached():
+    cache = make_cache()
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("graph down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get("key") is None
+
+
+def test_load_started_before_invalidation_is_not_stored():
+    cache = make_cache()
+
+    async def run():
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def stale_loader():
+            loading.set()
+            await release.wait()
+            return "stale"
+
+        task = asyncio.create_task(cache.get_or_load("key", stale_loader))
+        await loading.wait()
+        cache.invalidate("key")
+
+        # A reader after the write must not join the stale load
+        async def fresh_loader():
+            return "fresh"
+
+        fresh = await cache.get_or_load("key", fresh_loader)
+        release.set()
+        return await task, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert (stale, fresh) == ("stale", "fresh")
+    # Only the load that started after the invalidation was stored
+    assert cache.get("key") == "fresh"
+
+
+def test_refresh_skips_store_after_concurrent_invalidation():
+    cache = make_cache()
+
+    async def run():
+        async def loader():
+            cache.invalidate_where(lambda key: key == "other")
+            return "value"
+
+        return await cache.refresh("key", loader)
+
+    assert asyncio.run(run()) == "value"
+    assert cache.get("key") is None
+
+
+def test_invalidate_where_drops_matching_entries():
+    cache = make_cache()
+    cache.set(("members", "g1"), [1])
+    cache.set(("members", "g2"), [2])
+    cache.set(("search", "a"), [3])
+
+    cache.invalidate_where(lambda key: key[0] == "members")
+
+    assert cache.get(("members", "g1")) is None
+    assert cache.get(("members", "g2")) is None
+    assert cache.get(("search", "a")) == [3]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    cache = make_cache(ttl=10.0)
+    now = [1000.0]
+    monkeypatch.setattr("services.cache.time.monotonic", lambda: now[0])
+    cache.set("key", "value")
+
+    now[0] += 5
+    assert cache.get("key") == "value"
+    assert cache.expires_in("key") == pytest.approx(5.0)
+
+    now[0] += 6
+    assert cache.get("key") is None
+    assert cache.expires_in("key") is None
+
+
+def test_disabled_cache_always_loads():
+    cache = make_cache(ttl=0)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return "value"
+
+    async def run():
+        await cache.get_or_load("key", loader)
+        await cache.get_or_load("key", loader)
+
+    asyncio.run(run())
+    assert len(loads) == 2
+
+
+def test_member_lists_are_sized_per_record():
+    members = [MemberRecord(f"id-{i}", f"User {i}", "user", None) for i in range(1000)]
+
+    assert estimate_size(members) == 1000 * MEMBER_RECORD_SIZE
+    assert estimate_size([{"id": "g1"}]) == len('[{"id":"g1"}]')
+    assert estimate_size([]) == 2
+
+
+def test_member_lists_count_against_the_byte_budget():
+    cache = make_cache(max_bytes=5 * MEMBER_RECORD_SIZE)
+    member = MemberRecord("id", "User", "user", None)
+    cache.set("small", [member] * 3)
+    cache.set("too large", [member] * 6)
+    cache.set("evicts small", [member] * 3)
+
+    assert cache.get("too large") is None
+    assert cache.get("small") is None
+    assert cache.get("evicts small") == [member] * 3
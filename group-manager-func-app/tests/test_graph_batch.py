@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from services.graph_batch import GraphBatchError, GraphBatcher
+from services.graph_scheduler import get_retry_after, get_status_code
+
+
+class FakeGraph:
+    """Answers $batch envelopes; `responses` overrides the response for a URL"""
+
+    def __init__(self, responses=None, error=None):
+        self.envelopes = []
+        self.responses = responses or {}
+        self.error = error
+
+    async def send(self, requests):
+        self.envelopes.append(requests)
+        if self.error:
+            raise self.error
+        return {
+            request["id"]: self.responses.get(
+                request["url"], {"status": 200, "body": {"method": request["method"], "url": request["url"]}}
+            )
+            for request in requests
+        }
+
+
+def test_requests_issued_together_share_envelopes():
+    graph = FakeGraph()
+    batcher = GraphBatcher(graph.send)
+
+    async def run():
+        return await asyncio.gather(*(batcher.get(f"/groups/{i}") for i in range(45)))
+
+    bodies = asyncio.run(run())
+    assert [body["url"] for body in bodies] == [f"/groups/{i}" for i in range(45)]
+    assert [len(envelope) for envelope in graph.envelopes] == [20, 20, 5]
+    assert batcher.envelope_count == 3
+    assert batcher.request_count == 45
+    assert len({request["id"] for envelope in graph.envelopes for request in envelope}) == 45
+
+
+def test_delete_is_sent_as_delete():
+    graph = FakeGraph(responses={"/groups/g/members/u/$ref": {"status": 204}})
+    batcher = GraphBatcher(graph.send)
+
+    asyncio.run(batcher.delete("/groups/g/members/u/$ref"))
+    assert graph.envelopes == [[{"id": "1", "method": "DELETE", "url": "/groups/g/members/u/$ref"}]]
+
+
+def test_failed_response_raises_with_status_and_retry_after():
+    graph = FakeGraph(responses={
+        "/groups/throttled": {
+            "status": 429,
+            "headers": {"Retry-After": "3"},
+            "body": {"error": {"code": "TooManyRequests", "message": "Slow down"}}
+        }
+    })
+    batcher = GraphBatcher(graph.send)
+
+    async def run():
+        return await asyncio.gather(batcher.get("/groups/ok"), batcher.get("/groups/throttled"),
+                                    return_exceptions=True)
+
+    ok, throttled = asyncio.run(run())
+    assert ok["url"] == "/groups/ok"
+    assert isinstance(throttled, GraphBatchError)
+    assert str(throttled) == "Slow down"
+    assert get_status_code(throttled) == 429
+    assert get_retry_after(throttled) == 3.0
+
+
+def test_envelope_failure_fails_every_request():
+    graph = FakeGraph(error=GraphBatchError("Envelope throttled", 429, {"Retry-After": "1"}))
+    batcher = GraphBatcher(graph.send)
+
+    async def run():
+        return await asyncio.gather(*(batcher.get(f"/groups/{i}") for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(get_status_code(result) == 429 for result in results)
+
+
+def test_missing_response_is_an_error():
+    class DroppingGraph(FakeGraph):
+        async def send(self, requests):
+            return {}
+
+    batcher = GraphBatcher(DroppingGraph().send)
+
+    with pytest.raises(GraphBatchError) as error:
+        asyncio.run(batcher.get("/groups/g"))
+    assert error.value.response_status_code == 500
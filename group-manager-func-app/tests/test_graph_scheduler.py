@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.graph_batch import GraphBatchError
+from services.graph_scheduler import GraphRequestScheduler, GraphThrottledError, TokenBucket, get_retry_after
+
+
+def make_scheduler(**overrides) -> GraphRequestScheduler:
+    settings = {
+        "GRAPH_RATE_LIMIT": 1000.0,
+        "GRAPH_RATE_BURST": 100,
+        "GRAPH_BREAKER_THRESHOLD": 100,
+        "GRAPH_BREAKER_COOLDOWN": 30.0,
+        "GRAPH_MAX_RETRIES": 3,
+        "GRAPH_BACKOFF_BASE": 0.001,
+        "GRAPH_BACKOFF_MAX": 0.001,
+    }
+    settings.update(overrides)
+    return GraphRequestScheduler(SimpleNamespace(**settings))
+
+
+def failing(*statuses, result="ok", retry_after=None):
+    """A request factory that fails with the given statuses, then returns `result`"""
+    calls = []
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) <= len(statuses):
+            raise GraphBatchError("failed", statuses[len(calls) - 1], headers)
+        return result
+
+    return attempt, calls
+
+
+def test_retries_transient_errors_until_success():
+    scheduler = make_scheduler()
+    request, calls = failing(503, 429, 504)
+
+    assert asyncio.run(scheduler.call(request)) == "ok"
+    assert len(calls) == 4
+    assert scheduler.retry_count == 3
+    assert scheduler.throttle_count == 2
+
+
+def test_gives_up_with_throttled_error_after_max_retries():
+    scheduler = make_scheduler(GRAPH_MAX_RETRIES=2)
+    request, calls = failing(*[429] * 10, retry_after=0)
+
+    with pytest.raises(GraphThrottledError):
+        asyncio.run(scheduler.call(request))
+    assert len(calls) == 3
+
+
+def test_does_not_retry_other_errors():
+    scheduler = make_scheduler()
+    request, calls = failing(404)
+
+    with pytest.raises(GraphBatchError) as error:
+        asyncio.run(scheduler.call(request))
+    assert error.value.response_status_code == 404
+    assert len(calls) == 1
+
+
+def test_non_idempotent_call_is_not_retried_after_server_error():
+    scheduler = make_scheduler()
+    request, calls = failing(503)
+
+    # The create may have gone through - retrying could duplicate it
+    with pytest.raises(GraphBatchError):
+        asyncio.run(scheduler.call(request, idempotent=False))
+    assert len(calls) == 1
+
+
+def test_non_idempotent_call_is_retried_after_429():
+    scheduler = make_scheduler()
+    request, calls = failing(429, retry_after=0)
+
+    assert asyncio.run(scheduler.call(request, idempotent=False)) == "ok"
+    assert len(calls) == 2
+
+
+def test_backoff_honours_retry_after():
+    scheduler = make_scheduler()
+    error = GraphBatchError("throttled", 429, {"retry-after": "2"})
+
+    assert get_retry_after(error) == 2.0
+    assert scheduler._backoff(0, get_retry_after(error)) >= 2.0
+
+
+def test_open_breaker_rejects_without_calling_graph():
+    scheduler = make_scheduler(GRAPH_BREAKER_THRESHOLD=2, GRAPH_BREAKER_COOLDOWN=60.0)
+    request, calls = failing(*[429] * 10, retry_after=0)
+
+    with pytest.raises(GraphThrottledError):
+        asyncio.run(scheduler.call(request))
+    assert len(calls) == 2
+
+    with pytest.raises(GraphThrottledError) as error:
+        asyncio.run(scheduler.call(request))
+    assert len(calls) == 2
+    assert error.value.retry_after > 0
+    assert scheduler.rejected_count == 1
+
+
+def test_bucket_charges_batch_cost():
+    bucket = TokenBucket(rate=1.0, burst=20)
+
+    async def run():
+        await bucket.acquire(20)
+        # Already paid for (e.g. a request retried inside a $batch envelope)
+        await asyncio.wait_for(bucket.acquire(0), timeout=0.1)
+
+    asyncio.run(run())
+    assert bucket._tokens < 1
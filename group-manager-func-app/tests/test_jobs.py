@@ -0,0 +1,136 @@
+import asyncio
+
+from services.graph_scheduler import GraphThrottledError
+from services.jobs import BULK_ADD_SLICE, RESULT_CHUNK_SIZE, JobQueue, JobRunner, MemoryJobStore
+
+
+class RecordingQueue(JobQueue):
+    """Records sends so a test decides when each slice runs"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, job_id, delay=0):
+        self.sent.append((job_id, delay))
+
+
+class FakeMember:
+    def __init__(self, member_id):
+        self.id = member_id
+
+    def _asdict(self):
+        return {"id": self.id}
+
+
+class FakeService:
+    def __init__(self, members=(), throttle_calls=()):
+        self.members = list(members)
+        # 1-based numbers of the Graph-facing calls that are throttled
+        self.throttle_calls = set(throttle_calls)
+        self.calls = 0
+        self.added = []
+        self.removed = []
+
+    def _call(self):
+        self.calls += 1
+        if self.calls in self.throttle_calls:
+            raise GraphThrottledError("throttled", retry_after=0)
+
+    async def iter_group_members(self, group_id, max_items=None, cursor=None):
+        self._call()
+        start = int(cursor or 0)
+        end = min(len(self.members), start + max_items)
+        yield [FakeMember(member_id) for member_id in self.members[start:end]], (
+            str(end) if end < len(self.members) else None
+        )
+
+    async def add_group_members_bulk(self, group_id, user_ids, raise_on_throttle=False):
+        self._call()
+        results = []
+        for user_id in user_ids:
+            status = "alreadyMember" if user_id in self.members else "added"
+            self.members.append(user_id)
+            self.added.append(user_id)
+            results.append({"userId": user_id, "status": status})
+        return results
+
+    async def remove_group_members(self, group_id, member_ids, raise_on_throttle=False):
+        self._call()
+        self.removed.extend(member_ids)
+        self.members = [member_id for member_id in self.members if member_id not in member_ids]
+        return [{"userId": member_id, "status": "removed"} for member_id in member_ids]
+
+    async def sync_group_members(self, group_id, desired_ids, dry_run=False):
+        current, desired = set(self.members), set(desired_ids)
+        return {"groupId": group_id, "current": len(current), "desired": len(desired),
+                "toAdd": sorted(desired - current), "toRemove": sorted(current - desired)}
+
+
+def make_runner(service, slice_seconds=60.0):
+    store, queue = MemoryJobStore(), RecordingQueue()
+    return JobRunner(lambda tenant_id: service, store, queue, slice_seconds), store, queue
+
+
+def run_to_completion(runner, store, job_id, max_slices=50):
+    async def run():
+        for _ in range(max_slices):
+            await runner.run(job_id)
+            job = await store.get(job_id)
+            if job["status"] in ("succeeded", "failed"):
+                return job
+        raise AssertionError("job did not finish")
+
+    return asyncio.run(run())
+
+
+def test_list_members_resumes_from_checkpoint_each_slice():
+    members = [f"u{i:04d}" for i in range(2500)]
+    # A slice that is already over runs one unit of work, checkpoints and re-queues
+    runner, store, queue = make_runner(FakeService(members), slice_seconds=-1)
+    job = asyncio.run(runner.submit("listMembers", {"groupId": "g"}))
+
+    finished = run_to_completion(runner, store, job["id"])
+
+    assert finished["result"] == {"groupId": "g", "count": 2500}
+    assert [job_id for job_id, _ in queue.sent] == [job["id"]] * 3
+    listed = []
+    for chunk in range(finished["resultChunks"]):
+        listed.extend(item["id"] for item in asyncio.run(store.get_result_chunk(job["id"], chunk)))
+    assert listed == members
+
+
+def test_throttled_job_is_requeued_and_resumes_without_repeating_work():
+    user_ids = [f"u{i:04d}" for i in range(BULK_ADD_SLICE * 3)]
+    service = FakeService(throttle_calls={2})
+    runner, store, queue = make_runner(service)
+    job = asyncio.run(runner.submit("bulkAddMembers", {"groupId": "g", "userIds": user_ids}))
+
+    asyncio.run(runner.run(job["id"]))
+    paused = asyncio.run(store.get(job["id"]))
+    assert paused["status"] == "queued"
+    assert paused["checkpoint"] == {"offset": BULK_ADD_SLICE}
+    assert queue.sent[-1] == (job["id"], 1.0)
+
+    finished = run_to_completion(runner, store, job["id"])
+
+    assert finished["status"] == "succeeded"
+    assert service.added == user_ids
+    assert finished["result"]["counts"] == {"added": len(user_ids)}
+
+
+def test_sync_members_does_not_repeat_adds_after_throttled_removals():
+    current = [f"old{i:04d}" for i in range(50)]
+    desired = [f"new{i:04d}" for i in range(RESULT_CHUNK_SIZE + 30)]
+    # Call 3 is the removal half of the second chunk (adds and removes share it)
+    service = FakeService(current, throttle_calls={3})
+    runner, store, queue = make_runner(service)
+    job = asyncio.run(runner.submit("syncMembers", {"groupId": "g", "memberIds": desired}))
+
+    finished = run_to_completion(runner, store, job["id"])
+
+    assert finished["status"] == "succeeded"
+    assert sorted(service.added) == desired
+    assert sorted(service.removed) == current
+    assert finished["result"]["added"] == len(desired)
+    assert finished["result"]["removed"] == len(current)
+    assert sorted(service.members) == desired
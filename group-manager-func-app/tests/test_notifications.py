@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from services.notifications import parse_notifications
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "notifications_sample.json")
+GROUP_ID = "00000000-0000-4000-8000-000000000001"
+TENANT_ID = "11111111-1111-4111-8111-111111111111"
+
+
+def notification(change_type="updated", client_state="secret", **resource_data):
+    return {
+        "clientState": client_state,
+        "changeType": change_type,
+        "resource": f"Groups/{GROUP_ID}",
+        "tenantId": TENANT_ID,
+        "resourceData": {"id": GROUP_ID, **resource_data}
+    }
+
+
+def test_sample_payload_parses():
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        bodies = json.load(f)
+
+    changes, rejected = parse_notifications(bodies[0], "local-secret")
+
+    assert rejected == 0
+    assert changes
+    tenant_id, change = changes[0]
+    assert tenant_id == TENANT_ID
+    assert change.group_id == GROUP_ID
+    assert change.members_added == {"10000000-0000-4000-8000-000000000001"}
+    assert change.members_removed == {"10000000-0000-4000-8000-000000000002"}
+
+
+def test_membership_and_property_changes():
+    body = {"value": [
+        notification(**{"members@delta": [{"id": "A"}, {"id": "B", "@removed": "deleted"}, {}]}),
+        notification(),
+        notification("deleted"),
+        notification("created"),
+    ]}
+
+    changes, rejected = parse_notifications(body, "secret")
+
+    assert rejected == 0
+    membership, properties, deleted, created = (change for _, change in changes)
+    assert membership.members_added == {"a"} and membership.members_removed == {"b"}
+    assert not membership.properties_changed
+    assert properties.properties_changed and not properties.membership_changed
+    assert deleted.deleted
+    assert created.created
+
+
+def test_group_id_falls_back_to_resource_path():
+    body = {"value": [{"clientState": "secret", "changeType": "updated", "resource": "Groups/ABC-1"}]}
+
+    changes, _ = parse_notifications(body, "secret")
+
+    assert [(tenant_id, change.group_id) for tenant_id, change in changes] == [(None, "abc-1")]
+
+
+def test_non_group_notifications_are_ignored():
+    body = {"value": [{"clientState": "secret", "changeType": "updated", "resource": "users/u1"}]}
+
+    assert parse_notifications(body, "secret") == ([], 0)
+
+
+def test_client_state_mismatch_is_rejected():
+    body = {"value": [notification(client_state="guess"), notification(client_state=None), "junk",
+                      notification()]}
+
+    changes, rejected = parse_notifications(body, "secret")
+
+    assert len(changes) == 1
+    assert rejected == 3
+
+
+def test_everything_is_rejected_without_a_configured_client_state():
+    changes, rejected = parse_notifications({"value": [notification(client_state="")]}, "")
+
+    assert changes == []
+    assert rejected == 1
+
+
+@pytest.mark.parametrize("body", [None, [], {}, {"value": {}}])
+def test_malformed_body_raises(body):
+    with pytest.raises(ValueError):
+        parse_notifications(body, "secret")